@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+
+import tempfile
+
+from engcommon import clihelper
+from .run import measure
+from .run import metric
+from .run import preserve_loggers
+
+
+def bench_construct():
+    with tempfile.TemporaryDirectory() as prefix, preserve_loggers():
+        args = {"log_id": "bench-mark-cli", "prefix": prefix, "debug": False}
+        seconds = measure(lambda: clihelper.CLI("engcommon", dict(args)), reps=5)
+    return {"seconds": metric(seconds, "s", "lower")}
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+
+from engcommon import command
+from .run import measure
+from .run import metric
+
+
+def bench_get_shell_cmd():
+    seconds = measure(lambda: command.get_shell_cmd("true"), reps=20)
+    return {"spawn_latency": metric(seconds, "s", "lower")}
+
+
+def bench_pipeline():
+    size = 32 * 1024 * 1024
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(os.urandom(size // 2).hex().encode())
+        f.flush()
+        cmd = "cat {0} | wc -c".format(f.name)
+        seconds = measure(lambda: command.get_shell_cmd(cmd), reps=5)
+    return {"pipeline_throughput": metric(size / seconds / 1e6, "MB/s", "higher")}
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import tempfile
+
+from engcommon import fakehost
+from engcommon import hardware
+from .run import measure_noise
+from .run import metric
+
+
+def _bench_host(**kwargs):
+    """Time hardware parsers against a fake host tree."""
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        fakehost.write_fake_host(root, **kwargs)
+        hardware.set_root(root)
+        hardware.set_command_hook(fakehost.get_command_hook(root))
+        try:
+            parsers = {
+                "cpuinfo": hardware.get_cpuinfo,
+                "dmidecode": hardware.get_dmidecode,
+                "lscpu": hardware.get_lscpu,
+                "meminfo": hardware.get_meminfo,
+            }
+            for name, func in parsers.items():
+                seconds, noise = measure_noise(func)
+                results[name] = metric(seconds, "s", "lower", tolerance=noise)
+            info = hardware.get_cpuinfo_columnar()
+            seconds, noise = measure_noise(lambda: info.get_features(0), number=1000)
+            results["features"] = metric(seconds, "s", "lower", tolerance=noise)
+        finally:
+            hardware.set_root()
+            hardware.set_command_hook()
+    return results
+
+
+def bench_host_2s_32t():
+    return _bench_host(sockets=2, cores=8, threads=2, dimms=16)
+
+
+def bench_host_8s_512t():
+    return _bench_host(sockets=8, cores=32, threads=2, dimms=64)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import io
+import logging
+import logging.config
+import tempfile
+
+from engcommon import log
+from .run import measure
+from .run import metric
+from .run import preserve_loggers
+
+RECORDS = 5000
+
+
+def get_handlers(logdir):
+    conf = log.get_std_logger_conf()
+    formatters = {
+        name: logging.Formatter(f["format"], f["datefmt"])
+        for name, f in conf["formatters"].items() if "format" in f
+    }
+    handlers = {
+        "file": logging.FileHandler("{0}/bench.log".format(logdir)),
+        "stream": logging.StreamHandler(io.StringIO()),
+        "stream_json": logging.StreamHandler(io.StringIO()),
+    }
+    for handler in handlers.values():
+        handler.setFormatter(formatters["simple"])
+    handlers["stream_json"].setFormatter(log.JSONFormatter(log_id="bench-mark-log"))
+    return handlers
+
+
+def bench_handlers():
+    results = {}
+    with tempfile.TemporaryDirectory() as logdir:
+        for name, handler in get_handlers(logdir).items():
+            lgr = logging.getLogger("benchmarks.log.{0}".format(name))
+            lgr.propagate = False
+            lgr.setLevel(logging.DEBUG)
+            lgr.addHandler(handler)
+
+            def emit():
+                for i in range(RECORDS):
+                    lgr.info("Record %d of %d", i, RECORDS)
+
+            seconds = measure(emit, reps=3)
+            results[name] = metric(RECORDS / seconds, "records/s", "higher")
+            lgr.removeHandler(handler)
+            handler.close()
+    return results
+
+
+def bench_std_logger():
+    """Time records through the handlers configured by get_std_logger()."""
+    results = {}
+    variants = {
+        "std": {},
+        "std_json": {"formats": {"debug": "json"}, "log_id": "bench-mark-log"},
+        "std_dedup": {"dedup": {}},
+    }
+    with tempfile.TemporaryDirectory() as logdir, preserve_loggers():
+        for name, kwargs in variants.items():
+            lgr, lgr_nf = log.get_std_logger("bench", False, logdir=logdir, **kwargs)
+            lgr.handlers[1].setStream(io.StringIO())  # console
+
+            def emit():
+                for i in range(RECORDS):
+                    lgr.info("Record %d of %d", i, RECORDS)
+
+            seconds = measure(emit, reps=3)
+            results[name] = metric(RECORDS / seconds, "records/s", "higher")
+            log._flush_duplicate_filters()  # summaries to this logdir, not at exit
+    return results
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+
+from engcommon import randomword
+from .run import measure_noise
+from .run import metric
+
+WORDS = {
+    "adverb": ["adverb{0}".format(i % 1000) for i in range(5000)],
+    "adjective": ["adj{0}".format(i % 1000) for i in range(20000)],
+    "noun": ["noun{0}".format(i % 1000) for i in range(50000)],
+}
+
+
+def bench_random_phrase():
+    seconds, noise = measure_noise(lambda: randomword.get_random_phrase(words=WORDS), number=1000)
+    return {"seconds": metric(seconds, "s", "lower", tolerance=noise)}
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+"""
+This module runs the engcommon benchmark suite and compares results with
+stored JSON baselines.
+
+Benchmarks are functions named "bench_*" in the benchmarks/bench_*.py
+modules. Each returns a dict of metrics:
+
+    {"spawn_latency": {"value": 0.0021, "unit": "s", "better": "lower"}}
+
+A metric regresses when it is worse than its baseline by more than the
+relative threshold plus its absolute "tolerance" (noise floor in its unit,
+0 if unset). Each benchmark runs several times and keeps its best value,
+and its tolerance widens to the spread between runs. Sub-millisecond
+timings get a wider relative threshold, as host noise dominates them.
+
+    Typical Usage:
+
+    python -m benchmarks.run --save benchmarks/baselines/hosaka.json
+    python -m benchmarks.run --compare benchmarks/baselines/hosaka.json
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import logging
+import os
+import pkgutil
+import platform
+import socket
+import statistics
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Sub-millisecond probes swing up to ~2x between processes on a busy host
+FAST_SECONDS = 1e-3
+FAST_THRESHOLD = 1.0
+
+
+def measure(func, reps=5, number=1):
+    """Get median seconds per call of func.
+
+    Args:
+        func (callable): Function to time.
+        reps (int): Timed repetitions.
+        number (int): Calls per repetition.
+
+    Returns:
+        seconds (float): Median seconds per call.
+    """
+    func()  # warm-up
+    times = []
+    for i in range(reps):
+        start = time.perf_counter()
+        for j in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return statistics.median(times)
+
+
+def measure_noise(func, reps=15, number=1):
+    """Get fastest seconds per call of func and its noise floor.
+
+    Scheduler and cache noise only ever slow a repetition down, so the
+    fastest one is the stable estimate and the spread up to the slowest
+    one is the noise floor of this probe on this host.
+
+    Args:
+        func (callable): Function to time.
+        reps (int): Timed repetitions.
+        number (int): Calls per repetition.
+
+    Returns:
+        seconds (float): Fastest seconds per call.
+        noise (float): Slowest minus fastest seconds per call.
+    """
+    func()  # warm-up
+    times = []
+    for i in range(reps):
+        start = time.perf_counter()
+        for j in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    return min(times), max(times) - min(times)
+
+
+def metric(value, unit, better, tolerance=0.0):
+    """Get a metric dict.
+
+    Args:
+        value (float): Measured value.
+        unit (str): Unit.
+        better (str): "lower" or "higher".
+        tolerance (float): Absolute change (in unit) always allowed.
+
+    Returns:
+        metric (dict): Metric.
+    """
+    return {"value": value, "unit": unit, "better": better, "tolerance": tolerance}
+
+
+@contextlib.contextmanager
+def preserve_loggers(names=("", "noformat")):
+    """Restore handlers and levels of loggers reconfigured in the block.
+
+    Handlers added in the block are closed.
+
+    Args:
+        names (iterable): Logger names ("" is the root logger).
+    """
+    saved = {}
+    for name in names:
+        lgr = logging.getLogger(name)
+        saved[name] = (list(lgr.handlers), lgr.level)
+    try:
+        yield
+    finally:
+        for name, (handlers, level) in saved.items():
+            lgr = logging.getLogger(name)
+            for handler in list(lgr.handlers):
+                if handler not in handlers:
+                    lgr.removeHandler(handler)
+                    handler.close()
+            for handler in handlers:
+                if handler not in lgr.handlers:
+                    lgr.addHandler(handler)
+            lgr.setLevel(level)
+
+
+def get_benchmarks(pattern=""):
+    """Get benchmark functions from benchmarks/bench_*.py.
+
+    Args:
+        pattern (str): Only benchmarks whose name contains pattern.
+
+    Returns:
+        benchmarks (dict): keys are "module.function", values are callables.
+    """
+    benchmarks = {}
+    path = os.path.dirname(__file__)
+    for info in pkgutil.iter_modules([path]):
+        if info.name.startswith("bench_"):
+            module = importlib.import_module("{0}.{1}".format(__package__, info.name))
+            for name in sorted(dir(module)):
+                key = "{0}.{1}".format(info.name[len("bench_"):], name[len("bench_"):])
+                if name.startswith("bench_") and pattern in key:
+                    benchmarks[key] = getattr(module, name)
+    return benchmarks
+
+
+def run_benchmarks(benchmarks, runs=1):
+    """Run benchmarks.
+
+    With several runs, each metric keeps its best value and its
+    tolerance grows to the spread between runs, so host noise that
+    lasts longer than one benchmark call is part of the noise floor.
+
+    Args:
+        benchmarks (dict): keys are names, values are callables.
+        runs (int): Runs of each benchmark.
+
+    Returns:
+        results (dict): keys are "benchmark.metric", values are metric dicts.
+    """
+    results = {}
+    for name, func in benchmarks.items():
+        logger.info("Running {0}".format(name))
+        samples = {}
+        for i in range(runs):
+            for metric_name, m in func().items():
+                samples.setdefault(metric_name, []).append(m)
+        for metric_name, ms in samples.items():
+            values = [m["value"] for m in ms]
+            best = min if ms[0]["better"] == "lower" else max
+            m = dict(ms[0], value=best(values))
+            m["tolerance"] = max(
+                max(values) - min(values),
+                max(m.get("tolerance", 0.0) for m in ms),
+            )
+            results["{0}.{1}".format(name, metric_name)] = m
+    return results
+
+
+def compare_results(results, baseline, threshold):
+    """Get metrics that regressed beyond threshold plus tolerance.
+
+    A metric regresses if it is worse than baseline by more than
+    threshold * |baseline| + the larger tolerance of the two. Timings
+    with a baseline under FAST_SECONDS use at least FAST_THRESHOLD.
+
+    Args:
+        results (dict): Current metrics.
+        baseline (dict): Baseline metrics.
+        threshold (float): Allowed relative regression (0.2 = 20%).
+
+    Returns:
+        regressions (dict): keys are metric names, values are
+            (baseline, current, relative change).
+    """
+    regressions = {}
+    for name, m in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]["value"]
+        value = m["value"]
+        tolerance = max(m.get("tolerance", 0.0), baseline[name].get("tolerance", 0.0))
+        limit = threshold
+        if m["unit"] == "s" and abs(base) < FAST_SECONDS:
+            limit = max(threshold, FAST_THRESHOLD)
+        worse = value - base if m["better"] == "lower" else base - value
+        if worse > limit * abs(base) + tolerance:
+            change = worse / abs(base) if base else float("inf")
+            regressions[name] = (base, value, change)
+    return regressions
+
+
+def get_args(argv):
+    parser = argparse.ArgumentParser(
+        description = "Run engcommon benchmarks.",
+    )
+    parser.add_argument(
+        "-k", "--pattern",
+        default = "",
+        help = "Only run benchmarks matching pattern.",
+    )
+    parser.add_argument(
+        "--save",
+        help = "Write results to JSON baseline file.",
+    )
+    parser.add_argument(
+        "--compare",
+        help = "Compare results with JSON baseline file.",
+    )
+    parser.add_argument(
+        "--runs",
+        type = int,
+        default = 3,
+        help = "Runs of each benchmark; best value is kept (default: 3).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type = float,
+        default = 0.2,
+        help = "Allowed relative regression for --compare (default: 0.2).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = get_args(argv)
+    results = run_benchmarks(get_benchmarks(args.pattern), args.runs)
+    for name, m in results.items():
+        print("{0:<50} {1:>14.6g} {2}".format(name, m["value"], m["unit"]))
+    if args.save:
+        doc = {
+            "host": socket.gethostname(),
+            "python": platform.python_version(),
+            "timestamp": time.time(),
+            "results": results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(doc, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_results(results, baseline, args.threshold)
+        for name, (base, value, change) in regressions.items():
+            print("REGRESSION {0}: {1:.6g} -> {2:.6g} ({3:+.0%})".format(
+                name, base, value, change,
+            ))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
+import os
 import pytest
 
+from engcommon import hardware
 from engcommon.clihelper import CLI
 from engcommon.constants import _const as CONSTANTS
+from engcommon.fakehost import get_command_hook
+from engcommon.fakehost import write_fake_host
 from engcommon.ini import INIConfig
 
 
@@ -31,3 +35,18 @@ def mycli():
 @pytest.fixture(scope="session")
 def myini():
     return INIConfig(CONSTANTS().INI_URL)
+
+
+@pytest.fixture(scope="session")
+def fake_ipmitool():
+    return os.path.join(os.path.dirname(__file__), "tests", "fake", "ipmitool")
+
+
+@pytest.fixture
+def fake_host(tmp_path):
+    root = write_fake_host(str(tmp_path / "host"), sockets=8, cores=32, threads=2, shuffle=True)
+    hardware.set_root(root)
+    hardware.set_command_hook(get_command_hook(root))
+    yield root
+    hardware.set_root()
+    hardware.set_command_hook()
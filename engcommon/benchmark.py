@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+"""
+This module contains quick NumPy micro-benchmarks for node qualification.
+
+A DGEMM FLOPS test and a STREAM-style copy/scale/add/triad bandwidth test
+are compared with the theoretical peak from hardware, so a slow node is
+flagged in seconds rather than hours into an XHPL run.
+
+    Typical Usage:
+
+    result = benchmark.qualify_node()
+    if not result["passed"]:
+        logger.error("Node too slow for XHPL")
+
+BLAS thread count is set with threadpoolctl when it is installed,
+otherwise the BLAS default (OMP_NUM_THREADS etc.) applies.
+"""
+
+import concurrent.futures
+import contextlib
+import logging
+import numpy
+import time
+
+from . import hardware
+from .constants import _const as CONSTANTS
+
+try:
+    import threadpoolctl
+except ImportError:
+    threadpoolctl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _get_stats(values):
+    """Get repetition statistics."""
+    values = numpy.asarray(values, dtype=numpy.float64)
+    stats = {
+        "best": float(values.max()),
+        "median": float(numpy.median(values)),
+        "min": float(values.min()),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+    }
+    return stats
+
+
+def _blas_threads(threads):
+    if threads and threadpoolctl is not None:
+        return threadpoolctl.threadpool_limits(limits=threads, user_api="blas")
+    if threads:
+        logger.warning("threadpoolctl Not Found, using default BLAS threads")
+    return contextlib.ExitStack()  # no-op
+
+
+def get_dgemm_gflops(**kwargs):
+    """Get DGEMM GFLOPS using numpy.matmul.
+
+    Args:
+        None
+
+    **kwargs:
+        size (int): Matrix dimension n (n x n).
+        reps (int): Timed repetitions after one warm-up.
+        threads (int): BLAS threads.
+
+    Returns:
+        stats (dict): GFLOPS best/median/min/mean/std.
+    """
+    size = int(kwargs.setdefault("size", 4096))
+    reps = int(kwargs.setdefault("reps", 5))
+    threads = kwargs.setdefault("threads", None)
+    rng = numpy.random.default_rng(0)
+    a = rng.random((size, size))
+    b = rng.random((size, size))
+    c = numpy.empty((size, size))
+    flops = 2.0 * size ** 3
+    gflops = []
+    with _blas_threads(threads):
+        numpy.matmul(a, b, out=c)  # warm-up
+        for i in range(reps):
+            start = time.perf_counter()
+            numpy.matmul(a, b, out=c)
+            gflops.append(flops / (time.perf_counter() - start) / 1e9)
+    stats = _get_stats(gflops)
+    return stats
+
+
+def _stream_kernels(a, b, c, scalar):
+    """Get STREAM kernels and bytes moved per element for arrays a, b, c."""
+    def copy():
+        numpy.copyto(c, a)
+
+    def scale():
+        numpy.multiply(c, scalar, out=b)
+
+    def add():
+        numpy.add(a, b, out=c)
+
+    def triad():
+        numpy.multiply(c, scalar, out=a)
+        numpy.add(b, a, out=a)
+
+    return [("copy", copy, 16), ("scale", scale, 16), ("add", add, 24), ("triad", triad, 24)]
+
+
+def get_stream_bandwidth(**kwargs):
+    """Get STREAM-style memory bandwidth.
+
+    Arrays are split into one chunk per thread; NumPy releases the GIL in
+    ufunc loops, so chunks run in parallel. Bandwidth is counted the
+    STREAM way (triad moves 24 bytes per element even though NumPy makes
+    two passes).
+
+    Args:
+        None
+
+    **kwargs:
+        size (int): Elements per array (float64).
+        reps (int): Timed repetitions per kernel.
+        threads (int): Worker threads. Default: 1.
+
+    Returns:
+        bandwidth (dict): keys are kernel names, values are GB/s stats.
+    """
+    size = int(kwargs.setdefault("size", 1 << 25))
+    reps = int(kwargs.setdefault("reps", 10))
+    threads = int(kwargs.setdefault("threads", None) or 1)
+    a = numpy.full(size, 1.0)
+    b = numpy.full(size, 2.0)
+    c = numpy.zeros(size)
+    bounds = numpy.linspace(0, size, threads + 1).astype(int)
+    chunks = [
+        _stream_kernels(a[lo:hi], b[lo:hi], c[lo:hi], 3.0)
+        for lo, hi in zip(bounds[:-1], bounds[1:])
+    ]
+    bandwidth = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as pool:
+        for k, (name, _, nbytes) in enumerate(chunks[0]):
+            results = []
+            for i in range(reps):
+                start = time.perf_counter()
+                list(pool.map(lambda chunk: chunk[k][1](), chunks))
+                elapsed = time.perf_counter() - start
+                results.append(nbytes * size / elapsed / 1e9)
+            bandwidth[name] = _get_stats(results)
+    return bandwidth
+
+
+def qualify_node(**kwargs):
+    """Run DGEMM and STREAM benchmarks and compare with theoretical peak.
+
+    Args:
+        None
+
+    **kwargs:
+        threads (int): Threads. Default: hardware.get_effective_cpu_count().
+        dgemm_size (int): DGEMM matrix dimension.
+        stream_size (int): STREAM elements per array.
+        reps (int): Repetitions per test.
+        min_efficiency (float): Min best/peak DGEMM ratio. Default:
+            XHPL_MIN_EFFICIENCY.
+        min_bandwidth (float): Min triad GB/s. Not checked if None.
+
+    Returns:
+        result (dict):
+            {
+                peak_gflops (float): Theoretical peak of the physical
+                    cores the threads run on (SMT siblings add none).
+                dgemm (dict): DGEMM GFLOPS stats.
+                stream (dict): STREAM GB/s stats per kernel.
+                efficiency (float): Best DGEMM / peak.
+                passed (bool): Node meets thresholds.
+            }
+    """
+    threads = kwargs.setdefault("threads", None)
+    if threads is None:
+        threads = hardware.get_effective_cpu_count()
+    reps = int(kwargs.setdefault("reps", 5))
+    min_efficiency = float(kwargs.setdefault(
+        "min_efficiency", CONSTANTS().XHPL_MIN_EFFICIENCY,
+    ))
+    min_bandwidth = kwargs.setdefault("min_bandwidth", None)
+    cores = min(threads, hardware.get_effective_core_count())
+    peak = hardware.get_peak_gflops(cores = cores)
+    dgemm = get_dgemm_gflops(
+        size = kwargs.setdefault("dgemm_size", 4096),
+        reps = reps,
+        threads = threads,
+    )
+    stream = get_stream_bandwidth(
+        size = kwargs.setdefault("stream_size", 1 << 25),
+        reps = reps,
+        threads = threads,
+    )
+    efficiency = dgemm["best"] / peak
+    passed = efficiency >= min_efficiency
+    if min_bandwidth is not None:
+        passed = passed and stream["triad"]["best"] >= min_bandwidth
+    if not passed:
+        logger.warning("Node Below Qualification Threshold")
+    logger.debug("DGEMM: {0:.1f}/{1:.1f} GFLOPS ({2:.0%}), triad: {3:.1f} GB/s".format(
+        dgemm["best"], peak, efficiency, stream["triad"]["best"],
+    ))
+    result = {
+        "peak_gflops": peak,
+        "dgemm": dgemm,
+        "stream": stream,
+        "efficiency": efficiency,
+        "passed": passed,
+    }
+    return result
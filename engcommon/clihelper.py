@@ -12,16 +12,23 @@ output across packages.
     my_cli.print_versions()
 """
 
+import bisect
+import heapq
+import itertools
 import logging
 import os
 import pkg_resources
+import re
 
 from argparse import ArgumentError
 from . import fileio
 from . import formattext
 from . import log
+from . import promexport
 from . import randomword
+from . import runid
 from . import testvar
+from .constants import _const as CONSTANTS
 
 logger = logging.getLogger(__name__)
 
@@ -47,8 +54,17 @@ class CLI:
             args (dict): Command line arguments.
                 {
                     log_id (str): Override random runtime ID with this.
+                    log_id_suffix (bool): Append a time/pid/host suffix to
+                        the random runtime ID (see runid.get_id_suffix).
                     prefix (str): Prefix for log directory.
                     debug (bool): Enable/disable debug mode.
+                    metrics (str): Optional Prometheus textfile path.
+                    formats (dict): Optional formatter per log handler
+                        (see log.get_std_logger).
+                    rotate (dict): Optional log rotation settings
+                        (see log.get_std_logger).
+                    dedup (dict): Optional repeated record suppression
+                        settings (see log.get_std_logger).
                 }
         """
         self._project_name = self._get_project_name(project_name)
@@ -65,6 +81,10 @@ class CLI:
             self._project_name,
             self._args["debug"],
             logdir = self._logdir,
+            formats = self._args.get("formats") or {},
+            log_id = self._log_id,
+            rotate = self._args.get("rotate"),
+            dedup = self._args.get("dedup"),
         )
         self._logger = loggers[0]
         self._logger_noformat = loggers[1]
@@ -73,6 +93,9 @@ class CLI:
         self._bh = self._logger.handlers[2]  # buffer
         self._dh = self._logger.handlers[3]  # debug file
         self._kh = self._logger_noformat.handlers[1]  # console
+        self._exporter = None
+        if self._args.get("metrics"):
+            self._exporter = promexport.PromExporter(self._args["metrics"])
 
     @property
     def version(self):
@@ -115,7 +138,13 @@ class CLI:
 
     def _get_log_id(self):
         if not self._args["log_id"]:
-            log_id = randomword.get_random_phrase()
+            try:
+                log_id = runid.get_unique_phrase(
+                    suffix = self._args.get("log_id_suffix", False),
+                )
+            except (OSError, ValueError, RuntimeError):
+                logger.warning("Run ID Registry Unavailable, log_id may not be unique")
+                log_id = randomword.get_random_phrase()
         else:
             log_id = self._args["log_id"]
         return log_id
@@ -202,6 +231,48 @@ class CLI:
         self._write_logs(dict_, mode)
         return None
 
+    def _write_metrics(self):
+        """Write Prometheus textfile of command metrics and hardware facts,
+        then stop collecting (removes tracing if the exporter enabled it).
+
+        Does nothing unless the "metrics" argument was given.
+        """
+        if self._exporter is not None:
+            logger.debug("Writing metrics: {0}".format(self._exporter.path))
+            self._exporter.stop()
+        return None
+
+    def write_metrics(self):
+        """Write metrics and stop collecting."""
+        self._write_metrics()
+        return None
+
+    def _enable_loglevel_control(self, loglevels):
+        """Allow log levels to change at runtime.
+
+        SIGUSR1 toggles the console, file and buffer handlers to DEBUG and
+        back. Writing "name: LEVEL" lines to LOG_CONTROL_FILE in the logdir
+        sets handler or module levels (see log.LogLevelController).
+
+        Args:
+            loglevels (dict): Module log levels, as for log.set_loglevels.
+
+        Returns:
+            controller (log.LogLevelController): Started controller.
+        """
+        controller = log.LogLevelController(
+            {"file": self._fh, "console": self._ch, "buffer": self._bh},
+            loglevels = loglevels,
+            control_file = os.path.join(self._logdir, CONSTANTS().LOG_CONTROL_FILE),
+        )
+        controller.start()
+        logger.debug("Log level control: {0}".format(controller.control_file))
+        return controller
+
+    def enable_loglevel_control(self, loglevels=None):
+        """Enable runtime log level control."""
+        return self._enable_loglevel_control(loglevels or {})
+
     def _get_stdout(self):
         """Get the STDOUT CLI stream."""
         logger.debug("Saving STDOUT")
@@ -237,3 +308,361 @@ def csv_str(vstr, sep = ","):
             v = v.strip(" ,")
             values.append(v)
     return values
+
+
+_RE_NAME = re.compile(r"^(.*?)(\d+)(\D*)$")
+_RE_BRACKET = re.compile(r"^([^\[\]]*)\[([^\[\]]+)\]([^\[\]]*)$")
+
+
+def _get_width(digits):
+    """Get zero-padded width of a number string, 0 if not padded."""
+    return len(digits) if len(digits) > 1 and digits[0] == "0" else 0
+
+
+def _split_name(name):
+    """Get (prefix, suffix, number, width) of a host name.
+
+    The number is the last run of digits; width is None without digits.
+    """
+    match = _RE_NAME.match(name)
+    if match is None:
+        return name, "", 0, None
+    prefix, digits, suffix = match.groups()
+    return prefix, suffix, int(digits), _get_width(digits)
+
+
+def _split_top(expr):
+    """Split a hostlist expression on commas outside brackets."""
+    tokens = []
+    depth = 0
+    start = 0
+    for i, c in enumerate(expr):
+        if c == "[":
+            depth += 1
+        elif c == "]":
+            depth -= 1
+            if depth < 0:
+                raise ValueError("Unbalanced brackets: {0}".format(expr))
+        elif c == "," and depth == 0:
+            tokens.append(expr[start:i])
+            start = i + 1
+    if depth != 0:
+        raise ValueError("Unbalanced brackets: {0}".format(expr))
+    tokens.append(expr[start:])
+    return [t.strip() for t in tokens if t.strip()]
+
+
+def _merge_ranges(ranges):
+    """Sort and merge overlapping or adjacent (lo, hi) ranges."""
+    merged = []
+    for lo, hi in sorted(ranges):
+        if merged and lo <= merged[-1][1] + 1:
+            if hi > merged[-1][1]:
+                merged[-1] = (merged[-1][0], hi)
+        else:
+            merged.append((lo, hi))
+    return merged
+
+
+def _subtract_ranges(a, b):
+    """Get merged ranges a minus merged ranges b."""
+    result = []
+    j = 0
+    for lo, hi in a:
+        while j < len(b) and b[j][1] < lo:
+            j += 1
+        k = j
+        while k < len(b) and b[k][0] <= hi:
+            if b[k][0] > lo:
+                result.append((lo, b[k][0] - 1))
+            lo = max(lo, b[k][1] + 1)
+            k += 1
+        if lo <= hi:
+            result.append((lo, hi))
+    return result
+
+
+def _intersect_ranges(a, b):
+    """Get the intersection of merged ranges a and b."""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        lo = max(a[i][0], b[j][0])
+        hi = min(a[i][1], b[j][1])
+        if lo <= hi:
+            result.append((lo, hi))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+class Hostlist:
+    """A class for a set of host names in compact (Slurm hostlist) form.
+
+    Names are held as merged numeric ranges per (prefix, suffix, width),
+    so "node[00001-40000]" is one range rather than 40,000 strings.
+    Iteration expands names lazily and set operations work on the ranges.
+
+    Zero-padded numbers keep their width: node[001-100] holds node001 to
+    node100. Names compare as strings, so node[001-100] equals
+    node[001-099],node100.
+
+    Ex:
+        hosts = Hostlist("node[001-512,600-700],login1")
+        str(hosts - Hostlist("node[100-199]"))
+            -> "login1,node[001-099,200-512,600-700]"
+    """
+
+    def __init__(self, expr=""):
+        """Init Hostlist.
+
+        Args:
+            expr (str): Hostlist expression, e.g. "node[001-512],gpu[1-4]-ib".
+
+        Raises:
+            ValueError: Malformed expression.
+        """
+        ranges = {}
+        for token in _split_top(expr):
+            for prefix, suffix, lo, hi, width in self._parse_token(token):
+                self._add(ranges, prefix, suffix, lo, hi, width)
+        self._ranges = {k: _merge_ranges(v) for k, v in ranges.items()}
+
+    @staticmethod
+    def _parse_token(token):
+        """Yield (prefix, suffix, lo, hi, width) ranges of a token."""
+        if "[" not in token and "]" not in token:
+            prefix, suffix, number, width = _split_name(token)
+            yield prefix, suffix, number, number, width
+            return
+        if re.search(r"\[\s*\]", token):
+            raise ValueError("Empty range: {0}".format(token))
+        match = _RE_BRACKET.match(token)
+        if match is None or re.search(r"\d", match.group(3)):
+            # several brackets or digits after the bracket: expand names
+            head, body, tail = re.match(r"^([^\[]*)\[([^\]]*)\](.*)$", token).groups()
+            for name in Hostlist(head + "[" + body + "]"):
+                for r in Hostlist._parse_token(name + tail):
+                    yield r
+            return
+        prefix, body, suffix = match.groups()
+        for part in body.split(","):
+            lo_s, _, hi_s = part.strip().partition("-")
+            if not lo_s.isdigit() or (hi_s and not hi_s.isdigit()):
+                raise ValueError("Invalid range: {0}".format(part))
+            lo = int(lo_s)
+            hi = int(hi_s) if hi_s else lo
+            if hi < lo:
+                raise ValueError("Invalid range: {0}".format(part))
+            yield prefix, suffix, lo, hi, _get_width(lo_s)
+
+    @staticmethod
+    def _add(ranges, prefix, suffix, lo, hi, width):
+        """Add a range in canonical form.
+
+        Padded keys only hold numbers shorter than their width; longer
+        numbers format the same unpadded, so they are held as width 0.
+        """
+        if width:
+            split = 10 ** (width - 1)
+            if lo < split:
+                ranges.setdefault((prefix, suffix, width), []).append((lo, min(hi, split - 1)))
+            lo = max(lo, split)
+            width = 0
+            if lo > hi:
+                return None
+        ranges.setdefault((prefix, suffix, width), []).append((lo, hi))
+        return None
+
+    @classmethod
+    def from_hosts(cls, hosts):
+        """Get a Hostlist of host names.
+
+        Args:
+            hosts (iterable): Host names.
+
+        Returns:
+            hostlist (Hostlist): Hostlist.
+        """
+        ranges = {}
+        for host in hosts:
+            prefix, suffix, number, width = _split_name(host)
+            cls._add(ranges, prefix, suffix, number, number, width)
+        hostlist = cls()
+        hostlist._ranges = {k: _merge_ranges(v) for k, v in ranges.items()}
+        return hostlist
+
+    @classmethod
+    def _from_ranges(cls, ranges):
+        hostlist = cls()
+        hostlist._ranges = {k: v for k, v in ranges.items() if v}
+        return hostlist
+
+    @staticmethod
+    def _format(prefix, suffix, number, width):
+        if width is None:
+            return prefix + suffix
+        return "{0}{1:0{2}d}{3}".format(prefix, number, width, suffix)
+
+    def _numbers(self, key):
+        """Yield (number, width) of a key in ascending order."""
+        width = key[2]
+        for lo, hi in self._ranges[key]:
+            for number in range(lo, hi + 1):
+                yield number, width
+
+    def __iter__(self):
+        # a padded range split at 10**(width-1) spans several width keys,
+        # so merge the keys of each prefix and suffix in numeric order
+        keys = sorted(self._ranges, key=lambda k: (k[0], k[1], k[2] is None, k[2] or 0))
+        for (prefix, suffix), group in itertools.groupby(keys, key=lambda k: k[:2]):
+            numbers = heapq.merge(*[self._numbers(key) for key in group],
+                                  key=lambda n: (n[1] is None, n))
+            for number, width in numbers:
+                yield self._format(prefix, suffix, number, width)
+
+    def __len__(self):
+        return sum(hi - lo + 1 for v in self._ranges.values() for lo, hi in v)
+
+    def __contains__(self, host):
+        prefix, suffix, number, width = _split_name(host)
+        if width and number >= 10 ** (width - 1):
+            width = 0
+        ranges = self._ranges.get((prefix, suffix, width), [])
+        i = bisect.bisect_right(ranges, (number, float("inf"))) - 1
+        return i >= 0 and ranges[i][0] <= number <= ranges[i][1]
+
+    def __eq__(self, other):
+        if not isinstance(other, Hostlist):
+            return NotImplemented
+        return self._ranges == other._ranges
+
+    def __or__(self, other):
+        return self.union(other)
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    def union(self, other):
+        """Get hosts in either hostlist.
+
+        Args:
+            other (Hostlist): Hostlist.
+
+        Returns:
+            hostlist (Hostlist): Union.
+        """
+        ranges = {}
+        for key in set(self._ranges) | set(other._ranges):
+            ranges[key] = _merge_ranges(self._ranges.get(key, []) + other._ranges.get(key, []))
+        return self._from_ranges(ranges)
+
+    def difference(self, other):
+        """Get hosts not in other.
+
+        Args:
+            other (Hostlist): Hostlist.
+
+        Returns:
+            hostlist (Hostlist): Difference.
+        """
+        return self._from_ranges({
+            k: _subtract_ranges(v, other._ranges.get(k, [])) for k, v in self._ranges.items()
+        })
+
+    def intersection(self, other):
+        """Get hosts in both hostlists.
+
+        Args:
+            other (Hostlist): Hostlist.
+
+        Returns:
+            hostlist (Hostlist): Intersection.
+        """
+        return self._from_ranges({
+            k: _intersect_ranges(v, other._ranges[k])
+            for k, v in self._ranges.items() if k in other._ranges
+        })
+
+    def __str__(self):
+        groups = {}  # (prefix, suffix): {width: ranges}
+        for (prefix, suffix, width), ranges in self._ranges.items():
+            groups.setdefault((prefix, suffix), {})[width] = list(ranges)
+        tokens = []
+        for (prefix, suffix), widths in sorted(groups.items()):
+            if None in widths:
+                tokens.append(prefix + suffix)
+                del widths[None]
+            padded = [w for w in widths if w]
+            if len(padded) == 1 and 0 in widths:
+                # unpadded numbers at least as long as the width format the same
+                width = padded[0]
+                split = 10 ** (width - 1)
+                natural = widths.pop(0)
+                widths[0] = _subtract_ranges(natural, [(split, float("inf"))])
+                widths[width] = _merge_ranges(
+                    widths[width] + _intersect_ranges(natural, [(split, float("inf"))])
+                )
+            for width, ranges in sorted(widths.items()):
+                if not ranges:
+                    continue
+                if len(ranges) == 1 and ranges[0][0] == ranges[0][1]:
+                    tokens.append(self._format(prefix, suffix, ranges[0][0], width))
+                    continue
+                body = ",".join(
+                    "{0:0{1}d}".format(lo, width) if lo == hi
+                    else "{0:0{2}d}-{1:0{2}d}".format(lo, hi, width)
+                    for lo, hi in ranges
+                )
+                tokens.append("{0}[{1}]{2}".format(prefix, body, suffix))
+        return ",".join(tokens)
+
+    def __repr__(self):
+        return "Hostlist({0!r})".format(str(self))
+
+
+def expand_hostlist(expr):
+    """Get a lazy iterator of the host names of a hostlist expression.
+
+    Args:
+        expr (str): Hostlist expression, e.g. "node[001-512,600-700]".
+
+    Returns:
+        hosts (iterator): Host names.
+
+    Raises:
+        ValueError: Malformed expression.
+    """
+    return iter(Hostlist(expr))
+
+
+def compress_hostlist(hosts):
+    """Get the compact hostlist expression of host names.
+
+    Args:
+        hosts (iterable): Host names.
+
+    Returns:
+        expr (str): Hostlist expression.
+    """
+    return str(Hostlist.from_hosts(hosts))
+
+
+def hostlist_str(vstr):
+    """Parse hostlist expression for "nodes" option.
+
+    Args:
+        vstr (str): Value string from CLI, e.g. "node[001-512],login1".
+
+    Returns:
+        hostlist (Hostlist): Nodes.
+
+    Raises:
+        ValueError: Malformed expression.
+    """
+    return Hostlist(vstr)
@@ -2,31 +2,73 @@
 
 """
 This module contains functions used to execute shell commands.
+
+Flaky commands (e.g. ipmitool against a busy BMC) can be run with a
+RetryPolicy:
+
+    command.get_shell_cmd("ipmitool sdr", retry=command.RetryPolicy(hedge=True))
 """
 
+import collections
 import glob
 import logging
+import math
 import os
+import queue
+import random
 import shlex
 import subprocess
+import sys
+import threading
 import time
 
 from . import error
 from . import testvar
 from .constants import _const as CONSTANTS
+from .constants import get_registry
 
 logger = logging.getLogger(__name__)
 
+_latencies = collections.OrderedDict()  # cmd: deque of recent latencies (s), LRU
+_latency_lock = threading.Lock()
+_backend = None
+
+
+def set_backend(backend=None):
+    """Set an execution backend for get_shell_cmd() and call_shell_cmd().
+
+    A backend has a "live" attribute (True if it runs commands) and a
+    run(argv, **kwargs) method returning a dict of ret_code, stdout and
+    stderr, which also writes output to the "stdout_to" and "stderr_to"
+    kwargs if given (see replay.Recorder and replay.Replayer).
+
+    Args:
+        backend (object): Backend. Commands run with subprocess if None.
+
+    Returns:
+        None
+    """
+    global _backend
+    _backend = backend
+    return None
+
+
+def get_backend():
+    """Get the execution backend, None if commands run with subprocess."""
+    return _backend
+
 
-def check_returncode(cmd, ret_code):
+def check_returncode(cmd, ret_code, stderr=None):
     """Check the returncode of a command. Raise if problematic.
 
     Some platforms + commands are broken and some commands must be ignored
-    (e.g. fru on Asus ESC4000).
+    (e.g. fru on Asus ESC4000). Accepted return codes come from the command
+    registry (see constants.get_registry()).
 
     Args:
         cmd (str): Command to check.
         ret_code (str): Return code.
+        stderr (str): STDERR, included in the error if given.
 
     Returns:
         None
@@ -34,24 +76,21 @@ def check_returncode(cmd, ret_code):
     Raises:
         error.ShellCommandExecutionError: Error executing command.
     """
-    ignore_returncode = False
-    if isinstance(cmd, list):
-        cmd = " ".join(cmd)
-    if ret_code != 0:
-        for k, v in CONSTANTS().IGNORE_RETURNCODE.items():
-            if cmd.startswith(k) and ret_code == v:
-                ignore_returncode = True
-                break
-        if not ignore_returncode:
-            try:
-                raise error.ShellCommandExecutionError({
-                    'ret_code': ret_code,
-                    'cmd': cmd,
-                })
-            except error.ShellCommandExecutionError as e:
-                logger.info(testvar.get_debug(e.args))
-                logger.error("Shell Command Execution Error")
-                raise
+    if ret_code != 0 and not get_registry().is_ignored(cmd, ret_code):
+        if isinstance(cmd, list):
+            cmd = " ".join(cmd)
+        try:
+            info = {
+                'ret_code': ret_code,
+                'cmd': cmd,
+            }
+            if stderr is not None:
+                info['stderr'] = stderr
+            raise error.ShellCommandExecutionError(info)
+        except error.ShellCommandExecutionError as e:
+            logger.info(testvar.get_debug(e.args))
+            logger.error("Shell Command Execution Error")
+            raise
     return None
 
 
@@ -67,10 +106,11 @@ def call_shell_cmd(cmd, stdout=None, stderr=subprocess.STDOUT, **kwargs):
         add_env (mapping): Environment variable mapping.
 
     Returns:
-        None
+        ret_code (int): Return code, 0 or one accepted by the registry.
 
     Raises:
         OSError: Error starting command.
+        error.ShellCommandExecutionError: Error executing command.
     """
     my_cwd = kwargs.setdefault("cwd", None)
     my_shell = kwargs.setdefault("shell", False)
@@ -84,25 +124,61 @@ def call_shell_cmd(cmd, stdout=None, stderr=subprocess.STDOUT, **kwargs):
     else:
         cmd = shlex.split(cmd)
 
-    try:
-        p = subprocess.Popen(
+    if _backend is not None:
+        merge_stderr = stderr == subprocess.STDOUT
+        result = _backend.run(
             cmd,
-            shell = my_shell,
-            stdout = stdout,
-            stderr = stderr,
             cwd = my_cwd,
             env = my_env,
-            close_fds = True,
+            shell = my_shell,
+            merge_stderr = merge_stderr,
+            stdout_to = stdout,
+            stderr_to = None if merge_stderr else sys.stderr if stderr is None else stderr,
         )
-    except OSError:
-        logger.error("Shell Command Start Error")
-        logger.debug(testvar.get_debug((cmd, my_cwd, my_shell)))
-        raise
-    else:
-        p.communicate()
-        ret_code = p.returncode
+        ret_code = result["ret_code"]
         check_returncode(cmd, ret_code)
+        if not _backend.live:
+            return ret_code
+    else:
+        try:
+            p = subprocess.Popen(
+                cmd,
+                shell = my_shell,
+                stdout = stdout,
+                stderr = stderr,
+                cwd = my_cwd,
+                env = my_env,
+                close_fds = True,
+            )
+        except OSError:
+            logger.error("Shell Command Start Error")
+            logger.debug(testvar.get_debug((cmd, my_cwd, my_shell)))
+            raise
+        else:
+            p.communicate()
+            ret_code = p.returncode
+            check_returncode(cmd, ret_code)
     time.sleep(1)
+    return ret_code
+
+
+def _write_output(f, text):
+    """Write backend output to a file object or descriptor passed as
+    stdout/stderr, as the process would have. Nothing is written to None,
+    PIPE or DEVNULL."""
+    if not text or f is None or f in (subprocess.PIPE, subprocess.DEVNULL):
+        return None
+    data = text.encode(errors="surrogateescape") if isinstance(text, str) else text
+    if isinstance(f, int):
+        os.write(f, data)
+        return None
+    try:
+        fd = f.fileno()
+    except (AttributeError, OSError, ValueError):  # e.g. io.StringIO
+        f.write(data.decode(errors="replace"))
+        return None
+    f.flush()
+    os.write(fd, data)
     return None
 
 
@@ -139,29 +215,104 @@ def cmd_cleanup(cmd):
     return cmd_list
 
 
-def get_shell_cmd(cmd, **kwargs):
-    """Get shell command output.
+class RetryPolicy:
+    """A class for a command retry policy.
 
-    Args:
-        cmd (str): Command to run.
+    Failures are retried when the registry classifies the return code (and
+    STDERR) as transient for the command (see constants.CommandRegistry), after an
+    exponential backoff with full jitter. With hedge, an attempt that runs
+    longer than the command's observed latency percentile gets a second,
+    concurrent attempt; the first to succeed wins and the other is killed.
 
-    **kwargs:
-        cwd (str): Current working dir from which to run cmd.
-        encoding (str): Text encoding.
+    Attributes:
+        attempts (int): Max attempts.
+        backoff (float): Delay before the first retry in seconds.
+        max_backoff (float): Max delay between retries in seconds.
+        jitter (bool): Randomise delays (full jitter).
+        hedge (bool): Hedge slow attempts.
+    """
+
+    def __init__(self, **kwargs):
+        """Init RetryPolicy.
+
+        **kwargs:
+            attempts (int): Max attempts.
+            backoff (float): Delay before the first retry in seconds.
+            max_backoff (float): Max delay between retries in seconds.
+            jitter (bool): Randomise delays (full jitter).
+            hedge (bool): Hedge slow attempts.
+        """
+        self.attempts = int(kwargs.setdefault("attempts", CONSTANTS().RETRY_ATTEMPTS))
+        self.backoff = float(kwargs.setdefault("backoff", CONSTANTS().RETRY_BACKOFF))
+        self.max_backoff = float(kwargs.setdefault("max_backoff", CONSTANTS().RETRY_MAX_BACKOFF))
+        self.jitter = kwargs.setdefault("jitter", True)
+        self.hedge = kwargs.setdefault("hedge", False)
+
+    def get_delay(self, retry):
+        """Get the delay before a retry.
+
+        Args:
+            retry (int): Retry number, from 0.
+
+        Returns:
+            delay (float): Seconds.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** retry)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+def _record_latency(cmd, seconds):
+    with _latency_lock:
+        samples = _latencies.get(cmd)
+        if samples is None:
+            samples = _latencies[cmd] = collections.deque(
+                maxlen=CONSTANTS().LATENCY_SAMPLES,
+            )
+            while len(_latencies) > CONSTANTS().LATENCY_COMMANDS:
+                _latencies.popitem(last=False)
+        else:
+            _latencies.move_to_end(cmd)
+        samples.append(seconds)
+    return None
+
+
+def get_latency(cmd, q):
+    """Get a percentile of the recent latencies of a command.
+
+    Latencies of every get_shell_cmd() attempt are kept per command string,
+    for the LATENCY_COMMANDS most recently run commands.
+
+    Args:
+        cmd (str): Command.
+        q (float): Percentile (0-100).
 
     Returns:
-        dict(
-            ret_code (str): Return code.
-            stdout (str): STDOUT.
-            stderr (str): STDERR.
-        )
+        seconds (float): Latency, None if fewer than HEDGE_MIN_SAMPLES.
+    """
+    with _latency_lock:
+        samples = sorted(_latencies.get(cmd, ()))
+    if len(samples) < CONSTANTS().HEDGE_MIN_SAMPLES:
+        return None
+    index = min(len(samples) - 1, int(math.ceil(len(samples) * q / 100.0)) - 1)
+    return samples[max(index, 0)]
+
+
+def reset_latency():
+    """Clear recorded command latencies."""
+    with _latency_lock:
+        _latencies.clear()
+    return None
 
-    Raises:
-        OSError: Error starting shell command.
-        KeyboardInterrupt: CTRL-C caught while running command.
+
+def _run_shell_cmd(cmd, cwd, encoding, procs=None, cancel=None):
+    """Run a (piped) command once, see get_shell_cmd().
+
+    Started processes are appended to procs, so a hedging caller can kill
+    them. If cancel is set once the command ends, None is returned and the
+    return code is not checked.
     """
-    my_cwd = kwargs.setdefault("cwd", None)
-    my_encoding = kwargs.setdefault("encoding", 'utf-8')
     my_stdin = None
     cmd_list = []
 
@@ -173,21 +324,27 @@ def get_shell_cmd(cmd, **kwargs):
 
     for i, cmd in enumerate(cmd_list):
         cmd = cmd_cleanup(cmd)
-        try:
-            p = subprocess.Popen(
-                cmd,
-                shell = False,
-                stdin = subprocess.PIPE,
-                stdout = subprocess.PIPE,
-                stderr = subprocess.PIPE,
-                cwd = my_cwd,
-                encoding = my_encoding,
-            )
-        except OSError:
-            logger.error("Shell Command Start Error")
-            logger.debug("cmd: {0}".format(cmd))
-            raise
+        if _backend is not None:
+            result = _backend.run(cmd, cwd=cwd, stdin=my_stdin, encoding=encoding)
+            r = (result["stdout"], result["stderr"])
+            ret_code = result["ret_code"]
         else:
+            try:
+                p = subprocess.Popen(
+                    cmd,
+                    shell = False,
+                    stdin = subprocess.PIPE,
+                    stdout = subprocess.PIPE,
+                    stderr = subprocess.PIPE,
+                    cwd = cwd,
+                    encoding = encoding,
+                )
+            except OSError:
+                logger.error("Shell Command Start Error")
+                logger.debug("cmd: {0}".format(cmd))
+                raise
+            if procs is not None:
+                procs.append(p)
             try:
                 r = p.communicate(my_stdin)
             except KeyboardInterrupt:
@@ -195,17 +352,126 @@ def get_shell_cmd(cmd, **kwargs):
                 logger.debug(testvar.get_debug(cmd))
                 p.terminate()
                 raise
-            else:
-                stderr = r[1]
-                ret_code = p.returncode
-                check_returncode(cmd, ret_code)
-                if i == (len(cmd_list) - 1):  # Last command
-                    stdout = r[0]
-                else:  # Otherwise pipe to next command
-                    my_stdin = r[0]
+            ret_code = p.returncode
+        if cancel is not None and cancel.is_set():
+            return None
+        stderr = r[1]
+        check_returncode(cmd, ret_code, stderr)
+        if i == (len(cmd_list) - 1):  # Last command
+            stdout = r[0]
+        else:  # Otherwise pipe to next command
+            my_stdin = r[0]
 
     return {
         'ret_code': ret_code,
         'stdout': stdout,
         'stderr': stderr
     }
+
+
+def _run_timed(cmd, cwd, encoding, procs=None, cancel=None):
+    start = time.perf_counter()
+    result = _run_shell_cmd(cmd, cwd, encoding, procs, cancel)
+    if result is not None:
+        _record_latency(cmd, time.perf_counter() - start)
+    return result
+
+
+def _run_hedged(cmd, cwd, encoding, delay):
+    """Run cmd, start a second attempt if the first exceeds delay.
+
+    Returns the first successful result, or raises the last error.
+    """
+    results = queue.Queue()
+    cancel = threading.Event()
+    attempts = []
+
+    def run(procs):
+        try:
+            results.put((_run_timed(cmd, cwd, encoding, procs, cancel), None))
+        except Exception as e:
+            results.put((None, e))
+
+    def start():
+        procs = []
+        attempts.append(procs)
+        threading.Thread(
+            target = run,
+            args = (procs,),
+            name = "HedgedCommand",
+            daemon = True,
+        ).start()
+
+    try:
+        start()
+        try:
+            result, exc = results.get(timeout=delay)
+        except queue.Empty:
+            logger.debug("Hedging slow command: {0}".format(cmd))
+            start()
+            result, exc = results.get()
+        if exc is not None and len(attempts) > 1:
+            result, exc = results.get()  # other attempt may still succeed
+        if exc is not None:
+            raise exc
+        return result
+    finally:
+        cancel.set()
+        for procs in attempts:
+            for p in procs:
+                if p.poll() is None:
+                    p.kill()
+
+
+def get_shell_cmd(cmd, **kwargs):
+    """Get shell command output.
+
+    Args:
+        cmd (str): Command to run.
+
+    **kwargs:
+        cwd (str): Current working dir from which to run cmd.
+        encoding (str): Text encoding.
+        retry (RetryPolicy): Retry transient failures. Single attempt if
+            None.
+
+    Returns:
+        dict(
+            ret_code (str): Return code.
+            stdout (str): STDOUT.
+            stderr (str): STDERR.
+        )
+
+    Raises:
+        OSError: Error starting shell command.
+        KeyboardInterrupt: CTRL-C caught while running command.
+        error.ShellCommandExecutionError: Error executing command (after
+            retries).
+    """
+    my_cwd = kwargs.setdefault("cwd", None)
+    my_encoding = kwargs.setdefault("encoding", 'utf-8')
+    my_retry = kwargs.setdefault("retry", None)
+    if my_retry is None:
+        return _run_timed(cmd, my_cwd, my_encoding)
+
+    for attempt in range(max(1, my_retry.attempts)):
+        delay = None
+        if my_retry.hedge:
+            delay = get_latency(cmd, CONSTANTS().HEDGE_PERCENTILE)
+        try:
+            if delay is None:
+                return _run_timed(cmd, my_cwd, my_encoding)
+            return _run_hedged(cmd, my_cwd, my_encoding, delay)
+        except error.ShellCommandExecutionError as e:
+            info = dict(e.args)
+            if (
+                attempt >= my_retry.attempts - 1
+                or not get_registry().is_retryable(
+                    info["cmd"], info["ret_code"], info.get("stderr"),
+                )
+            ):
+                raise
+            wait = my_retry.get_delay(attempt)
+            logger.warning("Shell Command Retry")
+            logger.debug(testvar.get_debug((cmd, info["ret_code"], attempt + 1, wait)))
+            time.sleep(wait)
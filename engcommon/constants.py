@@ -3,8 +3,64 @@
 """
 This module defines constants for frequently used commands for institutional
 standardisation across packages.
+
+Commands and accepted non-zero return codes come from a CommandRegistry,
+loaded once per process from the built-in defaults below plus optional
+JSON override files (see REGISTRY_FILES), e.g.
+/etc/engcommon/commands.esc4000-g4.json:
+
+    {
+        "commands": {"ipmitool": "ipmitool -I open"},
+        "ignore_returncode": {"ipmitool fru": [1]},
+        "retry_returncode": {"ipmitool": [1, 6]},
+        "retry_stderr": {"ipmitool": ["(?i)timeout", "(?i)node busy"]}
+    }
+
+A retryable return code of a command with retry_stderr patterns is
+only transient if its STDERR matches one of them.
 """
 
+import json
+import logging
+import os
+import re
+import threading
+import types
+
+logger = logging.getLogger(__name__)
+
+_COMMANDS = {
+    "cpuinfo": "cat /proc/cpuinfo",
+    "dmidecode": "dmidecode",
+    "ipmitool": "ipmitool",
+    "lscpu": "lscpu",
+    "meminfo": "cat /proc/meminfo",
+    "nproc": "nproc",
+    "ssh": "ssh",
+    "uname": "uname",
+}
+
+_IGNORE_RETURNCODE = {
+    "smartctl": 4,
+}
+
+_RETRY_RETURNCODE = {
+    "ipmitool": [1],  # any error, narrowed by _RETRY_STDERR
+    "smartctl": [2],  # device open failed (busy)
+}
+
+_RETRY_STDERR = {
+    "ipmitool": [  # not e.g. bad credentials or an unsupported command
+        r"(?i)time(d)?[ -]?out",
+        r"(?i)node busy",
+        r"(?i)insufficient resources for session",
+        r"(?i)temporarily unavailable",
+    ],
+}
+
+_registry = None
+_registry_lock = threading.Lock()
+
 
 def constant(f):
     def fset(self, value):
@@ -15,12 +71,270 @@ def constant(f):
     return property(fget, fset)
 
 
+def _compile_rules(rules):
+    """Get (rules, trie) with return codes as frozensets.
+
+    The trie is nested dicts keyed by character; the None key of a node
+    holds the return codes of the prefix ending there.
+    """
+    compiled = {}
+    trie = {}
+    for prefix, codes in rules.items():
+        codes = frozenset([codes] if isinstance(codes, int) else codes)
+        compiled[prefix] = codes
+        node = trie
+        for c in prefix:
+            node = node.setdefault(c, {})
+        node[None] = node.get(None, frozenset()) | codes
+    return types.MappingProxyType(compiled), trie
+
+
+def _match_rules(trie, cmd, ret_code):
+    """Get whether any rule prefix of cmd holds ret_code.
+
+    List commands are matched as if joined by spaces, without joining.
+    """
+    node = trie
+    parts = (cmd,) if isinstance(cmd, str) else cmd
+    first = True
+    for part in parts:
+        if not first:
+            codes = node.get(None)
+            if codes is not None and ret_code in codes:
+                return True
+            node = node.get(" ")
+            if node is None:
+                return False
+        first = False
+        for c in part:
+            codes = node.get(None)
+            if codes is not None and ret_code in codes:
+                return True
+            node = node.get(c)
+            if node is None:
+                return False
+    codes = node.get(None)
+    return codes is not None and ret_code in codes
+
+
+class CommandRegistry:
+    """A class for a frozen command registry and return-code policy.
+
+    Return-code rules are compiled into character tries of command
+    prefixes, so lookups walk the command once and allocate nothing, for
+    str and list commands alike.
+
+    Attributes:
+        commands (mappingproxy): keys are names, values are commands
+            (executable and default args).
+        ignore_returncode (mappingproxy): keys are command prefixes, values
+            are frozensets of accepted non-zero return codes.
+        retry_returncode (mappingproxy): keys are command prefixes, values
+            are frozensets of transient (retryable) return codes.
+        retry_stderr (mappingproxy): keys are command prefixes, values are
+            tuples of compiled regexes, one of which STDERR must match for a
+            retry.
+    """
+
+    __slots__ = (
+        "_commands", "_ignore_returncode", "_ignore_trie",
+        "_retry_returncode", "_retry_trie", "_retry_stderr",
+    )
+
+    def __init__(self, commands, ignore_returncode, retry_returncode=None, retry_stderr=None):
+        """Init CommandRegistry.
+
+        Args:
+            commands (dict): keys are names, values are commands.
+            ignore_returncode (dict): keys are command prefixes, values are
+                a return code (int) or return codes (list).
+            retry_returncode (dict): Same format as ignore_returncode.
+            retry_stderr (dict): keys are command prefixes, values are
+                regexes (list), one of which STDERR must match for a retry.
+
+        Raises:
+            re.error: Invalid regex.
+        """
+        ignore_rules, ignore_trie = _compile_rules(ignore_returncode)
+        retry_rules, retry_trie = _compile_rules(retry_returncode or {})
+        stderr_rules = {
+            prefix: tuple(re.compile(p) for p in patterns)
+            for prefix, patterns in (retry_stderr or {}).items()
+        }
+        object.__setattr__(self, "_commands", types.MappingProxyType(dict(commands)))
+        object.__setattr__(self, "_ignore_returncode", ignore_rules)
+        object.__setattr__(self, "_ignore_trie", ignore_trie)
+        object.__setattr__(self, "_retry_returncode", retry_rules)
+        object.__setattr__(self, "_retry_trie", retry_trie)
+        object.__setattr__(self, "_retry_stderr", types.MappingProxyType(stderr_rules))
+
+    def __setattr__(self, name, value):
+        raise TypeError
+
+    @property
+    def commands(self):
+        """Get commands."""
+        return self._commands
+
+    @property
+    def ignore_returncode(self):
+        """Get ignore_returncode."""
+        return self._ignore_returncode
+
+    @property
+    def retry_returncode(self):
+        """Get retry_returncode."""
+        return self._retry_returncode
+
+    @property
+    def retry_stderr(self):
+        """Get retry_stderr."""
+        return self._retry_stderr
+
+    def get_command(self, name):
+        """Get a command by name.
+
+        Args:
+            name (str): Command name (e.g. "lscpu").
+
+        Returns:
+            cmd (str): Executable and default args.
+
+        Raises:
+            KeyError: Unknown command name.
+        """
+        return self._commands[name]
+
+    def is_ignored(self, cmd, ret_code):
+        """Get whether a return code is accepted for a command.
+
+        Args:
+            cmd (str|list): Command.
+            ret_code (int): Return code.
+
+        Returns:
+            ignored (bool): Return code accepted.
+        """
+        return _match_rules(self._ignore_trie, cmd, ret_code)
+
+    def is_retryable(self, cmd, ret_code, stderr=None):
+        """Get whether a failure is transient for a command.
+
+        Args:
+            cmd (str|list): Command.
+            ret_code (int): Return code.
+            stderr (str): STDERR, checked against retry_stderr.
+
+        Returns:
+            retryable (bool): Failure worth retrying.
+        """
+        if not _match_rules(self._retry_trie, cmd, ret_code):
+            return False
+        if self._retry_stderr:
+            cmd = cmd if isinstance(cmd, str) else " ".join(cmd)
+            for prefix, patterns in self._retry_stderr.items():
+                if cmd.startswith(prefix) and not any(p.search(stderr or "") for p in patterns):
+                    return False
+        return True
+
+    @classmethod
+    def from_files(cls, paths):
+        """Get a registry from the defaults updated by override files.
+
+        Files are applied in order; missing files are skipped, unreadable
+        or malformed files are logged and skipped.
+
+        Args:
+            paths (list): JSON override files.
+
+        Returns:
+            registry (CommandRegistry): Registry.
+        """
+        commands = dict(_COMMANDS)
+        ignore_returncode = dict(_IGNORE_RETURNCODE)
+        retry_returncode = dict(_RETRY_RETURNCODE)
+        retry_stderr = dict(_RETRY_STDERR)
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path) as f:
+                    override = json.load(f)
+                for patterns in override.get("retry_stderr", {}).values():
+                    for pattern in patterns:
+                        re.compile(pattern)  # validate before applying
+                commands.update(override.get("commands", {}))
+                ignore_returncode.update(override.get("ignore_returncode", {}))
+                retry_returncode.update(override.get("retry_returncode", {}))
+                retry_stderr.update(override.get("retry_stderr", {}))
+            except (OSError, ValueError, AttributeError, re.error):
+                logger.error("Command Registry Override Error")
+                logger.debug("path: {0}".format(path))
+        return cls(commands, ignore_returncode, retry_returncode, retry_stderr)
+
+
+def _get_platform():
+    """Get platform name for override files (e.g. "esc4000-g4")."""
+    try:
+        with open(_const().FILE_DMI_PRODUCT_NAME) as f:
+            name = f.read().strip().lower()
+    except OSError:
+        return ""
+    return re.sub(r"[^a-z0-9]+", "-", name).strip("-")
+
+
+def get_registry():
+    """Get the process-wide command registry, loaded on first use.
+
+    Returns:
+        registry (CommandRegistry): Registry.
+    """
+    global _registry
+    registry = _registry
+    if registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CommandRegistry.from_files(_const().REGISTRY_FILES)
+            registry = _registry
+    return registry
+
+
+def set_registry(registry=None):
+    """Set the process-wide command registry.
+
+    Args:
+        registry (CommandRegistry): Registry. Reloaded on next use if None.
+
+    Returns:
+        None
+    """
+    global _registry
+    with _registry_lock:
+        _registry = registry
+    return None
+
+
 class _const(object):
 
     @constant
     def INI_URL():
         return "http://hosaka.local/ini/builder.json"
 
+    @constant
+    def INI_TIMEOUT():
+        "Timeout of an INI URL request"
+        return 10  # seconds (int/float)
+
+    @constant
+    def INI_POLL_INTERVAL():
+        "Interval between checks of a local INI file for changes"
+        return 5  # seconds (int/float)
+
+    @constant
+    def INI_REFRESH_INTERVAL():
+        "Interval between refreshes of an INI URL"
+        return 300  # seconds (int/float)
+
     # === START XHPL CONFIG===
 
     @constant
@@ -33,41 +347,304 @@ class _const(object):
         "Timeout for XHPL test before killed"
         return 24  # hours (int/float)
 
+    @constant
+    def XHPL_NB():
+        "Candidate XHPL block sizes"
+        return (128, 192, 224, 232, 256, 384)
+
+    @constant
+    def XHPL_EFFICIENCY():
+        "Fraction of peak FLOPS expected when not measured"
+        return 0.75  # fraction (float)
+
+    @constant
+    def XHPL_MIN_EFFICIENCY():
+        "Min fraction of peak DGEMM FLOPS for a node to qualify"
+        return 0.5  # fraction (float)
+
     # === END XHPL CONFIG ===
     # === START HARDWARE COMMANDS ===
 
     @constant
     def CMD_CPUINFO():
-        return "cat /proc/cpuinfo"
+        return get_registry().get_command("cpuinfo")
 
     @constant
     def CMD_DMIDECODE():
-        return "dmidecode"
+        return get_registry().get_command("dmidecode")
 
     @constant
     def CMD_IPMITOOL():
-        return "ipmitool"
+        return get_registry().get_command("ipmitool")
 
     @constant
     def CMD_LSCPU():
-        return "lscpu"
+        return get_registry().get_command("lscpu")
 
     @constant
     def CMD_MEMINFO():
-        return "cat /proc/meminfo"
+        return get_registry().get_command("meminfo")
 
     @constant
     def CMD_NPROC():
-        return "nproc"
+        return get_registry().get_command("nproc")
+
+    @constant
+    def CMD_SSH():
+        return get_registry().get_command("ssh")
 
     @constant
     def CMD_UNAME():
-        return "uname"
+        return get_registry().get_command("uname")
+
+    @constant
+    def COMMAND_REGISTRY():
+        "Compiled commands and return-code policy, incl. override files"
+        return get_registry()
 
     @constant
     def IGNORE_RETURNCODE():
-        return {
-            "smartctl": 4,
-        }
+        "Built-in accepted return codes, see COMMAND_REGISTRY for overrides"
+        return dict(_IGNORE_RETURNCODE)
+
+    @constant
+    def REGISTRY_FILES():
+        "Command registry override files, later files win"
+        paths = ["/etc/engcommon/commands.json"]
+        platform = _get_platform()
+        if platform:
+            paths.append("/etc/engcommon/commands.{0}.json".format(platform))
+        env = os.environ.get("ENGCOMMON_COMMANDS")
+        if env:
+            paths.extend(env.split(os.pathsep))
+        return paths
+
+    @constant
+    def RETRY_RETURNCODE():
+        "Built-in transient return codes, see COMMAND_REGISTRY for overrides"
+        return {k: list(v) for k, v in _RETRY_RETURNCODE.items()}
 
     # === END HARDWARE COMMANDS ===
+    # === START COMMAND CONFIG ===
+
+    @constant
+    def RETRY_ATTEMPTS():
+        "Attempts per command under a retry policy"
+        return 3  # attempts (int)
+
+    @constant
+    def RETRY_BACKOFF():
+        "Delay before the first retry, doubled per retry"
+        return 0.5  # seconds (int/float)
+
+    @constant
+    def RETRY_MAX_BACKOFF():
+        "Max delay between retries"
+        return 30  # seconds (int/float)
+
+    @constant
+    def LATENCY_COMMANDS():
+        "Commands whose latencies are kept for hedging, least recent dropped"
+        return 256  # commands (int)
+
+    @constant
+    def LATENCY_SAMPLES():
+        "Recent latencies kept per command for hedging"
+        return 100  # samples (int)
+
+    @constant
+    def HEDGE_MIN_SAMPLES():
+        "Latencies observed for a command before hedging it"
+        return 20  # samples (int)
+
+    @constant
+    def HEDGE_PERCENTILE():
+        "Latency percentile after which a hedged attempt starts"
+        return 95  # percentile (int/float)
+
+    @constant
+    def REPLAY_ENV():
+        "Env vars that distinguish recorded command invocations"
+        return ("LANG", "LC_ALL")
+
+    @constant
+    def FANOUT_WORKERS():
+        "Max hosts a fan-out command runs on concurrently"
+        return 32  # hosts (int)
+
+    @constant
+    def FANOUT_TIMEOUT():
+        "Per-host timeout of a fan-out command"
+        return 60  # seconds (int/float)
+
+    @constant
+    def SSH_CONTROL_PERSIST():
+        "Idle time before a reused SSH master connection closes"
+        return 60  # seconds (int)
+
+    # === END COMMAND CONFIG ===
+    # === START HARDWARE FILES ===
+
+    @constant
+    def FILE_PROC_STAT():
+        return "/proc/stat"
+
+    @constant
+    def FILE_MEMINFO():
+        return "/proc/meminfo"
+
+    @constant
+    def FILE_BOOT_ID():
+        return "/proc/sys/kernel/random/boot_id"
+
+    @constant
+    def FACT_CACHE_FILE():
+        "Static hardware facts cached per boot"
+        return "/var/cache/engcommon/facts.json"
+
+    @constant
+    def FILE_DMI_PRODUCT_NAME():
+        return "/sys/class/dmi/id/product_name"
+
+    @constant
+    def FILE_PROC_CGROUP():
+        return "/proc/self/cgroup"
+
+    @constant
+    def DIR_CGROUP():
+        return "/sys/fs/cgroup"
+
+    @constant
+    def GLOB_CPUFREQ():
+        return "/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq"
+
+    @constant
+    def GLOB_THERMAL():
+        return "/sys/class/thermal/thermal_zone[0-9]*/temp"
+
+    # === END HARDWARE FILES ===
+    # === START TELEMETRY CONFIG ===
+
+    @constant
+    def TELEMETRY_INTERVAL():
+        "Interval between telemetry samples"
+        return 1.0  # seconds (float)
+
+    @constant
+    def TELEMETRY_CAPACITY():
+        "Number of samples kept in telemetry ring buffers"
+        return 3600  # samples (int)
+
+    @constant
+    def TELEMETRY_MAX_OVERHEAD():
+        "Max fraction of one core spent sampling before backing off"
+        return 0.01  # fraction (float)
+
+    # === END TELEMETRY CONFIG ===
+    # === START LOG CONFIG ===
+
+    @constant
+    def LOG_MAX_BYTES():
+        "Size at which run log files roll over"
+        return 64 * 1024 * 1024  # bytes (int)
+
+    @constant
+    def LOG_INTERVAL():
+        "Age at which run log files roll over"
+        return 3600  # seconds (int/float)
+
+    @constant
+    def LOG_BACKUP_COUNT():
+        "Compressed log segments kept per log file, 0 keeps all"
+        return 48  # segments (int)
+
+    @constant
+    def LOG_DEDUP_WINDOW():
+        "Window in which repeated log records are suppressed"
+        return 60  # seconds (int/float)
+
+    @constant
+    def LOG_DEDUP_BURST():
+        "Repeated log records passed per window before suppressing"
+        return 5  # records (int)
+
+    @constant
+    def LOG_CONTROL_FILE():
+        "Log level control file name in the logdir"
+        return "loglevel.ctl"
+
+    @constant
+    def LOG_CONTROL_INTERVAL():
+        "Interval between log level control file polls"
+        return 5  # seconds (int/float)
+
+    @constant
+    def MPLOG_QUEUE_SIZE():
+        "Records queued for the log writer process before producers block"
+        return 10000  # records (int)
+
+    @constant
+    def MPLOG_WINDOW():
+        "Time records are held by the log writer for timestamp ordering"
+        return 0.2  # seconds (float)
+
+    @constant
+    def MPLOG_PUT_TIMEOUT():
+        "Time a producer blocks on a full log queue before dropping"
+        return 30  # seconds (int/float)
+
+    @constant
+    def RUNID_REGISTRY_FILE():
+        "Registry of issued run IDs (log_id)"
+        return "~/.cache/engcommon/runids.bloom"
+
+    @constant
+    def RUNID_CAPACITY():
+        "Run IDs the registry is sized for"
+        return 1000000  # IDs (int)
+
+    @constant
+    def RUNID_ERROR_RATE():
+        "Registry false positive rate at capacity (costs a regeneration)"
+        return 1e-6  # fraction (float)
+
+    @constant
+    def RUNID_ATTEMPTS():
+        "Random phrases tried for an unused run ID"
+        return 100  # attempts (int)
+
+    # === END LOG CONFIG ===
+    # === START TRACE CONFIG ===
+
+    @constant
+    def TRACE_BUCKETS():
+        "Latency histogram bucket upper bounds"
+        return (
+            0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+            0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300,
+        )  # seconds (float)
+
+    @constant
+    def PROM_INTERVAL():
+        "Interval between Prometheus textfile writes"
+        return 60  # seconds (int/float)
+
+    # === END TRACE CONFIG ===
+    # === START IPMI CONFIG ===
+
+    @constant
+    def IPMI_PROMPT():
+        "Prompt printed by 'ipmitool shell'"
+        return "ipmitool> "
+
+    @constant
+    def IPMI_CACHE_TTL():
+        "Lifetime of cached IPMI query results"
+        return 10  # seconds (int/float)
+
+    @constant
+    def IPMI_TIMEOUT():
+        "Timeout for a single IPMI shell query"
+        return 30  # seconds (int/float)
+
+    # === END IPMI CONFIG ===
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+"""
+This module contains an on-disk cache of static hardware facts.
+
+Facts such as the system UUID, serial number and DMI tables do not change
+within a boot, but reading them runs dmidecode (with sudo). A privileged
+collector writes them once per boot (see hardware.collect_static_facts());
+unprivileged tools then read the cache instead of running commands.
+
+The cache is keyed by the kernel boot ID, so it is invalidated by a reboot.
+Within a process the parsed cache is reused until the file's mtime, size or
+inode change. The file is replaced atomically, so concurrent writers never
+leave a partial file.
+
+    Typical Usage:
+
+    # as root, e.g. from a boot-time unit
+    hardware.collect_static_facts()
+
+    # anywhere else
+    uuid = hardware.get_uuid()  # served from the cache when valid
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+from . import fileio
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+
+def get_boot_id():
+    """Get the kernel boot ID.
+
+    Returns:
+        boot_id (str): Boot ID, "" if unavailable.
+    """
+    try:
+        with open(CONSTANTS().FILE_BOOT_ID) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+class FactCache:
+    """A class for an on-disk cache of static hardware facts.
+
+    Attributes:
+        path (str): Cache file.
+        boot_id (str): Boot ID of this boot.
+    """
+
+    def __init__(self, path=None, boot_id=None):
+        """Init FactCache.
+
+        Args:
+            path (str): Cache file.
+            boot_id (str): Boot ID, read from FILE_BOOT_ID if None.
+        """
+        self._path = path or CONSTANTS().FACT_CACHE_FILE
+        self._boot_id = boot_id
+        self._lock = threading.Lock()
+        self._stat = None  # (mtime_ns, size, ino) of the loaded file
+        self._facts = {}
+
+    @property
+    def path(self):
+        """Get path."""
+        return self._path
+
+    @property
+    def boot_id(self):
+        """Get boot_id."""
+        if self._boot_id is None:
+            self._boot_id = get_boot_id()  # constant for the process lifetime
+        return self._boot_id
+
+    def _load(self):
+        """Get facts of this boot, re-reading the file only if it changed."""
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return {}
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+        with self._lock:
+            if key == self._stat:
+                return self._facts
+            facts = {}
+            try:
+                with open(self._path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                logger.warning("Fact Cache Read Error")
+                logger.debug("path: {0}".format(self._path))
+            else:
+                if (
+                    isinstance(data, dict)
+                    and self.boot_id
+                    and data.get("boot_id") == self.boot_id
+                ):
+                    facts = data.get("facts", {})
+            self._stat = key
+            self._facts = facts
+            return facts
+
+    def get(self, name, default=None):
+        """Get a cached fact.
+
+        Args:
+            name (str): Fact name (e.g. "uuid").
+            default (any): Returned if not cached for this boot.
+
+        Returns:
+            value (any): Fact value.
+        """
+        return self._load().get(name, default)
+
+    def get_all(self):
+        """Get all cached facts of this boot.
+
+        Returns:
+            facts (dict): keys are fact names.
+        """
+        return dict(self._load())
+
+    def update(self, facts):
+        """Add facts to the cache of this boot.
+
+        Facts cached in a previous boot are dropped.
+
+        Args:
+            facts (dict): keys are fact names, values are JSON serialisable.
+
+        Returns:
+            None
+
+        Raises:
+            OSError: Error writing cache file.
+        """
+        merged = self.get_all()
+        merged.update(facts)
+        data = {
+            "boot_id": self.boot_id,
+            "created": time.time(),
+            "facts": merged,
+        }
+        fileio.write_file_atomic(self._path, json.dumps(data, sort_keys=True))
+        return None
+
+    def clear(self):
+        """Remove the cache file.
+
+        Returns:
+            None
+        """
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._stat = None
+            self._facts = {}
+        return None
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+
+"""
+This module generates synthetic host trees for testing and benchmarking the
+hardware parsers offline.
+
+A tree holds /proc, /sys and captured command output (lscpu, dmidecode,
+uname) for a parameterised host shape, e.g. 8 sockets x 32 cores x 2 threads
+with 64 DIMMs.
+
+    Typical Usage:
+
+    root = fakehost.write_fake_host("/tmp/host512", sockets=8, cores=32)
+    hardware.set_root(root)
+    hardware.set_command_hook(fakehost.get_command_hook(root))
+    hardware.get_cpu_core_count()  # 256
+"""
+
+import logging
+import os
+import random
+import uuid
+
+from . import fileio
+from . import hardware
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+CPU_MODELS = {
+    "intel": {
+        "vendor_id": "GenuineIntel",
+        "cpu family": "6",
+        "model": "106",
+        "model name": "Intel(R) Xeon(R) Platinum 8380 CPU @ 2.30GHz",
+        "flags": " ".join(hardware._CPU_FLAGS[:85]),
+        "mhz": 2300,
+    },
+    "amd": {
+        "vendor_id": "AuthenticAMD",
+        "cpu family": "25",
+        "model": "1",
+        "model name": "AMD EPYC 7763 64-Core Processor",
+        "flags": " ".join(
+            i for i in hardware._CPU_FLAGS[:85] if not i.startswith("avx512")
+        ),
+        "mhz": 2450,
+    },
+}
+
+
+def get_command_file(cmd):
+    """Get the file name holding captured output of a command.
+
+    Args:
+        cmd (str): Command (e.g. "dmidecode -s system-serial-number").
+
+    Returns:
+        filename (str): File name under "commands/".
+    """
+    return cmd.strip().replace(" ", "_").replace("/", "%")
+
+
+def get_command_hook(root):
+    """Get a command hook serving output from a fake host tree.
+
+    "cat <file>" reads <file> under root; other commands read
+    root/commands/<get_command_file(cmd)>. Unknown commands return None.
+
+    Args:
+        root (str): Fake host root.
+
+    Returns:
+        hook (callable): Hook for hardware.set_command_hook().
+    """
+    def hook(cmd):
+        argv = cmd.split()
+        if argv[0] == "cat" and len(argv) == 2:
+            path = os.path.join(root, argv[1].lstrip("/"))
+        else:
+            path = os.path.join(root, "commands", get_command_file(cmd))
+        try:
+            with open(path, "r") as f:
+                return f.read()
+        except OSError:
+            return None
+    return hook
+
+
+def _get_topology(sockets, cores, threads):
+    """Get (processor, socket, core, thread) in Linux enumeration order.
+
+    Linux numbers the first thread of every core across all sockets before
+    any sibling threads.
+    """
+    topology = []
+    for t in range(threads):
+        for s in range(sockets):
+            for c in range(cores):
+                processor = t * sockets * cores + s * cores + c
+                topology.append((processor, s, c, t))
+    return topology
+
+
+def get_cpuinfo(topology, cores, threads, model):
+    """Get /proc/cpuinfo text.
+
+    Args:
+        topology (list): (processor, socket, core, thread) tuples.
+        cores (int): Cores per socket.
+        threads (int): Threads per core.
+        model (dict): CPU_MODELS entry.
+
+    Returns:
+        cpuinfo (str): cpuinfo.
+    """
+    stanzas = []
+    for processor, s, c, t in topology:
+        stanzas.append(
+            "processor\t: {0}\n"
+            "vendor_id\t: {1}\n"
+            "cpu family\t: {2}\n"
+            "model\t\t: {3}\n"
+            "model name\t: {4}\n"
+            "stepping\t: 6\n"
+            "cpu MHz\t\t: {5:.3f}\n"
+            "cache size\t: 55296 KB\n"
+            "physical id\t: {6}\n"
+            "siblings\t: {7}\n"
+            "core id\t\t: {8}\n"
+            "cpu cores\t: {9}\n"
+            "apicid\t\t: {10}\n"
+            "fpu\t\t: yes\n"
+            "flags\t\t: {11}\n"
+            "bogomips\t: {12:.2f}\n"
+            "power management:\n".format(
+                processor, model["vendor_id"], model["cpu family"], model["model"],
+                model["model name"], model["mhz"] + (processor % 5) * 100.0, s,
+                cores * threads, c, cores, (s << 8) | (c << 1) | t, model["flags"],
+                model["mhz"] * 2.0,
+            )
+        )
+    return "\n".join(stanzas) + "\n"
+
+
+def get_meminfo(mem_kb):
+    """Get /proc/meminfo text.
+
+    Args:
+        mem_kb (int): MemTotal in kB.
+
+    Returns:
+        meminfo (str): meminfo.
+    """
+    fields = [
+        ("MemTotal", mem_kb),
+        ("MemFree", mem_kb * 9 // 10),
+        ("MemAvailable", mem_kb * 19 // 20),
+        ("Buffers", 1024),
+        ("Cached", mem_kb // 50),
+        ("SwapTotal", 0),
+        ("SwapFree", 0),
+        ("HugePages_Total", 0),
+        ("Hugepagesize", 2048),
+    ]
+    lines = []
+    for k, v in fields:
+        unit = "" if k.startswith("HugePages") else " kB"
+        lines.append("{0:<16}{1:>8}{2}".format(k + ":", v, unit))
+    return "\n".join(lines) + "\n"
+
+
+def get_stat(num_cpus):
+    """Get /proc/stat text.
+
+    Args:
+        num_cpus (int): Logical CPU count.
+
+    Returns:
+        stat (str): stat.
+    """
+    lines = ["cpu  {0} 0 {1} {2} 0 0 0 0 0 0".format(
+        100 * num_cpus, 50 * num_cpus, 1000 * num_cpus,
+    )]
+    for i in range(num_cpus):
+        lines.append("cpu{0} 100 0 50 1000 0 0 0 0 0 0".format(i))
+    lines.append("ctxt 0")
+    return "\n".join(lines) + "\n"
+
+
+def _get_cpu_list(cpus):
+    """Get kernel CPU list string from sorted CPU indices."""
+    ranges = []
+    for cpu in cpus:
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(
+        str(lo) if lo == hi else "{0}-{1}".format(lo, hi) for lo, hi in ranges
+    )
+
+
+def get_lscpu(topology, sockets, cores, threads, numa_nodes, model, numa_cpus):
+    """Get lscpu text.
+
+    Args:
+        topology (list): (processor, socket, core, thread) tuples.
+        sockets (int): Sockets.
+        cores (int): Cores per socket.
+        threads (int): Threads per core.
+        numa_nodes (int): NUMA nodes.
+        model (dict): CPU_MODELS entry.
+        numa_cpus (list): CPU index lists per NUMA node.
+
+    Returns:
+        lscpu (str): lscpu.
+    """
+    num_cpus = len(topology)
+    lines = [
+        ("Architecture", "x86_64"),
+        ("CPU op-mode(s)", "32-bit, 64-bit"),
+        ("Byte Order", "Little Endian"),
+        ("CPU(s)", num_cpus),
+        ("On-line CPU(s) list", "0-{0}".format(num_cpus - 1)),
+        ("Thread(s) per core", threads),
+        ("Core(s) per socket", cores),
+        ("Socket(s)", sockets),
+        ("NUMA node(s)", numa_nodes),
+        ("Vendor ID", model["vendor_id"]),
+        ("CPU family", model["cpu family"]),
+        ("Model", model["model"]),
+        ("Model name", model["model name"]),
+        ("CPU MHz", "{0:.3f}".format(model["mhz"])),
+        ("CPU max MHz", "{0:.4f}".format(model["mhz"] + 1100)),
+        ("CPU min MHz", "800.0000"),
+    ]
+    for node, cpus in enumerate(numa_cpus):
+        lines.append(("NUMA node{0} CPU(s)".format(node), _get_cpu_list(cpus)))
+    lines.append(("Flags", model["flags"]))
+    return "\n".join("{0:<24}{1}".format(k + ":", v) for k, v in lines) + "\n"
+
+
+def get_dmidecode(sockets, dimms, dimm_gb, model, serial_num, system_uuid):
+    """Get dmidecode text.
+
+    Args:
+        sockets (int): Sockets.
+        dimms (int): Populated DIMMs.
+        dimm_gb (int): DIMM size in GB.
+        model (dict): CPU_MODELS entry.
+        serial_num (str): System serial number.
+        system_uuid (str): System UUID.
+
+    Returns:
+        dmidecode (str): dmidecode.
+    """
+    stanzas = [
+        "# dmidecode 3.2\nGetting SMBIOS data from sysfs.\nSMBIOS 3.2.0 present.\n",
+        "Handle 0x0000, DMI type 0, 26 bytes\n"
+        "BIOS Information\n"
+        "\tVendor: Hosaka\n"
+        "\tVersion: 1.4.2\n"
+        "\tRelease Date: 06/15/2020\n",
+        "Handle 0x0001, DMI type 1, 27 bytes\n"
+        "System Information\n"
+        "\tManufacturer: Hosaka\n"
+        "\tProduct Name: Ono-Sendai\n"
+        "\tSerial Number: {0}\n"
+        "\tUUID: {1}\n".format(serial_num, system_uuid),
+    ]
+    handle = 0x0400
+    for s in range(sockets):
+        stanzas.append(
+            "Handle 0x{0:04X}, DMI type 4, 48 bytes\n"
+            "Processor Information\n"
+            "\tSocket Designation: CPU{1}\n"
+            "\tManufacturer: {2}\n"
+            "\tVersion: {3}\n".format(handle, s, model["vendor_id"], model["model name"])
+        )
+        handle += 1
+    handle = 0x1100
+    for d in range(dimms):
+        stanzas.append(
+            "Handle 0x{0:04X}, DMI type 17, 84 bytes\n"
+            "Memory Device\n"
+            "\tSize: {1} GB\n"
+            "\tLocator: CPU{2}_DIMM{3}\n"
+            "\tType: DDR4\n"
+            "\tSpeed: 3200 MT/s\n"
+            "\tManufacturer: Hosaka\n"
+            "\tSerial Number: {4:08X}\n".format(
+                handle, dimm_gb, d % sockets, d // sockets, d,
+            )
+        )
+        handle += 1
+    stanzas.append("Handle 0xFEFF, DMI type 127, 4 bytes\nEnd Of Table\n")
+    return "\n".join(stanzas)
+
+
+def write_fake_host(root, **kwargs):
+    """Write a synthetic host tree.
+
+    Args:
+        root (str): Dir to write the tree in.
+
+    **kwargs:
+        sockets (int): Sockets.
+        cores (int): Cores per socket.
+        threads (int): Threads per core.
+        numa_nodes (int): NUMA nodes. Default: sockets.
+        dimms (int): Populated DIMMs.
+        dimm_gb (int): DIMM size in GB.
+        vendor (str): "intel" or "amd".
+        thermal_zones (int): Thermal zones.
+        shuffle (bool): Write cpuinfo stanzas in random order.
+        seed (int): Random seed for shuffle, serial and UUID.
+
+    Returns:
+        root (str): Root of the tree.
+    """
+    sockets = int(kwargs.setdefault("sockets", 2))
+    cores = int(kwargs.setdefault("cores", 16))
+    threads = int(kwargs.setdefault("threads", 2))
+    numa_nodes = int(kwargs.setdefault("numa_nodes", sockets))
+    dimms = int(kwargs.setdefault("dimms", 8 * sockets))
+    dimm_gb = int(kwargs.setdefault("dimm_gb", 32))
+    vendor = kwargs.setdefault("vendor", "intel")
+    thermal_zones = int(kwargs.setdefault("thermal_zones", sockets))
+    shuffle = kwargs.setdefault("shuffle", False)
+    rng = random.Random(kwargs.setdefault("seed", 0))
+
+    model = CPU_MODELS[vendor]
+    topology = _get_topology(sockets, cores, threads)
+    num_cpus = len(topology)
+    numa_cpus = [[] for i in range(numa_nodes)]
+    for processor, s, c, t in topology:
+        node = (s * cores + c) * numa_nodes // (sockets * cores)
+        numa_cpus[node].append(processor)
+    for cpus in numa_cpus:
+        cpus.sort()
+    serial_num = "HSK{0:06d}".format(rng.randrange(10 ** 6))
+    system_uuid = str(uuid.UUID(int=rng.getrandbits(128)))
+
+    stanzas = sorted(topology)
+    if shuffle:
+        rng.shuffle(stanzas)
+    files = {
+        CONSTANTS().FILE_PROC_STAT: get_stat(num_cpus),
+        CONSTANTS().FILE_MEMINFO: get_meminfo(dimms * dimm_gb * 1024 * 1024),
+        "/proc/cpuinfo": get_cpuinfo(stanzas, cores, threads, model),
+        CONSTANTS().FILE_PROC_CGROUP: "0::/\n",
+        CONSTANTS().DIR_CGROUP + "/cgroup.controllers": "cpuset cpu memory\n",
+        "/sys/devices/system/cpu/online": "0-{0}\n".format(num_cpus - 1),
+    }
+    for processor, s, c, t in topology:
+        path = "/sys/devices/system/cpu/cpu{0}/cpufreq/scaling_cur_freq".format(processor)
+        files[path] = "{0}\n".format((model["mhz"] + (processor % 5) * 100) * 1000)
+    for node, cpus in enumerate(numa_cpus):
+        path = "/sys/devices/system/node/node{0}/cpulist".format(node)
+        files[path] = _get_cpu_list(cpus) + "\n"
+    for zone in range(thermal_zones):
+        path = "/sys/class/thermal/thermal_zone{0}/temp".format(zone)
+        files[path] = "{0}\n".format(40000 + zone * 1000)
+    commands = {
+        CONSTANTS().CMD_LSCPU: get_lscpu(
+            topology, sockets, cores, threads, numa_nodes, model, numa_cpus,
+        ),
+        CONSTANTS().CMD_DMIDECODE: get_dmidecode(
+            sockets, dimms, dimm_gb, model, serial_num, system_uuid,
+        ),
+        "{0} -s system-serial-number".format(CONSTANTS().CMD_DMIDECODE): serial_num + "\n",
+        "{0} -i".format(CONSTANTS().CMD_UNAME): "x86_64\n",
+        CONSTANTS().CMD_NPROC: "{0}\n".format(num_cpus),
+    }
+    for cmd, stdout in commands.items():
+        files["/commands/" + get_command_file(cmd)] = stdout
+    for path, content in files.items():
+        fileio.write_file(os.path.join(root, path.lstrip("/")), content, "w")
+    logger.debug("Fake host: {0} ({1} CPUs, {2} DIMMs)".format(root, num_cpus, dimms))
+    return root
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+"""
+This module contains fan-out execution of a command across many hosts.
+
+FanOut runs a command on each host through a transport, with bounded
+parallelism and a per-host timeout, and yields each host's result as it
+finishes. Transports:
+
+    LocalTransport: /bin/sh on this host, e.g. for "ipmitool -H {host} ...".
+    SSHTransport: OpenSSH, one background master connection per host
+        reused by commands (ControlMaster/ControlPersist).
+    FakeTransport: in-process canned responses, for tests.
+
+"{host}" in a command is replaced by the host name.
+
+    Typical Usage:
+
+    fan = fanout.FanOut(fanout.SSHTransport(), max_workers=64, timeout=30)
+    nodes = clihelper.Hostlist("node[0001-4000]")
+    for result in fan.run(nodes, "cat /proc/loadavg"):
+        print(result.host, result.stdout)
+    for hosts, output in fanout.group_results(fan.run(nodes, "uname -r")):
+        print(clihelper.compress_hostlist(hosts), output["stdout"])
+"""
+
+import collections
+import concurrent.futures
+import itertools
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from . import testvar
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+HostResult = collections.namedtuple(
+    "HostResult",
+    ["host", "ret_code", "stdout", "stderr", "duration", "error"],
+)
+HostResult.__doc__ = """Result of a command on one host.
+
+error is None, or the exception name (e.g. "TimeoutExpired") if the
+command could not complete, in which case ret_code is None.
+"""
+
+
+def _run_argv(argv, timeout):
+    """Run argv, return dict of ret_code, stdout, stderr.
+
+    Raises:
+        OSError: Error starting command.
+        subprocess.TimeoutExpired: Command killed after timeout.
+    """
+    p = subprocess.run(
+        argv,
+        stdin = subprocess.DEVNULL,
+        stdout = subprocess.PIPE,
+        stderr = subprocess.PIPE,
+        timeout = timeout,
+        encoding = "utf-8",
+        errors = "replace",
+    )
+    return {
+        'ret_code': p.returncode,
+        'stdout': p.stdout,
+        'stderr': p.stderr,
+    }
+
+
+class LocalTransport:
+    """A class for running host commands on this host with /bin/sh."""
+
+    def run(self, host, cmd, timeout):
+        """Run a command.
+
+        Args:
+            host (str): Host name (only used in cmd).
+            cmd (str): Shell command.
+            timeout (float): Seconds before the command is killed.
+
+        Returns:
+            dict(
+                ret_code (int): Return code.
+                stdout (str): STDOUT.
+                stderr (str): STDERR.
+            )
+
+        Raises:
+            OSError: Error starting command.
+            subprocess.TimeoutExpired: Command killed after timeout.
+        """
+        return _run_argv(["/bin/sh", "-c", cmd], timeout)
+
+    def close(self):
+        return None
+
+
+class SSHTransport:
+    """A class for running commands on hosts over OpenSSH.
+
+    Before the first command to a host, a master connection is started
+    in the background (ssh -fNM, output to /dev/null) and later commands
+    reuse it, so the per-command cost is a channel open rather than a TCP
+    and key exchange. Commands never become masters themselves, so no
+    persisting process holds their output pipes open; if the master could
+    not be started they connect directly. Masters persist for
+    SSH_CONTROL_PERSIST seconds after last use, or until close().
+
+    Attributes:
+        user (str): Remote user, ssh default if None.
+        options (list): Extra ssh -o options (e.g. ["StrictHostKeyChecking=no"]).
+    """
+
+    def __init__(self, user=None, options=None, control_dir=None):
+        self.user = user
+        self.options = list(options or [])
+        self._own_dir = control_dir is None  # removed by close()
+        self._control_dir = control_dir or tempfile.mkdtemp(prefix="engcommon-ssh-")
+        self._hosts = set()
+        self._host_locks = {}
+        self._lock = threading.Lock()
+
+    def _get_argv(self, host, master="no"):
+        argv = shlex.split(CONSTANTS().CMD_SSH) + [
+            "-o", "BatchMode=yes",
+            "-o", "ControlMaster={0}".format(master),
+            "-o", "ControlPath={0}".format(os.path.join(self._control_dir, "%C")),
+            "-o", "ControlPersist={0}".format(CONSTANTS().SSH_CONTROL_PERSIST),
+        ]
+        for option in self.options:
+            argv.extend(["-o", option])
+        if self.user:
+            argv.extend(["-l", self.user])
+        argv.append(host)
+        return argv
+
+    def _start_master(self, host, timeout):
+        """Start the master connection of a host, once."""
+        with self._lock:
+            lock = self._host_locks.setdefault(host, threading.Lock())
+        with lock:
+            if host in self._hosts:
+                return None
+            argv = self._get_argv(host, "yes")[:-1] + ["-f", "-N", host]
+            try:
+                p = subprocess.run(
+                    argv,
+                    stdin = subprocess.DEVNULL,
+                    stdout = subprocess.DEVNULL,
+                    stderr = subprocess.DEVNULL,
+                    timeout = timeout,
+                )
+                if p.returncode != 0:
+                    logger.debug("SSH master start failed: {0}".format(host))
+            except (OSError, subprocess.TimeoutExpired):
+                logger.debug("SSH master start failed: {0}".format(host))
+            with self._lock:
+                self._hosts.add(host)
+        return None
+
+    def run(self, host, cmd, timeout):
+        """Run a command on a host.
+
+        Args:
+            host (str): Host name.
+            cmd (str): Remote shell command.
+            timeout (float): Seconds before ssh is killed, including
+                starting the master connection.
+
+        Returns:
+            See LocalTransport.run(). ret_code 255 is an ssh error.
+
+        Raises:
+            OSError: Error starting ssh.
+            subprocess.TimeoutExpired: ssh killed after timeout.
+        """
+        if timeout is None:
+            self._start_master(host, None)
+            return _run_argv(self._get_argv(host) + ["--", cmd], None)
+        deadline = time.monotonic() + timeout
+        self._start_master(host, timeout)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        return _run_argv(self._get_argv(host) + ["--", cmd], remaining)
+
+    def close(self):
+        """Stop master connections and remove the control dir (if created)."""
+        with self._lock:
+            hosts = list(self._hosts)
+            self._hosts.clear()
+            self._host_locks.clear()
+        for host in hosts:
+            try:
+                _run_argv(self._get_argv(host)[:-1] + ["-O", "exit", host], 10)
+            except (OSError, subprocess.TimeoutExpired):
+                logger.debug("SSH master exit failed: {0}".format(host))
+        if self._own_dir:
+            shutil.rmtree(self._control_dir, ignore_errors=True)
+        return None
+
+
+class FakeTransport:
+    """A class for an in-process transport with canned responses.
+
+    Attributes:
+        responses (dict): keys are hosts, values are a dict of ret_code,
+            stdout, stderr, or a callable taking cmd and returning one.
+            Unknown hosts fail like ssh (ret_code 255).
+        delays (dict): keys are hosts, values are seconds to take.
+        calls (list): (host, cmd) pairs run.
+    """
+
+    def __init__(self, responses, delays=None):
+        self.responses = responses
+        self.delays = delays or {}
+        self.calls = []
+
+    def run(self, host, cmd, timeout):
+        """Get the canned response of a host, see LocalTransport.run()."""
+        self.calls.append((host, cmd))
+        delay = self.delays.get(host, 0)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        time.sleep(delay)
+        response = self.responses.get(host)
+        if response is None:
+            return {
+                'ret_code': 255,
+                'stdout': "",
+                'stderr': "ssh: Could not resolve hostname {0}\n".format(host),
+            }
+        if callable(response):
+            response = response(cmd)
+        return {
+            'ret_code': response.get("ret_code", 0),
+            'stdout': response.get("stdout", ""),
+            'stderr': response.get("stderr", ""),
+        }
+
+    def close(self):
+        return None
+
+
+class FanOut:
+    """A class for running a command on many hosts concurrently.
+
+    Attributes:
+        transport (object): LocalTransport, SSHTransport or FakeTransport.
+        max_workers (int): Max hosts in flight.
+        timeout (float): Per-host timeout in seconds.
+    """
+
+    def __init__(self, transport, **kwargs):
+        """Init FanOut.
+
+        Args:
+            transport (object): Has run(host, cmd, timeout) and close().
+
+        **kwargs:
+            max_workers (int): Max hosts in flight.
+            timeout (float): Per-host timeout in seconds.
+        """
+        self.transport = transport
+        self.max_workers = int(kwargs.setdefault("max_workers", CONSTANTS().FANOUT_WORKERS))
+        self.timeout = kwargs.setdefault("timeout", CONSTANTS().FANOUT_TIMEOUT)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run_host(self, host, cmd):
+        start = time.perf_counter()
+        try:
+            r = self.transport.run(host, cmd.replace("{host}", host), self.timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning("Host Command Error: {0}".format(host))
+            logger.debug(testvar.get_debug((host, cmd, e)))
+            return HostResult(host, None, "", "", time.perf_counter() - start, type(e).__name__)
+        return HostResult(
+            host, r["ret_code"], r["stdout"], r["stderr"], time.perf_counter() - start, None,
+        )
+
+    def run(self, hosts, cmd):
+        """Run a command on hosts, yield results as hosts finish.
+
+        Hosts are submitted lazily, so hosts may be any iterable (e.g. a
+        hostlist iterator) and at most max_workers are in flight.
+
+        Args:
+            hosts (iterable): Host names.
+            cmd (str): Command, "{host}" is replaced by the host name.
+
+        Yields:
+            result (HostResult): Result of one host.
+        """
+        hosts = iter(hosts)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {
+                pool.submit(self._run_host, host, cmd)
+                for host in itertools.islice(hosts, self.max_workers)
+            }
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for host in itertools.islice(hosts, len(done)):
+                    pending.add(pool.submit(self._run_host, host, cmd))
+                for future in done:
+                    yield future.result()
+
+    def run_all(self, hosts, cmd):
+        """Run a command on hosts, wait for all.
+
+        Args:
+            hosts (iterable): Host names.
+            cmd (str): Command.
+
+        Returns:
+            results (dict): keys are hosts, values are HostResult.
+        """
+        return {result.host: result for result in self.run(hosts, cmd)}
+
+    def close(self):
+        """Close the transport."""
+        self.transport.close()
+        return None
+
+
+def group_results(results):
+    """Group hosts whose results were identical.
+
+    Args:
+        results (iterable): HostResult.
+
+    Returns:
+        groups (list): (hosts, output) tuples, largest group first. hosts
+            is a sorted list, output a dict of ret_code, stdout, stderr and
+            error.
+    """
+    groups = {}
+    for result in results:
+        key = (result.ret_code, result.stdout, result.stderr, result.error)
+        groups.setdefault(key, []).append(result.host)
+    grouped = [
+        (sorted(hosts), {
+            "ret_code": key[0],
+            "stdout": key[1],
+            "stderr": key[2],
+            "error": key[3],
+        })
+        for key, hosts in groups.items()
+    ]
+    grouped.sort(key=lambda i: (-len(i[0]), i[0][0]))
+    return grouped
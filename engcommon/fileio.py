@@ -5,6 +5,8 @@ This module contains file I/O functions.
 """
 
 import logging
+import os
+import tempfile
 from pathlib import Path
 
 from . import testvar
@@ -43,3 +45,45 @@ def write_file(filename, content, mode):
         logger.debug(testvar.get_debug(filename))
         raise
     return None
+
+
+def write_file_atomic(filename, content, perms=0o644):
+    """Write file by atomic replace, so readers never see a partial file.
+
+    Content is written to a temporary file in the same dir, then renamed
+    over filename. Concurrent writers do not corrupt the file; the last
+    rename wins.
+
+    Args:
+        filename (str): File path.
+        content (str): File content.
+        perms (int): File permissions.
+
+    Returns:
+        None
+
+    Raises:
+        OSError: Error writing file.
+    """
+    dir_ = os.path.dirname(os.path.abspath(filename))
+    try:
+        Path(dir_).mkdir(parents=True, exist_ok=True)
+    except OSError:
+        logger.error("Parent mkdir Error")
+        logger.debug(testvar.get_debug(filename))
+        raise
+
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(dir=dir_, prefix=".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp, perms)
+        os.replace(tmp, filename)
+    except OSError:
+        logger.error("Atomic File Write Error")
+        logger.debug(testvar.get_debug(filename))
+        if tmp is not None:
+            os.unlink(tmp)
+        raise
+    return None
@@ -5,21 +5,587 @@ This module contains functions specific for gathering information
 about hardware or performing tasks on hardware, firmware, DMI, devices, etc.
 """
 
+import glob
 import logging
+import math
+import numpy
+import os
 import re
+import threading
+import time
 
 from . import command
+from . import error
+from . import factcache
 from . import testvar
 from .constants import _const as CONSTANTS
 
 logger = logging.getLogger(__name__)
 
+_root = "/"
+_command_hook = None
+_fact_cache = factcache.FactCache()
+_cpuinfo = None  # last parsed CPUInfo, reset by set_root() and set_command_hook()
+
+
+def set_root(root="/"):
+    """Set root dir for procfs/sysfs reads.
+
+    Used to read a captured or synthetic host tree (see fakehost).
+
+    Args:
+        root (str): Root dir.
+
+    Returns:
+        None
+    """
+    global _root, _cpuinfo
+    _root = root
+    _cpuinfo = None
+    return None
+
+
+def set_command_hook(hook=None):
+    """Set a hook to serve hardware command output instead of running it.
+
+    Args:
+        hook (callable): Takes a command string, returns its STDOUT (str),
+            or None to run the command. Unset if None.
+
+    Returns:
+        None
+    """
+    global _command_hook, _cpuinfo
+    _command_hook = hook
+    _cpuinfo = None
+    return None
+
+
+def set_fact_cache(cache=None):
+    """Set the static fact cache consulted by get_uuid() etc.
+
+    Args:
+        cache (factcache.FactCache): Cache. Disabled if None.
+
+    Returns:
+        None
+    """
+    global _fact_cache
+    _fact_cache = cache
+    return None
+
+
+def _get_fact(name, probe):
+    """Get a static fact from the fact cache, else from probe().
+
+    The cache describes the real host, so it is bypassed when a root dir
+    or command hook is set.
+    """
+    if _fact_cache is not None and _root == "/" and _command_hook is None:
+        value = _fact_cache.get(name)
+        if value is not None:
+            return value
+    return probe()
+
+
+def _get_path(path):
+    """Get path under the current root."""
+    if _root == "/":
+        return path
+    return os.path.join(_root, path.lstrip("/"))
+
+
+def _get_shell_cmd(cmd):
+    """Get command output from the command hook or command.get_shell_cmd."""
+    if _command_hook is not None:
+        stdout = _command_hook(cmd)
+        if stdout is not None:
+            return {
+                'ret_code': 0,
+                'stdout': stdout,
+                'stderr': "",
+            }
+    return command.get_shell_cmd(cmd)
+
+
+# Bit positions of known flags. Arrays (to_array()) of the same version are
+# comparable across processes and hosts. Append only, and bump the version.
+CPU_FLAGS_VERSION = 1
+_CPU_FLAGS = (
+    "fpu", "vme", "de", "pse", "tsc", "msr", "pae", "mce", "cx8", "apic",
+    "sep", "mtrr", "pge", "mca", "cmov", "pat", "pse36", "clflush", "mmx",
+    "fxsr", "sse", "sse2", "ss", "ht", "tm", "pbe", "syscall", "nx", "lm",
+    "constant_tsc", "nonstop_tsc", "pni", "pclmulqdq", "ssse3", "fma",
+    "cx16", "sse4_1", "sse4_2", "x2apic", "movbe", "popcnt", "aes", "xsave",
+    "avx", "f16c", "rdrand", "hypervisor", "lahf_lm", "abm", "sse4a",
+    "fma4", "xop", "bmi1", "hle", "avx2", "smep", "bmi2", "erms", "invpcid",
+    "rtm", "mpx", "avx512f", "avx512dq", "rdseed", "adx", "smap",
+    "avx512ifma", "clflushopt", "clwb", "avx512pf", "avx512er", "avx512cd",
+    "sha_ni", "avx512bw", "avx512vl", "avx512vbmi", "avx512_vbmi2",
+    "avx512_vnni", "avx512_bitalg", "avx512_vpopcntdq", "avx512_bf16",
+    "avx512_fp16", "avx_vnni", "amx_bf16", "amx_tile", "amx_int8",
+    "fp", "asimd", "asimdhp", "asimddp", "sve", "sve2",
+    "altivec", "vsx", "arch_2_06", "arch_3_00",
+)
+_CPU_FLAG_BITS = {flag: bit for bit, flag in enumerate(_CPU_FLAGS)}
+
+
+class CPUFeatures:
+    """A class for a CPU feature set stored as a bitset.
+
+    Known flags (_CPU_FLAGS, version CPU_FLAGS_VERSION) map to fixed bit
+    positions, so membership is a single bit test and set algebra is
+    integer arithmetic. Flags missing from the table are kept in a
+    separate set (extra) and are not part of to_array(). Feature sets from
+    many hosts can be stacked with to_array() and reduced with
+    get_common_features().
+
+        Typical Usage:
+
+        features = hardware.get_cpu_features()
+        if features.get_simd_width() >= 512 and features.has_fma(512):
+            binary = "xhpl.avx512"
+
+    Attributes:
+        bits (int): Bitset of known flags.
+        extra (frozenset): Flags not in the table.
+    """
+
+    __slots__ = ["_bits", "_extra"]
+
+    SIMD_WIDTHS = [
+        (512, ["avx512f"]),
+        (256, ["avx2"]),
+        (256, ["avx"]),
+        (128, ["sse2"]),
+        (128, ["asimd"]),
+        (128, ["altivec"]),
+    ]
+    FMA_FLAGS = {
+        512: ["avx512f"],  # AVX-512 Foundation includes FMA
+        256: ["avx", "fma"],
+        128: ["asimd"],
+    }
+
+    def __init__(self, flags=(), bits=0, extra=()):
+        """Init CPUFeatures.
+
+        Args:
+            flags (iterable): Flag names.
+            bits (int): Initial bitset.
+            extra (iterable): Initial flags not in the table.
+        """
+        extra = set(extra)
+        for flag in flags:
+            bit = _CPU_FLAG_BITS.get(flag)
+            if bit is None:
+                extra.add(flag)
+            else:
+                bits |= 1 << bit
+        self._bits = bits
+        self._extra = frozenset(extra)
+
+    @property
+    def bits(self):
+        """Get bits."""
+        return self._bits
+
+    @property
+    def extra(self):
+        """Get extra."""
+        return self._extra
+
+    def __contains__(self, flag):
+        bit = _CPU_FLAG_BITS.get(flag)
+        if bit is None:
+            return flag in self._extra
+        return bool((self._bits >> bit) & 1)
+
+    def __iter__(self):
+        bits = self._bits
+        for bit in range(bits.bit_length()):
+            if (bits >> bit) & 1:
+                yield _CPU_FLAGS[bit]
+        for flag in sorted(self._extra):
+            yield flag
+
+    def __len__(self):
+        return bin(self._bits).count("1") + len(self._extra)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, CPUFeatures)
+            and self._bits == other._bits
+            and self._extra == other._extra
+        )
+
+    def __hash__(self):
+        return hash((self._bits, self._extra))
+
+    def __and__(self, other):
+        return CPUFeatures(bits = self._bits & other._bits, extra = self._extra & other._extra)
+
+    def __or__(self, other):
+        return CPUFeatures(bits = self._bits | other._bits, extra = self._extra | other._extra)
+
+    def __sub__(self, other):
+        return CPUFeatures(bits = self._bits & ~other._bits, extra = self._extra - other._extra)
+
+    def __xor__(self, other):
+        return CPUFeatures(bits = self._bits ^ other._bits, extra = self._extra ^ other._extra)
+
+    def __le__(self, other):
+        return (self._bits & ~other._bits) == 0 and self._extra <= other._extra
+
+    def __repr__(self):
+        return "CPUFeatures({0})".format(list(self))
+
+    def has_all(self, flags):
+        """Check that all flags are present.
+
+        Args:
+            flags (iterable): Flag names.
+
+        Returns:
+            bool: All flags present.
+        """
+        return all(flag in self for flag in flags)
+
+    def get_simd_width(self):
+        """Get widest supported SIMD vector width.
+
+        Args:
+            None
+
+        Returns:
+            width (int): Width in bits (64 if no SIMD flags).
+        """
+        for width, flags in self.SIMD_WIDTHS:
+            if self.has_all(flags):
+                return width
+        return 64
+
+    def has_fma(self, width):
+        """Check for fused multiply-add at a vector width.
+
+        Args:
+            width (int): Vector width in bits (128, 256, 512).
+
+        Returns:
+            bool: FMA supported at width.
+        """
+        return width in self.FMA_FLAGS and self.has_all(self.FMA_FLAGS[width])
+
+    def to_array(self, words=None):
+        """Get bitset of known flags as a uint64 array.
+
+        The layout is fixed by CPU_FLAGS_VERSION; extra flags are not
+        included.
+
+        Args:
+            words (int): Array length. Defaults to fit all known flags.
+
+        Returns:
+            array (numpy.ndarray): uint64 words, least significant first.
+        """
+        if words is None:
+            words = (len(_CPU_FLAGS) + 63) // 64
+        raw = self._bits.to_bytes(words * 8, "little")
+        return numpy.frombuffer(raw, dtype="<u8").astype(numpy.uint64)
+
+    @classmethod
+    def from_array(cls, array, extra=()):
+        """Get CPUFeatures from a uint64 array.
+
+        Args:
+            array (numpy.ndarray): uint64 words, least significant first.
+            extra (iterable): Flags not in the table.
+
+        Returns:
+            features (CPUFeatures): Feature set.
+        """
+        raw = numpy.asarray(array, dtype="<u8").tobytes()
+        return cls(bits = int.from_bytes(raw, "little"), extra = extra)
+
+
+def get_features_matrix(features_list):
+    """Get feature sets stacked as a uint64 matrix.
+
+    Args:
+        features_list (list): CPUFeatures, one per host.
+
+    Returns:
+        matrix (numpy.ndarray): shape (hosts, words).
+    """
+    words = (len(_CPU_FLAGS) + 63) // 64
+    matrix = numpy.empty((len(features_list), words), dtype=numpy.uint64)
+    for i, features in enumerate(features_list):
+        matrix[i] = features.to_array(words)
+    return matrix
+
+
+def get_common_features(features):
+    """Get features present on every host.
+
+    Args:
+        features (list or numpy.ndarray): CPUFeatures or get_features_matrix()
+            (known flags only).
+
+    Returns:
+        common (CPUFeatures): Intersection of all feature sets.
+    """
+    extra = ()
+    if not isinstance(features, numpy.ndarray):
+        if features:
+            extra = frozenset.intersection(*(i.extra for i in features))
+        features = get_features_matrix(features)
+    return CPUFeatures.from_array(numpy.bitwise_and.reduce(features, axis=0), extra)
+
+
+class CPUInfo:
+    """A class for a columnar, deduplicated view of /proc/cpuinfo.
+
+    Each field is stored once per distinct value, with a NumPy array of
+    per-processor codes indexing into the distinct values. On large hosts
+    this keeps one copy of the ~1.5 KB "flags" string per processor type
+    rather than one per logical CPU. Processors are ordered by "processor".
+
+    Ex:
+        info.get_array("cpu MHz") is a float array, one entry per processor.
+        info.get_unique("model name") is a tuple of distinct model names.
+
+    Attributes:
+        fields (list): Field names in first-seen order.
+        is_heterogeneous (bool): Processors differ in model or flags.
+    """
+
+    HETEROGENEOUS_FIELDS = ["vendor_id", "cpu family", "model", "model name", "flags"]
+
+    def __init__(self, stanzas):
+        """Init CPUInfo.
+
+        Args:
+            stanzas (list): dicts of key/value pairs, one per processor.
+        """
+        stanzas = sorted(stanzas, key=lambda i: int(i["processor"]))
+        self._len = len(stanzas)
+        self._fields = []
+        self._values = {}  # field: list of distinct values
+        self._codes = {}  # field: numpy array of indices into values, -1 if missing
+        self._split = {}  # code: tuple of flags.split() per distinct flags
+        self._features = {}  # code: CPUFeatures per distinct flags
+        for field in dict.fromkeys(k for stanza in stanzas for k in stanza):
+            index = {}
+            codes = numpy.full(self._len, -1, dtype=numpy.int32)
+            for i, stanza in enumerate(stanzas):
+                if field in stanza:
+                    codes[i] = index.setdefault(stanza[field], len(index))
+            self._fields.append(field)
+            self._values[field] = list(index)
+            self._codes[field] = codes
+
+    def __len__(self):
+        return self._len
+
+    @classmethod
+    def from_stdout(cls, stdout):
+        """Get CPUInfo from /proc/cpuinfo text.
+
+        Args:
+            stdout (str): /proc/cpuinfo content.
+
+        Returns:
+            cpuinfo (CPUInfo): Columnar cpuinfo.
+        """
+        stanzas = []
+        values = {}  # share identical value strings across stanzas
+        for stanza in stdout.split('\n\n'):
+            if stanza:
+                entry = {}
+                for line in stanza.splitlines():
+                    if line:
+                        k, _, v = line.partition(":")
+                        v = v.strip()
+                        entry[k.strip()] = values.setdefault(v, v)
+                stanzas.append(entry)
+        return cls(stanzas)
+
+    @property
+    def fields(self):
+        """Get fields."""
+        return list(self._fields)
+
+    @property
+    def is_heterogeneous(self):
+        """Get is_heterogeneous."""
+        return any(
+            len(self._values[i]) > 1
+            for i in self.HETEROGENEOUS_FIELDS if i in self._values
+        )
+
+    def get_unique(self, field):
+        """Get distinct values of a field.
+
+        Args:
+            field (str): cpuinfo field name.
+
+        Returns:
+            values (tuple): Distinct values in first-seen order.
+        """
+        return tuple(self._values[field])
+
+    def get_codes(self, field):
+        """Get per-processor indices into get_unique(field).
+
+        Args:
+            field (str): cpuinfo field name.
+
+        Returns:
+            codes (numpy.ndarray): int32 codes, -1 where field is missing.
+        """
+        return self._codes[field]
+
+    def get_array(self, field, dtype=numpy.float64):
+        """Get a numeric field as an array.
+
+        Ex:
+            get_array("core id", int) for integer core ids.
+
+        Args:
+            field (str): cpuinfo field name.
+            dtype (numpy.dtype): Array type.
+
+        Returns:
+            array (numpy.ndarray): Per-processor values.
+
+        Raises:
+            ValueError: Field is not numeric or is missing on some processor.
+        """
+        codes = self._codes[field]
+        if (codes < 0).any():
+            raise ValueError("Field missing on some processors: {0}".format(field))
+        values = numpy.array(self._values[field], dtype=numpy.float64).astype(dtype)
+        return values[codes]
+
+    def get_value(self, index, field):
+        """Get the value of a field for one processor.
+
+        Args:
+            index (int): Processor index.
+            field (str): cpuinfo field name.
+
+        Returns:
+            value (str): Field value.
+
+        Raises:
+            KeyError: Field missing on processor.
+        """
+        code = self._codes[field][index]
+        if code < 0:
+            raise KeyError(field)
+        return self._values[field][code]
+
+    def get_flags(self, index=0):
+        """Get the split "flags" of one processor.
+
+        The split is computed once per distinct flags string.
+
+        Args:
+            index (int): Processor index.
+
+        Returns:
+            flags (tuple): CPU flags.
+        """
+        code = self._codes["flags"][index]
+        if code not in self._split:
+            self._split[code] = tuple(self._values["flags"][code].split())
+        return self._split[code]
+
+    def get_features(self, index=0):
+        """Get the CPUFeatures bitset of one processor.
+
+        The bitset is computed once per distinct flags string.
+
+        Args:
+            index (int): Processor index.
+
+        Returns:
+            features (CPUFeatures): CPU features.
+        """
+        code = self._codes["flags"][index]
+        if code not in self._features:
+            self._features[code] = CPUFeatures(self.get_flags(index))
+        return self._features[code]
+
+    def get_groups(self, field):
+        """Get processor indices grouped by field value.
+
+        Ex:
+            get_groups("flags") separates P-cores from E-cores on hybrid CPUs.
+
+        Args:
+            field (str): cpuinfo field name.
+
+        Returns:
+            groups (dict): keys are values, values are numpy index arrays.
+        """
+        codes = self._codes[field]
+        groups = {
+            value: numpy.flatnonzero(codes == code)
+            for code, value in enumerate(self._values[field])
+        }
+        return groups
+
+    def to_list(self):
+        """Get list-of-dicts view compatible with get_cpuinfo().
+
+        Returns:
+            cpuinfo (list): dicts of key/value pairs, one per processor.
+        """
+        columns = [
+            (field, self._values[field], self._codes[field].tolist())
+            for field in self._fields
+        ]
+        cpuinfo = [
+            {
+                field: values[codes[i]]
+                for field, values, codes in columns if codes[i] >= 0
+            }
+            for i in range(self._len)
+        ]
+        return cpuinfo
+
+
+def get_cpuinfo_columnar(cached=False):
+    """Get /proc/cpuinfo as a columnar CPUInfo.
+
+    cpuinfo is re-read on each call unless cached, which reuses the last
+    parse (until set_root() or set_command_hook()). Only use cached for
+    static fields (e.g. flags, model), not "cpu MHz" or CPU counts.
+
+    Args:
+        cached (bool): Reuse the last parsed cpuinfo.
+
+    Returns:
+        cpuinfo (CPUInfo): Columnar cpuinfo.
+    """
+    global _cpuinfo
+    cpuinfo = _cpuinfo
+    if cpuinfo is None or not cached:
+        cmd = "{0}".format(CONSTANTS().CMD_CPUINFO)
+        dict_ = _get_shell_cmd(cmd)
+        cpuinfo = CPUInfo.from_stdout(dict_["stdout"])
+        testvar.check_null(len(cpuinfo))
+        _cpuinfo = cpuinfo
+    return cpuinfo
+
 
 def get_cpuinfo():
     """Get /proc/cpuinfo.
 
     Get a list of "processors" from /proc/cpuinfo. Each item contians
-    a dict of key/value pairs of the processor info.
+    a dict of key/value pairs of the processor info. Identical values
+    are shared between dicts (see CPUInfo).
 
     Ex:
         cpuinfo[0]["vendor_id"] is the "vendor_id" of processor "0".
@@ -30,19 +596,7 @@ def get_cpuinfo():
     Returns:
         cpuinfo (list): cpuinfo.
     """
-    cpuinfo = []
-    cmd = "{0}".format(CONSTANTS().CMD_CPUINFO)
-    dict_ = command.get_shell_cmd(cmd)
-    stdout = dict_["stdout"]
-    for stanza in stdout.split('\n\n'):
-        if stanza:
-            entry = {}
-            for line in stanza.splitlines():
-                if line:
-                    k = (line.split(":")[0]).strip()
-                    v = (line.split(":")[1]).strip()
-                    entry[k] = v
-            cpuinfo.insert(int(entry['processor']), entry)
+    cpuinfo = get_cpuinfo_columnar().to_list()
     testvar.check_null(cpuinfo)
     return cpuinfo
 
@@ -56,6 +610,10 @@ def get_cpu_vendor():
     Returns:
         vendor (str): vendor in lowercase.
     """
+    return _get_fact("cpu_vendor", _get_cpu_vendor)
+
+
+def _get_cpu_vendor():
     vendor = ""
     cpuinfo = get_cpuinfo()
     vendor_id = cpuinfo[0]["vendor_id"]
@@ -70,6 +628,24 @@ def get_cpu_vendor():
     return vendor
 
 
+def get_cpu_model():
+    """Get CPU model name (of the first processor).
+
+    Args:
+        None
+
+    Returns:
+        model (str): Model name (e.g. "Intel(R) Xeon(R) Gold 6148 CPU").
+    """
+    return _get_fact("cpu_model", _get_cpu_model)
+
+
+def _get_cpu_model():
+    model = get_cpuinfo_columnar(cached=True).get_value(0, "model name")
+    testvar.check_null(model)
+    return model
+
+
 def get_arch():
     """Get hardware architecture.
 
@@ -79,8 +655,12 @@ def get_arch():
     Returns:
         arch (str): architecture.
     """
+    return _get_fact("arch", _get_arch)
+
+
+def _get_arch():
     cmd = "{0} -i".format(CONSTANTS().CMD_UNAME)
-    dict_ = command.get_shell_cmd(cmd)
+    dict_ = _get_shell_cmd(cmd)
     arch = dict_["stdout"].strip()
     return arch
 
@@ -95,14 +675,29 @@ def get_cpu_flags_with_prefix(prefix):
         prefix_flags (list): CPU flags with prefix.
     """
     prefix_flags = []
-    cpuinfo = get_cpuinfo()
-    flags = cpuinfo[0]["flags"].split()
+    flags = get_cpuinfo_columnar(cached=True).get_flags(0)
     for flag in flags:
         if flag.startswith(prefix):
             prefix_flags.append(flag)
     return prefix_flags
 
 
+def get_cpu_features():
+    """Get CPU feature bitset of processor "0".
+
+    Ex:
+        "avx512f" in get_cpu_features()
+
+    Args:
+        None
+
+    Returns:
+        features (CPUFeatures): CPU features.
+    """
+    features = get_cpuinfo_columnar(cached=True).get_features(0)
+    return features
+
+
 def get_cpu_core_count_cpuinfo():
     """Get total non-virtualised cpu cores using cpuinfo.
 
@@ -168,7 +763,7 @@ def get_lscpu():
     """
     lscpu = {}
     cmd = "{0}".format(CONSTANTS().CMD_LSCPU)
-    dict_ = command.get_shell_cmd(cmd)
+    dict_ = _get_shell_cmd(cmd)
     stdout = dict_["stdout"]
     for line in stdout.splitlines():
         if line:
@@ -178,6 +773,89 @@ def get_lscpu():
     return lscpu
 
 
+def get_numa_node_count():
+    """Get NUMA node count using lscpu.
+
+    Args:
+        None
+
+    Returns:
+        count (int): NUMA node count (1 if not reported).
+    """
+    lscpu = get_lscpu()
+    count = int(lscpu.get("NUMA node(s)", 1))
+    return count
+
+
+def get_cpu_mhz():
+    """Get CPU frequency for peak FLOPS estimates.
+
+    Uses lscpu "CPU max MHz" when available, otherwise the mean "cpu MHz"
+    from cpuinfo.
+
+    Args:
+        None
+
+    Returns:
+        mhz (float): CPU frequency in MHz.
+    """
+    lscpu = get_lscpu()
+    if "CPU max MHz" in lscpu:
+        mhz = float(lscpu["CPU max MHz"])
+    else:
+        mhz = float(get_cpuinfo_columnar().get_array("cpu MHz").mean())
+    testvar.check_null(mhz)
+    return mhz
+
+
+def get_flops_per_cycle(features):
+    """Get double-precision FLOPs per cycle per core from CPU features.
+
+    Assumes two FMA units per core when FMA is available at the widest
+    SIMD width, otherwise one add and one multiply per cycle.
+
+    Args:
+        features (CPUFeatures): CPU features.
+
+    Returns:
+        flops (int): FLOPs per cycle per core.
+    """
+    width = features.get_simd_width()
+    lanes = max(width // 64, 1)
+    if features.has_fma(width):
+        flops = lanes * 2 * 2
+    else:
+        flops = lanes * 2
+    return flops
+
+
+def get_peak_gflops(**kwargs):
+    """Get theoretical double-precision peak GFLOPS.
+
+    Args:
+        None
+
+    **kwargs:
+        cores (int): Core count. Default: get_cpu_core_count().
+        mhz (float): CPU frequency. Default: get_cpu_mhz().
+        features (CPUFeatures): CPU features. Default: get_cpu_features().
+
+    Returns:
+        gflops (float): Peak GFLOPS.
+    """
+    cores = kwargs.get("cores")
+    mhz = kwargs.get("mhz")
+    features = kwargs.get("features")
+    if cores is None:
+        cores = get_cpu_core_count()
+    if mhz is None:
+        mhz = get_cpu_mhz()
+    if features is None:
+        features = get_cpu_features()
+    gflops = cores * mhz / 1000.0 * get_flops_per_cycle(features)
+    return gflops
+
+
 def get_meminfo():
     """Get /proc/meminfo.
 
@@ -196,7 +874,7 @@ def get_meminfo():
     """
     meminfo = {}
     cmd = "{0}".format(CONSTANTS().CMD_MEMINFO)
-    dict_ = command.get_shell_cmd(cmd)
+    dict_ = _get_shell_cmd(cmd)
     stdout = dict_["stdout"]
     for line in stdout.splitlines():
         if line:
@@ -213,8 +891,259 @@ def get_meminfo():
     return meminfo
 
 
+def parse_cpu_list(cpu_list):
+    """Parse a kernel CPU list string.
+
+    Ex:
+        parse_cpu_list("0-3,8,10-11") is [0, 1, 2, 3, 8, 10, 11].
+
+    Args:
+        cpu_list (str): CPU list (cpuset, sysfs "online", etc).
+
+    Returns:
+        cpus (list): CPU indices.
+    """
+    cpus = []
+    for item in cpu_list.strip().split(","):
+        if "-" in item:
+            start, end = item.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        elif item:
+            cpus.append(int(item))
+    return cpus
+
+
+def _get_cgroup_dirs(controller):
+    """Get cgroup dirs for controller, innermost first, up to the mount.
+
+    Handles cgroup v2 (unified) and v1 hierarchies. Inside a container
+    with its own cgroup namespace the path in /proc/self/cgroup may not
+    exist under the mount, in which case only the mount itself is used.
+
+    Args:
+        controller (str): cgroup controller (e.g. "cpu", "memory").
+
+    Returns:
+        dirs (list): Existing cgroup directories.
+    """
+    root = _get_path(CONSTANTS().DIR_CGROUP)
+    is_v2 = os.path.exists(os.path.join(root, "cgroup.controllers"))
+    mount = None
+    path = "/"
+    try:
+        with open(_get_path(CONSTANTS().FILE_PROC_CGROUP), "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        lines = []
+    for line in lines:
+        hierarchy, controllers, cgroup_path = line.split(":", 2)
+        if is_v2 and hierarchy == "0":
+            mount, path = root, cgroup_path
+        elif not is_v2 and controller in controllers.split(","):
+            mount = os.path.join(root, controllers)
+            if not os.path.isdir(mount):
+                mount = os.path.join(root, controller)
+            path = cgroup_path
+    if mount is None:
+        mount = root if is_v2 else os.path.join(root, controller)
+    dirs = []
+    current = os.path.normpath(mount + "/" + path)
+    if not os.path.isdir(current):
+        current = mount
+    while current.startswith(mount) and os.path.isdir(current):
+        dirs.append(current)
+        if current == mount:
+            break
+        current = os.path.dirname(current)
+    return dirs
+
+
+def _read_cgroup_values(dirs, filename):
+    """Get stripped contents of filename in each dir where it exists."""
+    values = []
+    for dir_ in dirs:
+        try:
+            with open(os.path.join(dir_, filename), "r") as f:
+                values.append(f.read().strip())
+        except OSError:
+            pass
+    return values
+
+
+def get_cgroup_cpu_quota():
+    """Get CPU bandwidth limit from cgroup cpu.max (v2) or CFS quota (v1).
+
+    The tightest limit along the cgroup hierarchy is used.
+
+    Args:
+        None
+
+    Returns:
+        quota (float): Limit in CPUs, None if unlimited.
+    """
+    quotas = []
+    dirs = _get_cgroup_dirs("cpu")
+    for value in _read_cgroup_values(dirs, "cpu.max"):
+        limit, period = (value.split() + ["100000"])[:2]
+        if limit != "max":
+            quotas.append(int(limit) / int(period))
+    limits = _read_cgroup_values(dirs, "cpu.cfs_quota_us")
+    periods = _read_cgroup_values(dirs, "cpu.cfs_period_us")
+    for limit, period in zip(limits, periods):
+        if int(limit) > 0:
+            quotas.append(int(limit) / int(period))
+    quota = min(quotas) if quotas else None
+    return quota
+
+
+def get_cgroup_cpuset():
+    """Get CPUs allowed by cgroup cpuset.
+
+    Args:
+        None
+
+    Returns:
+        cpus (list): CPU indices, None if no cpuset found.
+    """
+    cpus = None
+    dirs = _get_cgroup_dirs("cpuset")
+    values = (
+        _read_cgroup_values(dirs, "cpuset.cpus.effective")
+        + _read_cgroup_values(dirs, "cpuset.effective_cpus")
+    )
+    if values and values[0]:
+        cpus = parse_cpu_list(values[0])
+    return cpus
+
+
+def get_cgroup_mem_limit():
+    """Get memory limit from cgroup memory.max (v2) or limit_in_bytes (v1).
+
+    The tightest limit along the cgroup hierarchy is used. v1 reports
+    "unlimited" as a huge page-aligned value, which is treated as None.
+
+    Args:
+        None
+
+    Returns:
+        limit (int): Limit in bytes, None if unlimited.
+    """
+    limits = []
+    dirs = _get_cgroup_dirs("memory")
+    for value in _read_cgroup_values(dirs, "memory.max"):
+        if value != "max":
+            limits.append(int(value))
+    for value in _read_cgroup_values(dirs, "memory.limit_in_bytes"):
+        if int(value) < (1 << 62):
+            limits.append(int(value))
+    limit = min(limits) if limits else None
+    return limit
+
+
+def get_cgroup_mem_usage():
+    """Get memory usage of the innermost cgroup.
+
+    Args:
+        None
+
+    Returns:
+        usage (int): Usage in bytes, None if not available.
+    """
+    dirs = _get_cgroup_dirs("memory")
+    values = (
+        _read_cgroup_values(dirs, "memory.current")
+        + _read_cgroup_values(dirs, "memory.usage_in_bytes")
+    )
+    usage = int(values[0]) if values else None
+    return usage
+
+
+def get_effective_cpu_count():
+    """Get CPUs this process can actually use.
+
+    The smallest of the affinity mask, cgroup cpuset and cgroup CPU quota
+    (rounded up).
+
+    Args:
+        None
+
+    Returns:
+        count (int): Usable CPU count.
+    """
+    try:
+        counts = [len(os.sched_getaffinity(0))]
+    except AttributeError:  # not available on MacOS
+        counts = [os.cpu_count()]
+    cpuset = get_cgroup_cpuset()
+    if cpuset:
+        counts.append(len(cpuset))
+    quota = get_cgroup_cpu_quota()
+    if quota:
+        counts.append(max(1, math.ceil(quota)))
+    count = min(counts)
+    testvar.check_null(count)
+    return count
+
+
+def get_effective_core_count():
+    """Get physical cores this process can actually use.
+
+    Usable CPUs (see get_effective_cpu_count()) counted in whole cores, so
+    SMT siblings are not counted as cores. Used for peak FLOPS and rank
+    counts, where a sibling adds no FP throughput.
+
+    Args:
+        None
+
+    Returns:
+        count (int): Usable core count.
+    """
+    threads_per_core = int(get_lscpu().get("Thread(s) per core", 1))
+    cpus = get_effective_cpu_count()
+    count = max(1, min(get_cpu_core_count(), cpus // max(1, threads_per_core)))
+    return count
+
+
+def get_effective_meminfo():
+    """Get /proc/meminfo with MemTotal/MemAvailable capped by cgroup limit.
+
+    Ex:
+        meminfo['MemTotal'] is the memory this process may use (kB).
+
+    Args:
+        None
+
+    Returns:
+        meminfo (dict): meminfo.
+    """
+    meminfo = get_meminfo()
+    limit = get_cgroup_mem_limit()
+    if limit is not None:
+        usage = get_cgroup_mem_usage() or 0
+        meminfo["MemTotal"] = min(meminfo["MemTotal"], limit // 1024)
+        meminfo["MemAvailable"] = min(
+            meminfo.get("MemAvailable", meminfo["MemTotal"]),
+            max(limit - usage, 0) // 1024,
+        )
+    return meminfo
+
+
+def get_xhpl_mem():
+    """Get memory for XHPL: XHPL_MEM_PCT of effective MemTotal.
+
+    Args:
+        None
+
+    Returns:
+        mem (int): Memory in kB.
+    """
+    meminfo = get_effective_meminfo()
+    mem = meminfo["MemTotal"] * CONSTANTS().XHPL_MEM_PCT // 100
+    return mem
+
+
 def get_dmidecode():
-    """Get dmidecode.
+    """Get dmidecode output.
 
     Get DMI info in key/value pairs by record name (e.g.  'BIOS Information',
     'System Information', 'Chassis Information').
@@ -227,18 +1156,31 @@ def get_dmidecode():
     Returns:
         dmi (dict): DMI info.
     """
-    dmi = {}
+    dmi = parse_dmidecode(_get_fact("dmidecode", _get_dmidecode_stdout))
+    testvar.check_null(dmi)
+    return dmi
+
+
+def _get_dmidecode_stdout():
     cmd = '{0}'.format(CONSTANTS().CMD_DMIDECODE)
-    dict_ = command.get_shell_cmd(cmd)
-    stdout = dict_["stdout"]
+    dict_ = _get_shell_cmd(cmd)
+    return dict_["stdout"]
+
+
+def parse_dmidecode(stdout):
+    """Parse dmidecode output into records by record name.
+
+    Args:
+        stdout (str): dmidecode output.
+
+    Returns:
+        dmi (dict): keys are record names, values are lists of stanzas.
+    """
+    dmi = {}
     for stanza in stdout.split('\n\n'):
         if stanza.startswith("Handle"):
-            stanza_lines = stanza.splitlines()
-            record_name = stanza_lines[1]
-            if record_name not in list(dmi.keys()):
-                dmi[record_name] = []
-            dmi[record_name].append(stanza)
-    testvar.check_null(dmi)
+            record_name = stanza.splitlines()[1]
+            dmi.setdefault(record_name, []).append(stanza)
     return dmi
 
 
@@ -253,12 +1195,14 @@ def get_uuid():
     Returns:
         uuid (str): UUID.
     """
+    return _get_fact("uuid", _get_uuid)
+
+
+def _get_uuid():
     uuid = ""
     arch = get_arch()
     if arch not in ["ppc64le"]:
-        cmd = '{0}'.format(CONSTANTS().CMD_DMIDECODE)
-        dict_ = command.get_shell_cmd(cmd)
-        stdout = dict_["stdout"]
+        stdout = _get_fact("dmidecode", _get_dmidecode_stdout)
         match = re.search('UUID: (.*)', stdout)
         if match:
             uuid = match.group(1)
@@ -277,9 +1221,404 @@ def get_serial_num():
     Returns:
         serial (str): serial number.
     """
+    return _get_fact("serial_num", _get_serial_num)
+
+
+def _get_serial_num():
     serial_num = ""
     cmd = "{0} -s system-serial-number".format(CONSTANTS().CMD_DMIDECODE)
-    dict_ = command.get_shell_cmd(cmd)
+    dict_ = _get_shell_cmd(cmd)
     serial_num = dict_["stdout"].strip()
     testvar.check_null(serial_num)
     return serial_num
+
+
+_STATIC_FACTS = [
+    ("arch", _get_arch),
+    ("cpu_vendor", _get_cpu_vendor),
+    ("cpu_model", _get_cpu_model),
+    ("dmidecode", _get_dmidecode_stdout),
+    ("uuid", _get_uuid),
+    ("serial_num", _get_serial_num),
+]
+
+
+def collect_static_facts(cache=None):
+    """Probe static hardware facts and write them to the fact cache.
+
+    Run once per boot with privileges (dmidecode), so unprivileged tools
+    read the facts from the cache. Facts that cannot be probed are logged
+    and left out.
+
+    Args:
+        cache (factcache.FactCache): Cache, the current fact cache if None.
+
+    Returns:
+        facts (dict): Collected facts.
+
+    Raises:
+        OSError: Error writing cache file.
+    """
+    cache = cache or _fact_cache or factcache.FactCache()
+    facts = {}
+    for name, probe in _STATIC_FACTS:
+        try:
+            facts[name] = probe()
+        except (OSError, KeyError, error.ShellCommandExecutionError, error.NullValueError):
+            logger.warning("Static Fact Unavailable: {0}".format(name))
+    cache.update(facts)
+    return facts
+
+
+class _RingBuffer:
+    """Preallocated 2-D ring buffer of samples (rows) by channels (columns)."""
+
+    def __init__(self, capacity, width, dtype):
+        self._data = numpy.zeros((capacity, width), dtype=dtype)
+        self._capacity = capacity
+        self._pos = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, row):
+        self._data[self._pos] = row
+        self._pos = (self._pos + 1) % self._capacity
+        self._count = min(self._count + 1, self._capacity)
+        return None
+
+    def get(self):
+        """Get samples in chronological order (copy)."""
+        if self._count < self._capacity:
+            return self._data[:self._count].copy()
+        return numpy.concatenate(
+            (self._data[self._pos:], self._data[:self._pos])
+        )
+
+
+def _natural_glob(pattern):
+    """Get glob matches sorted by their integers (cpu2 before cpu10)."""
+    def key(path):
+        return ([int(i) for i in re.findall(r"\d+", path)], path)
+    return sorted(glob.glob(pattern), key=key)
+
+
+def _get_percentiles(array):
+    """Get p50/p99/max/mean per column of a 2-D array."""
+    if array.size == 0:
+        return {}
+    p50, p99 = numpy.percentile(array, [50, 99], axis=0)
+    return {
+        "p50": p50,
+        "p99": p99,
+        "max": array.max(axis=0),
+        "mean": array.mean(axis=0),
+    }
+
+
+class TelemetrySampler:
+    """A class for sampling hardware telemetry on a background thread.
+
+    Per-CPU jiffies from /proc/stat, current CPU frequencies, memory
+    availability from /proc/meminfo and thermal zone temperatures are read
+    directly from procfs/sysfs into preallocated NumPy ring buffers. File
+    handles are kept open between samples.
+
+    The CPU time spent sampling is measured. If it exceeds max_overhead
+    (fraction of one core), the interval is doubled.
+
+    CPU columns are fixed to the CPUs online at init. If CPUs are hot
+    (un)plugged, the change is logged; offline CPUs repeat their last
+    jiffies (utilisation 0) and new CPUs are not sampled.
+
+        Typical Usage:
+
+        with hardware.TelemetrySampler(interval=0.5) as sampler:
+            run_xhpl()
+        summary = sampler.get_summary()
+
+    Attributes:
+        interval (float): Seconds between samples.
+        capacity (int): Samples kept per ring buffer.
+        overhead (float): Fraction of one core spent sampling.
+        num_samples (int): Samples currently held.
+    """
+
+    def __init__(self, **kwargs):
+        """Init TelemetrySampler.
+
+        **kwargs:
+            interval (float): Seconds between samples.
+            capacity (int): Samples kept per ring buffer.
+            max_overhead (float): Max fraction of one core spent sampling.
+        """
+        self._interval = float(kwargs.setdefault(
+            "interval", CONSTANTS().TELEMETRY_INTERVAL,
+        ))
+        self._capacity = int(kwargs.setdefault(
+            "capacity", CONSTANTS().TELEMETRY_CAPACITY,
+        ))
+        self._max_overhead = float(kwargs.setdefault(
+            "max_overhead", CONSTANTS().TELEMETRY_MAX_OVERHEAD,
+        ))
+        self._f_stat = open(_get_path(CONSTANTS().FILE_PROC_STAT), "r")
+        self._f_meminfo = open(_get_path(CONSTANTS().FILE_MEMINFO), "r")
+        self._f_freq = [
+            open(i, "r") for i in _natural_glob(_get_path(CONSTANTS().GLOB_CPUFREQ))
+        ]
+        self._f_thermal = [
+            open(i, "r") for i in _natural_glob(_get_path(CONSTANTS().GLOB_THERMAL))
+        ]
+        cpu_ids, busy, total = self._read_stat()
+        num_cpus = len(cpu_ids)
+        self._cpu_ids = cpu_ids  # column order
+        self._cpu_index = {cpu: i for i, cpu in enumerate(cpu_ids)}
+        self._cpu_ids_seen = cpu_ids
+        self._last_stat = (busy, total)
+        self._time = _RingBuffer(self._capacity, 1, numpy.float64)
+        self._busy = _RingBuffer(self._capacity, num_cpus, numpy.uint64)
+        self._total = _RingBuffer(self._capacity, num_cpus, numpy.uint64)
+        self._freq = _RingBuffer(self._capacity, len(self._f_freq), numpy.float64)
+        self._mem = _RingBuffer(self._capacity, 2, numpy.uint64)
+        self._thermal = _RingBuffer(self._capacity, len(self._f_thermal), numpy.float64)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._cpu_time = 0.0
+        self._wall_time = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    @property
+    def interval(self):
+        """Get interval."""
+        return self._interval
+
+    @property
+    def capacity(self):
+        """Get capacity."""
+        return self._capacity
+
+    @property
+    def overhead(self):
+        """Get overhead."""
+        if self._wall_time == 0:
+            return 0.0
+        return self._cpu_time / self._wall_time
+
+    @property
+    def num_samples(self):
+        """Get num_samples."""
+        return len(self._time)
+
+    def _read_stat(self):
+        """Get CPU ids and per-CPU busy and total jiffies from /proc/stat."""
+        self._f_stat.seek(0)
+        rows = [
+            line.split()[:9] for line in self._f_stat
+            if line.startswith("cpu") and line[3].isdigit()
+        ]
+        cpu_ids = [int(row[0][3:]) for row in rows]
+        jiffies = numpy.array([row[1:] for row in rows], dtype=numpy.uint64)
+        total = jiffies.sum(axis=1)
+        busy = total - jiffies[:, 3] - jiffies[:, 4]  # idle, iowait
+        return (cpu_ids, busy, total)
+
+    def _align_stat(self, cpu_ids, busy, total):
+        """Get busy/total in init column order after CPU hotplug."""
+        if cpu_ids != self._cpu_ids_seen:
+            self._cpu_ids_seen = cpu_ids
+            logger.warning("Telemetry CPU Hotplug, online CPUs: {0} (sampling {1})".format(
+                len(cpu_ids), len(self._cpu_ids),
+            ))
+        aligned_busy, aligned_total = (i.copy() for i in self._last_stat)
+        for cpu, b, t in zip(cpu_ids, busy, total):
+            i = self._cpu_index.get(cpu)
+            if i is not None:
+                aligned_busy[i] = b
+                aligned_total[i] = t
+        return (aligned_busy, aligned_total)
+
+    def _read_meminfo(self):
+        """Get MemTotal and MemAvailable (kB) from /proc/meminfo."""
+        self._f_meminfo.seek(0)
+        mem = [0, 0]
+        for line in self._f_meminfo:
+            if line.startswith("MemTotal:"):
+                mem[0] = int(line.split()[1])
+            elif line.startswith("MemAvailable:"):
+                mem[1] = int(line.split()[1])
+                break
+        return mem
+
+    def _read_values(self, files, scale):
+        values = []
+        for f in files:
+            f.seek(0)
+            try:
+                values.append(float(f.read()) / scale)
+            except (OSError, ValueError):
+                values.append(numpy.nan)
+        return values
+
+    def sample(self):
+        """Take one sample of all sources.
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+        cpu_ids, busy, total = self._read_stat()
+        if cpu_ids != self._cpu_ids:
+            busy, total = self._align_stat(cpu_ids, busy, total)
+        elif self._cpu_ids_seen is not self._cpu_ids:
+            self._cpu_ids_seen = self._cpu_ids
+            logger.warning("Telemetry CPU Hotplug, online CPUs: {0}".format(len(cpu_ids)))
+        self._last_stat = (busy, total)
+        mem = self._read_meminfo()
+        freq = self._read_values(self._f_freq, 1000.0)  # kHz to MHz
+        thermal = self._read_values(self._f_thermal, 1000.0)  # mC to C
+        with self._lock:
+            self._time.append(now)
+            self._busy.append(busy)
+            self._total.append(total)
+            self._mem.append(mem)
+            self._freq.append(freq)
+            self._thermal.append(thermal)
+        return None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            wall_start = time.monotonic()
+            cpu_start = time.thread_time()
+            self.sample()
+            self._cpu_time += time.thread_time() - cpu_start
+            if (
+                self.overhead > self._max_overhead
+                and self._wall_time > 10 * self._interval
+            ):
+                self._interval *= 2
+                logger.warning("Telemetry Overhead High, interval: {0}s".format(
+                    self._interval,
+                ))
+                self._cpu_time = 0.0
+                self._wall_time = 0.0
+            self._stop_event.wait(self._interval)
+            self._wall_time += time.monotonic() - wall_start
+        return None
+
+    def start(self):
+        """Start sampling on a background thread."""
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target = self._run,
+                name = "TelemetrySampler",
+                daemon = True,
+            )
+            self._thread.start()
+        return None
+
+    def stop(self):
+        """Stop the background thread."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        return None
+
+    def close(self):
+        """Stop sampling and close file handles."""
+        self.stop()
+        for f in [self._f_stat, self._f_meminfo] + self._f_freq + self._f_thermal:
+            f.close()
+        return None
+
+    def get_timestamps(self):
+        """Get sample timestamps (time.monotonic() seconds).
+
+        Returns:
+            timestamps (numpy.ndarray): shape (samples,).
+        """
+        with self._lock:
+            return self._time.get()[:, 0]
+
+    def get_cpu_util(self):
+        """Get per-CPU utilisation between consecutive samples.
+
+        Returns:
+            util (numpy.ndarray): shape (samples - 1, cpus), range 0..1.
+        """
+        with self._lock:
+            busy = self._busy.get().astype(numpy.float64)
+            total = self._total.get().astype(numpy.float64)
+        d_total = numpy.diff(total, axis=0)
+        d_busy = numpy.diff(busy, axis=0)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            util = numpy.where(d_total > 0, d_busy / d_total, 0.0)
+        return util
+
+    def get_cpu_freq(self):
+        """Get per-CPU frequency (MHz).
+
+        Returns:
+            freq (numpy.ndarray): shape (samples, cpus with cpufreq).
+        """
+        with self._lock:
+            return self._freq.get()
+
+    def get_mem_used(self):
+        """Get fraction of memory not available.
+
+        Returns:
+            used (numpy.ndarray): shape (samples,), range 0..1.
+        """
+        with self._lock:
+            mem = self._mem.get().astype(numpy.float64)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            used = numpy.where(mem[:, 0] > 0, 1.0 - mem[:, 1] / mem[:, 0], 0.0)
+        return used
+
+    def get_thermal(self):
+        """Get thermal zone temperatures (C).
+
+        Returns:
+            thermal (numpy.ndarray): shape (samples, zones).
+        """
+        with self._lock:
+            return self._thermal.get()
+
+    def get_rate(self, array):
+        """Get per-second rate of change of a sampled array.
+
+        Args:
+            array (numpy.ndarray): Samples aligned with get_timestamps().
+
+        Returns:
+            rate (numpy.ndarray): shape (samples - 1, ...).
+        """
+        dt = numpy.diff(self.get_timestamps()[-len(array):])
+        return numpy.diff(array, axis=0) / dt.reshape((-1,) + (1,) * (array.ndim - 1))
+
+    def get_summary(self):
+        """Get p50/p99/max/mean summary of each telemetry source.
+
+        Returns:
+            summary (dict): keys are source names, values are dicts of
+                numpy.ndarray per channel.
+        """
+        summary = {
+            "cpu_util": _get_percentiles(self.get_cpu_util()),
+            "cpu_freq": _get_percentiles(self.get_cpu_freq()),
+            "mem_used": _get_percentiles(self.get_mem_used().reshape(-1, 1)),
+            "thermal": _get_percentiles(self.get_thermal()),
+            "overhead": self.overhead,
+        }
+        return summary
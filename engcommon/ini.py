@@ -3,17 +3,109 @@
 """
 This module is used to parse JSON-enconded ini configuration.
 
+The config is held as an immutable, validated INISnapshot. INIConfig can
+reload it from a watched local file (mtime polling) or by periodically
+refreshing the URL; reads take the current snapshot without locking, and
+registered callbacks are told of changes, so long-running services can
+swap endpoints without a restart.
+
 Ex:
     myini = INIConfig("http://builder.local/config.json")
+    myini.add_callback(lambda old, new: reconnect(new.dockerhost))
+    myini.start()  # refresh in the background
+    registry = myini.dockerhost  # or myini.snapshot.dockerhost
 """
 
 import json
 import logging
+import os
+import re
+import threading
+import urllib.parse
 import urllib.request
 
+from .constants import _const as CONSTANTS
+
 logger = logging.getLogger(__name__)
 
 
+def _check_host(value):
+    if not re.match(r"^[A-Za-z0-9.\-\[\]:]+$", value):
+        raise ValueError("Invalid host: {0}".format(value))
+
+
+def _check_url(value):
+    if urllib.parse.urlparse(value).scheme not in ("http", "https"):
+        raise ValueError("Invalid URL: {0}".format(value))
+
+
+class INISnapshot:
+    """A class for an immutable, validated INI config.
+
+    Attributes:
+        apihost (str): Host running XHPlconsole API.
+        buildhost (str): Host for general build info.
+        dockerhost (str): Host:Port serving docker registry.
+        jenkinshost (str): Host:Port running Jenkins.
+        xhplconsole_url (str): URL or XHPLconsole API.
+        kubeconfig (str): Kubernetes config on buildhost.
+    """
+
+    # (name, type, check) per declared field, check raises ValueError
+    FIELDS = (
+        ("apihost", str, _check_host),
+        ("buildhost", str, _check_host),
+        ("dockerhost", str, _check_host),
+        ("jenkinshost", str, _check_host),
+        ("xhplconsole_url", str, _check_url),
+        ("kubeconfig", str, None),
+    )
+
+    __slots__ = tuple(name for name, _, _ in FIELDS)
+
+    def __init__(self, dict_):
+        """Init INISnapshot.
+
+        Args:
+            dict_ (dict): Decoded INI config, unknown keys are ignored.
+
+        Raises:
+            ValueError: Missing or invalid field.
+        """
+        for name, type_, check in self.FIELDS:
+            if name not in dict_:
+                raise ValueError("Missing INI field: {0}".format(name))
+            value = dict_[name]
+            if not isinstance(value, type_) or not value:
+                raise ValueError("Invalid INI field: {0}".format(name))
+            if check is not None:
+                check(value)
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise TypeError
+
+    def __eq__(self, other):
+        if not isinstance(other, INISnapshot):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def to_dict(self):
+        """Get fields as a dict."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def diff(self, other):
+        """Get names of fields that differ from other.
+
+        Args:
+            other (INISnapshot): Snapshot.
+
+        Returns:
+            names (list): Changed fields.
+        """
+        return [n for n in self.__slots__ if getattr(self, n) != getattr(other, n)]
+
+
 class INIConfig:
     """A class for containing INI config info.
 
@@ -24,40 +116,88 @@ class INIConfig:
         jenkinshost (str): Host:Port running Jenkins.
         xhplconsole_url (str): URL or XHPLconsole API.
         kubeconfig (str): Kubernetes config on buildhost.
+        snapshot (INISnapshot): Current config.
     """
 
     def __init__(self, ini_url):
-        self._ini = self._get_ini_config(ini_url)
-        self._apihost = self._ini["apihost"]
-        self._buildhost = self._ini["buildhost"]
-        self._dockerhost = self._ini["dockerhost"]
-        self._jenkinshost = self._ini["jenkinshost"]
-        self._xhplconsole_url = self._ini["xhplconsole_url"]
-        self._kubeconfig = self._ini["kubeconfig"]
+        """Init INIConfig.
+
+        Args:
+            ini_url (str): URL of INI, or a local file path.
+
+        Raises:
+            IOError: Error opening INI resource.
+            ValueError: Invalid INI config.
+        """
+        self._ini_url = ini_url
+        self._path = self._get_local_path(ini_url)
+        self._stat = None
+        self._callbacks = []
+        self._lock = threading.Lock()  # serialises reloads, not reads
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._snapshot = self._load()
+
+    @property
+    def snapshot(self):
+        """Get snapshot."""
+        return self._snapshot
 
     @property
     def apihost(self):
-        return self._apihost
+        return self._snapshot.apihost
 
     @property
     def buildhost(self):
-        return self._buildhost
+        return self._snapshot.buildhost
 
     @property
     def dockerhost(self):
-        return self._dockerhost
+        return self._snapshot.dockerhost
 
     @property
     def jenkinshost(self):
-        return self._jenkinshost
+        return self._snapshot.jenkinshost
 
     @property
     def xhplconsole_url(self):
-        return self._xhplconsole_url
+        return self._snapshot.xhplconsole_url
 
     @property
     def kubeconfig(self):
-        return self._kubeconfig
+        return self._snapshot.kubeconfig
+
+    @staticmethod
+    def _get_local_path(ini_url):
+        """Get the local file of a path or file:// URL, None otherwise."""
+        parsed = urllib.parse.urlparse(ini_url)
+        if parsed.scheme == "file":
+            return urllib.request.url2pathname(parsed.path)
+        if parsed.scheme == "":
+            return ini_url
+        return None
+
+    def _get_stat(self):
+        try:
+            st = os.stat(self._path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _load(self):
+        """Get a validated snapshot of the INI resource."""
+        if self._path is not None:
+            self._stat = self._get_stat()
+            try:
+                with open(self._path) as f:
+                    dict_ = json.load(f)
+            except IOError:
+                logger.error("File Open Error")
+                logger.debug("resource: {0}".format(self._path))
+                raise
+        else:
+            dict_ = self._get_ini_config(self._ini_url)
+        return INISnapshot(dict_)
 
     def _get_ini_config(self, ini_url):
         """Get the INI config from URL.
@@ -79,15 +219,108 @@ class INIConfig:
                 }
 
         Raises:
-            IOError: Error opening INI resource.
+            IOError: Error opening INI resource, or INI_TIMEOUT expired.
+            ValueError: INI is not JSON.
         """
         try:
-            f = urllib.request.urlopen(ini_url)
+            with urllib.request.urlopen(ini_url, timeout=CONSTANTS().INI_TIMEOUT) as f:
+                ini = f.read().decode("utf-8")
         except IOError:
             logger.error("URL Open Error")
             logger.debug("resource: {0}".format(ini_url))
             raise
-        else:
-            ini = f.read().decode("utf-8")
-            dict_ = json.loads(ini)
+        dict_ = json.loads(ini)
         return dict_
+
+    def add_callback(self, callback):
+        """Add a callable invoked as callback(old, new) on config changes."""
+        self._callbacks.append(callback)
+        return None
+
+    def remove_callback(self, callback):
+        """Remove a change callback, if added."""
+        if callback in self._callbacks:
+            self._callbacks.remove(callback)
+        return None
+
+    def reload(self):
+        """Reload the config, swap the snapshot and notify callbacks if it
+        changed.
+
+        Returns:
+            changed (list): Names of changed fields.
+
+        Raises:
+            IOError: Error opening INI resource.
+            ValueError: Invalid INI config, the current snapshot is kept.
+        """
+        with self._lock:
+            new = self._load()
+            old = self._snapshot
+            changed = new.diff(old)
+            if not changed:
+                return changed
+            self._snapshot = new  # readers see old or new, never a mix
+        logger.info("INI Config Changed: {0}".format(", ".join(changed)))
+        for callback in list(self._callbacks):
+            try:
+                callback(old, new)
+            except Exception:
+                logger.exception("INI Callback Error")
+        return changed
+
+    def check(self):
+        """Reload if the watched file changed since last read.
+
+        URLs are always reloaded.
+
+        Returns:
+            changed (list): Names of changed fields.
+        """
+        if self._path is not None and self._get_stat() == self._stat:
+            return []
+        return self.reload()
+
+    def _run(self, interval):
+        while not self._stop_event.wait(interval):
+            try:
+                self.check()
+            except (IOError, ValueError):
+                logger.warning("INI Reload Error, keeping current config")
+            except Exception:
+                logger.exception("INI Reload Error, keeping current config")
+        return None
+
+    def start(self, interval=None):
+        """Watch for changes on a background thread.
+
+        Args:
+            interval (float): Seconds between checks. Default: INI_POLL_INTERVAL
+                for files, INI_REFRESH_INTERVAL for URLs.
+
+        Returns:
+            None
+        """
+        if interval is None:
+            if self._path is not None:
+                interval = CONSTANTS().INI_POLL_INTERVAL
+            else:
+                interval = CONSTANTS().INI_REFRESH_INTERVAL
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target = self._run,
+                args = (interval,),
+                name = "INIConfigWatcher",
+                daemon = True,
+            )
+            self._thread.start()
+        return None
+
+    def stop(self):
+        """Stop watching for changes."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        return None
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+
+"""
+This module contains fleet hardware inventory records and queries.
+
+collect_inventory() reads one node's hardware into a flat, JSON
+serialisable record with a fingerprint: a hash of the hardware fields only
+(not host name, serial or UUID), so identically configured nodes share a
+fingerprint. InventoryStore loads thousands of records into a NumPy
+structured array, with strings and flag sets dictionary-encoded, for
+group-by, outlier and drift queries across the fleet.
+
+    Typical Usage:
+
+    # on each node
+    inventory.write_inventory("/shared/inventory/{0}.json".format(host))
+
+    # on the head node
+    store = inventory.InventoryStore.from_files(glob.glob("/shared/inventory/*.json"))
+    store.get_outliers("bios_version")  # {"node0042": "1.3.9", ...}
+    store.get_drift("node0001")
+"""
+
+import hashlib
+import json
+import logging
+import re
+import socket
+
+import numpy
+
+from . import fileio
+from . import hardware
+from . import testvar
+
+logger = logging.getLogger(__name__)
+
+# Fields hashed into the fingerprint, in record order
+HARDWARE_FIELDS = [
+    "cpu_vendor",
+    "cpu_model",
+    "sockets",
+    "cores",
+    "threads",
+    "numa_nodes",
+    "mem_total_kb",
+    "dimm_count",
+    "dimm_total_gb",
+    "bios_version",
+    "flags",
+]
+
+INVENTORY_DTYPE = numpy.dtype([
+    ("host", "i4"),
+    ("fingerprint", "i4"),
+    ("cpu_vendor", "i4"),
+    ("cpu_model", "i4"),
+    ("sockets", "i4"),
+    ("cores", "i4"),
+    ("threads", "i4"),
+    ("numa_nodes", "i4"),
+    ("mem_total_kb", "i8"),
+    ("dimm_count", "i4"),
+    ("dimm_total_gb", "i8"),
+    ("bios_version", "i4"),
+    ("flags", "i4"),
+])
+
+# Fields stored as codes into InventoryStore values
+_CODED_FIELDS = ["host", "fingerprint", "cpu_vendor", "cpu_model", "bios_version", "flags"]
+
+
+def get_fingerprint(record):
+    """Get the hardware fingerprint of an inventory record.
+
+    Args:
+        record (dict): Inventory record.
+
+    Returns:
+        fingerprint (str): SHA-256 hex digest (first 16 chars).
+    """
+    hardware_ = {k: record.get(k) for k in HARDWARE_FIELDS}
+    hardware_["flags"] = sorted(hardware_["flags"] or [])
+    text = json.dumps(hardware_, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _get_dimms(dmi):
+    """Get (count, total GB) of populated DIMMs from parsed dmidecode."""
+    count = 0
+    total = 0
+    for stanza in dmi.get("Memory Device", []):
+        match = re.search(r"^\s*Size: (\d+) (GB|MB)", stanza, re.MULTILINE)
+        if match:
+            count += 1
+            size = int(match.group(1))
+            total += size if match.group(2) == "GB" else size // 1024
+    return count, total
+
+
+def _get_bios_version(dmi):
+    for stanza in dmi.get("BIOS Information", []):
+        match = re.search(r"^\s*Version: (.*)$", stanza, re.MULTILINE)
+        if match:
+            return match.group(1).strip()
+    return ""
+
+
+def collect_inventory(host=None):
+    """Get the inventory record of this node.
+
+    NOTE: May require 'sudo' (dmidecode), unless the fact cache is
+    populated (see hardware.collect_static_facts()).
+
+    Args:
+        host (str): Host name, socket.gethostname() if None.
+
+    Returns:
+        record (dict): Inventory record: host, fingerprint and
+            HARDWARE_FIELDS. flags is a sorted list.
+    """
+    lscpu = hardware.get_lscpu()
+    dmi = hardware.get_dmidecode()
+    dimm_count, dimm_total_gb = _get_dimms(dmi)
+    record = {
+        "host": host or socket.gethostname(),
+        "cpu_vendor": hardware.get_cpu_vendor(),
+        "cpu_model": hardware.get_cpu_model(),
+        "sockets": int(lscpu.get("Socket(s)", 1)),
+        "cores": hardware.get_cpu_core_count(),
+        "threads": len(hardware.get_cpuinfo_columnar()),
+        "numa_nodes": hardware.get_numa_node_count(),
+        "mem_total_kb": int(hardware.get_meminfo()["MemTotal"]),
+        "dimm_count": dimm_count,
+        "dimm_total_gb": dimm_total_gb,
+        "bios_version": _get_bios_version(dmi),
+        "flags": sorted(set(hardware.get_cpuinfo_columnar().get_flags())),
+    }
+    record["fingerprint"] = get_fingerprint(record)
+    testvar.check_null(record["cpu_model"])
+    return record
+
+
+def write_inventory(path, host=None):
+    """Write the inventory record of this node as JSON (atomic replace).
+
+    Args:
+        path (str): Destination file.
+        host (str): Host name, socket.gethostname() if None.
+
+    Returns:
+        record (dict): Inventory record.
+
+    Raises:
+        OSError: Error writing file.
+    """
+    record = collect_inventory(host)
+    fileio.write_file_atomic(path, json.dumps(record, sort_keys=True))
+    return record
+
+
+class InventoryStore:
+    """A class for a columnar store of fleet inventory records.
+
+    Records are one row each of a structured array (INVENTORY_DTYPE).
+    String fields and flag sets are codes into per-field distinct values,
+    so 2,000 nodes with two BIOS versions hold two version strings.
+
+    Ex:
+        store.get_array("mem_total_kb") is an int64 array, one per host.
+        store.group_by("cpu_model") maps each model to its hosts.
+
+    Attributes:
+        hosts (list): Host names in record order.
+        data (numpy.ndarray): Structured array of codes and numbers.
+    """
+
+    def __init__(self, records):
+        """Init InventoryStore.
+
+        Args:
+            records (iterable): Inventory records (dicts).
+        """
+        records = list(records)
+        self._values = {field: [] for field in _CODED_FIELDS}
+        index = {field: {} for field in _CODED_FIELDS}
+        self._data = numpy.zeros(len(records), dtype=INVENTORY_DTYPE)
+        for i, record in enumerate(records):
+            row = []
+            for field in INVENTORY_DTYPE.names:
+                value = record.get(field)
+                if field == "fingerprint" and value is None:
+                    value = get_fingerprint(record)
+                if field in index:
+                    if field == "flags":
+                        value = tuple(sorted(value or ()))
+                    code = index[field].get(value)
+                    if code is None:
+                        code = index[field][value] = len(self._values[field])
+                        self._values[field].append(value)
+                    value = code
+                row.append(value or 0)
+            self._data[i] = tuple(row)
+        self._host_index = {host: i for i, host in enumerate(self._values["host"])}
+
+    @classmethod
+    def from_files(cls, paths):
+        """Get a store of JSON inventory files.
+
+        Unreadable or malformed files are logged and skipped.
+
+        Args:
+            paths (iterable): Files written by write_inventory().
+
+        Returns:
+            store (InventoryStore): Store.
+        """
+        records = []
+        for path in paths:
+            try:
+                with open(path) as f:
+                    records.append(json.load(f))
+            except (OSError, ValueError):
+                logger.warning("Inventory Read Error")
+                logger.debug("path: {0}".format(path))
+        return cls(records)
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hosts(self):
+        """Get hosts."""
+        return [self._values["host"][c] for c in self._data["host"]]
+
+    @property
+    def data(self):
+        """Get data."""
+        return self._data
+
+    def get_array(self, field):
+        """Get the per-host values of a numeric field, or codes of a coded
+        field (see get_unique()).
+
+        Args:
+            field (str): INVENTORY_DTYPE field.
+
+        Returns:
+            array (numpy.ndarray): One entry per record.
+        """
+        return self._data[field]
+
+    def get_unique(self, field):
+        """Get distinct values of a coded field, indexed by code.
+
+        Args:
+            field (str): host, fingerprint, cpu_vendor, cpu_model,
+                bios_version or flags (tuples).
+
+        Returns:
+            values (tuple): Distinct values.
+        """
+        return tuple(self._values[field])
+
+    def _decode(self, field, code):
+        if field in self._values:
+            return self._values[field][code]
+        return code.item()
+
+    def get_record(self, host):
+        """Get the record of a host.
+
+        Args:
+            host (str): Host name.
+
+        Returns:
+            record (dict): Inventory record (flags as a list).
+
+        Raises:
+            KeyError: Unknown host.
+        """
+        row = self._data[self._data["host"] == self._host_index[host]][0]
+        record = {f: self._decode(f, row[f]) for f in INVENTORY_DTYPE.names}
+        record["flags"] = list(record["flags"])
+        return record
+
+    def group_by(self, field):
+        """Group hosts by the value of a field.
+
+        Args:
+            field (str): INVENTORY_DTYPE field.
+
+        Returns:
+            groups (dict): keys are values, values are host lists, largest
+                group first.
+        """
+        uniques, inverse, counts = numpy.unique(
+            self._data[field], return_inverse=True, return_counts=True,
+        )
+        host_names = numpy.array(self._values["host"], dtype=object)[self._data["host"]]
+        order = numpy.argsort(-counts, kind="stable")
+        return {
+            self._decode(field, uniques[i]): sorted(host_names[inverse == i])
+            for i in order
+        }
+
+    def get_outliers(self, field):
+        """Get hosts whose value of a field differs from the most common.
+
+        Args:
+            field (str): INVENTORY_DTYPE field.
+
+        Returns:
+            outliers (dict): keys are hosts, values are their values.
+        """
+        column = self._data[field]
+        if len(column) == 0:
+            return {}
+        uniques, counts = numpy.unique(column, return_counts=True)
+        mode = uniques[numpy.argmax(counts)]
+        rows = numpy.nonzero(column != mode)[0]
+        return {
+            self._values["host"][self._data["host"][i]]: self._decode(field, column[i])
+            for i in rows
+        }
+
+    def get_drift(self, reference):
+        """Get hardware differences of every host from a reference host.
+
+        Hosts sharing the reference fingerprint are skipped without
+        comparing fields.
+
+        Args:
+            reference (str): Reference host name.
+
+        Returns:
+            drift (dict): keys are hosts that differ, values are dicts of
+                field: (reference value, host value). For flags the values
+                are (missing flags, extra flags) as sorted lists.
+
+        Raises:
+            KeyError: Unknown reference host.
+        """
+        ref = self._data[self._data["host"] == self._host_index[reference]][0]
+        diff = self._data[self._data["fingerprint"] != ref["fingerprint"]]
+        flag_sets = {}  # (ref code, code): (missing, extra)
+        drift = {}
+        for row in diff:
+            host = self._values["host"][row["host"]]
+            changes = {}
+            for field in HARDWARE_FIELDS:
+                if row[field] == ref[field]:
+                    continue
+                if field == "flags":
+                    key = (int(ref[field]), int(row[field]))
+                    if key not in flag_sets:
+                        a = set(self._values["flags"][key[0]])
+                        b = set(self._values["flags"][key[1]])
+                        flag_sets[key] = (sorted(a - b), sorted(b - a))
+                    changes[field] = flag_sets[key]
+                else:
+                    changes[field] = (self._decode(field, ref[field]), self._decode(field, row[field]))
+            drift[host] = changes
+        return drift
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+
+"""
+This module contains a persistent ipmitool session for querying the BMC.
+
+Spawning ipmitool for every query pays for a full session setup each time,
+which can take seconds against a remote BMC. IPMISession keeps a single
+"ipmitool shell" subprocess open, multiplexes queries over it and caches the
+parsed results.
+
+    Typical Usage:
+
+    bmc = ipmi.IPMISession(host="bmc01", user="admin", password="secret")
+    sensors = bmc.get_sensor()
+    bmc.close()
+"""
+
+import logging
+import os
+import re
+import select
+import subprocess
+import threading
+import time
+
+from . import error
+from . import testvar
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+# ipmitool error output, e.g. "Invalid command: sdr lst"
+_RE_ERROR = re.compile(
+    r"\A\s*(Invalid command|Error|Unable to|Could not|.* command failed)",
+    re.IGNORECASE,
+)
+
+
+class IPMISession:
+    """A class for a long-lived ipmitool shell session.
+
+    Queries are serialised over one subprocess. If the subprocess dies or
+    stalls, it is restarted and the query is retried once. The password is
+    passed in the IPMI_PASSWORD environment variable (ipmitool -E), not on
+    the command line.
+
+    Attributes:
+        cmd (list): ipmitool command used to start the shell.
+        ttl (float): Seconds a parsed result stays cached.
+        timeout (float): Seconds to wait for a query response.
+    """
+
+    def __init__(self, host=None, user=None, password=None, **kwargs):
+        """Init IPMISession.
+
+        Args:
+            host (str): BMC host. Local BMC (open interface) if None.
+            user (str): BMC user.
+            password (str): BMC password.
+
+        **kwargs:
+            interface (str): ipmitool interface for remote BMC.
+            ipmitool (str): ipmitool executable.
+            ttl (float): Seconds a parsed result stays cached.
+            timeout (float): Seconds to wait for a query response.
+        """
+        my_interface = kwargs.setdefault("interface", "lanplus")
+        my_ipmitool = kwargs.setdefault("ipmitool", CONSTANTS().CMD_IPMITOOL)
+        self._ttl = float(kwargs.setdefault("ttl", CONSTANTS().IPMI_CACHE_TTL))
+        self._timeout = float(kwargs.setdefault("timeout", CONSTANTS().IPMI_TIMEOUT))
+        self._cmd = self._get_cmd(my_ipmitool, host, user, password, my_interface)
+        self._env = None
+        if host and password:
+            self._env = dict(os.environ, IPMI_PASSWORD=password)
+        self._prompt = CONSTANTS().IPMI_PROMPT.encode()
+        self._proc = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    @property
+    def cmd(self):
+        """Get cmd."""
+        return self._cmd
+
+    @property
+    def ttl(self):
+        """Get ttl."""
+        return self._ttl
+
+    @property
+    def timeout(self):
+        """Get timeout."""
+        return self._timeout
+
+    def _get_cmd(self, ipmitool, host, user, password, interface):
+        cmd = ipmitool.split()
+        if host:
+            cmd.extend(["-I", interface, "-H", host])
+            if user:
+                cmd.extend(["-U", user])
+            if password:
+                cmd.append("-E")  # password from IPMI_PASSWORD
+        cmd.append("shell")
+        return cmd
+
+    def _start(self):
+        """Start the ipmitool shell and wait for the first prompt.
+
+        Raises:
+            OSError: Error starting ipmitool.
+        """
+        try:
+            self._proc = subprocess.Popen(
+                self._cmd,
+                stdin = subprocess.PIPE,
+                stdout = subprocess.PIPE,
+                stderr = subprocess.STDOUT,
+                bufsize = 0,
+                close_fds = True,
+                env = self._env,
+            )
+        except OSError:
+            logger.error("IPMI Shell Start Error")
+            logger.debug(testvar.get_debug(self._cmd))
+            raise
+        self._read_until_prompt()
+        return None
+
+    def _stop(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.write(b"exit\n")
+                self._proc.stdin.flush()
+            except (OSError, ValueError):
+                pass
+            try:
+                self._proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+                self._proc.wait()
+            self._proc.stdin.close()
+            self._proc.stdout.close()
+            self._proc = None
+        return None
+
+    def _read_until_prompt(self):
+        """Read shell output up to the next prompt.
+
+        Returns:
+            output (str): Output preceding the prompt.
+
+        Raises:
+            error.ShellCommandExecutionError: Shell exited or timed out.
+        """
+        buf = bytearray()
+        fd = self._proc.stdout.fileno()
+        deadline = time.monotonic() + self._timeout
+        while not buf.endswith(self._prompt):
+            remaining = deadline - time.monotonic()
+            ready = select.select([fd], [], [], max(remaining, 0))[0]
+            chunk = os.read(fd, 65536) if ready else b""
+            if not chunk:
+                raise error.ShellCommandExecutionError({
+                    'ret_code': self._proc.poll(),
+                    'cmd': " ".join(self._cmd),
+                })
+            buf.extend(chunk)
+        output = bytes(buf[:-len(self._prompt)]).decode("utf-8", "replace")
+        return output
+
+    def _query(self, query):
+        if self._proc is None or self._proc.poll() is not None:
+            self._stop()
+            self._start()
+        self._proc.stdin.write("{0}\n".format(query).encode())
+        self._proc.stdin.flush()
+        return self._read_until_prompt()
+
+    def query(self, query):
+        """Run a query in the ipmitool shell, uncached.
+
+        The shell is restarted and the query retried once on failure.
+
+        Args:
+            query (str): ipmitool subcommand (e.g. "sdr list").
+
+        Returns:
+            output (str): Raw query output.
+
+        Raises:
+            error.ShellCommandExecutionError: Query failed after reconnect.
+        """
+        with self._lock:
+            try:
+                output = self._query(query)
+            except (OSError, error.ShellCommandExecutionError):
+                logger.warning("IPMI Shell Lost, reconnecting")
+                self._stop()
+                try:
+                    output = self._query(query)
+                except (OSError, error.ShellCommandExecutionError) as e:
+                    logger.error("IPMI Query Error")
+                    logger.debug(testvar.get_debug((query, e.args)))
+                    self._stop()
+                    raise
+        return output
+
+    def _get_cached(self, query, parser, refresh):
+        """Get parsed query output, cached for ttl.
+
+        Raises:
+            error.ShellCommandExecutionError: Query failed or ipmitool
+                printed an error (not cached).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(query)
+        if refresh or entry is None or (now - entry[0]) > self._ttl:
+            output = self.query(query)
+            if _RE_ERROR.match(output):
+                logger.error("IPMI Query Error")
+                logger.debug(testvar.get_debug((query, output)))
+                raise error.ShellCommandExecutionError({
+                    'ret_code': None,
+                    'cmd': query,
+                    'stderr': output,
+                })
+            entry = (now, parser(output))
+            with self._lock:
+                self._cache[query] = entry
+        return entry[1]
+
+    def get_sdr(self, refresh=False):
+        """Get sensor data repository.
+
+        Ex:
+            sdr["CPU1 Temp"]["value"] is "45 degrees C".
+
+        Args:
+            refresh (bool): Bypass cache.
+
+        Returns:
+            sdr (dict): keys are sensor names, values are dicts.
+        """
+        return self._get_cached("sdr list", parse_sdr, refresh)
+
+    def get_sensor(self, refresh=False):
+        """Get sensor readings with thresholds.
+
+        Args:
+            refresh (bool): Bypass cache.
+
+        Returns:
+            sensor (dict): keys are sensor names, values are dicts.
+        """
+        return self._get_cached("sensor list", parse_sensor, refresh)
+
+    def get_fru(self, refresh=False):
+        """Get FRU inventory.
+
+        Ex:
+            fru["Builtin FRU Device (ID 0)"]["Board Serial"]
+
+        Args:
+            refresh (bool): Bypass cache.
+
+        Returns:
+            fru (dict): keys are FRU device descriptions, values are dicts.
+        """
+        return self._get_cached("fru print", parse_fru, refresh)
+
+    def get_sel(self, refresh=False):
+        """Get system event log entries.
+
+        Args:
+            refresh (bool): Bypass cache.
+
+        Returns:
+            sel (list): SEL entries as dicts.
+        """
+        return self._get_cached("sel list", parse_sel, refresh)
+
+    def clear_cache(self):
+        """Clear cached query results."""
+        with self._lock:
+            self._cache.clear()
+        return None
+
+    def close(self):
+        """Close the ipmitool shell."""
+        with self._lock:
+            self._stop()
+        return None
+
+
+def _split_fields(line):
+    return [field.strip() for field in line.split("|")]
+
+
+def parse_sdr(stdout):
+    """Parse "sdr list" output.
+
+    Args:
+        stdout (str): ipmitool output.
+
+    Returns:
+        sdr (dict): keys are sensor names, values are dicts.
+    """
+    sdr = {}
+    for line in stdout.splitlines():
+        fields = _split_fields(line)
+        if len(fields) >= 3:
+            sdr[fields[0]] = {
+                "value": fields[1],
+                "status": fields[2],
+            }
+    return sdr
+
+
+def parse_sensor(stdout):
+    """Parse "sensor list" output.
+
+    Args:
+        stdout (str): ipmitool output.
+
+    Returns:
+        sensor (dict): keys are sensor names, values are dicts.
+    """
+    keys = ["value", "units", "status", "lnr", "lcr", "lnc", "unc", "ucr", "unr"]
+    sensor = {}
+    for line in stdout.splitlines():
+        fields = _split_fields(line)
+        if len(fields) >= 4:
+            sensor[fields[0]] = dict(zip(keys, fields[1:]))
+    return sensor
+
+
+def parse_fru(stdout):
+    """Parse "fru print" output.
+
+    Args:
+        stdout (str): ipmitool output.
+
+    Returns:
+        fru (dict): keys are FRU device descriptions, values are dicts.
+    """
+    fru = {}
+    entry = None
+    for line in stdout.splitlines():
+        if ":" not in line:
+            continue
+        k = (line.split(":", 1)[0]).strip()
+        v = (line.split(":", 1)[1]).strip()
+        if k == "FRU Device Description":
+            entry = {}
+            fru[v] = entry
+        elif entry is not None:
+            entry[k] = v
+    return fru
+
+
+def parse_sel(stdout):
+    """Parse "sel list" output.
+
+    Args:
+        stdout (str): ipmitool output.
+
+    Returns:
+        sel (list): SEL entries as dicts.
+    """
+    keys = ["id", "date", "time", "sensor", "event", "direction"]
+    sel = []
+    for line in stdout.splitlines():
+        fields = _split_fields(line)
+        if len(fields) >= 5:
+            sel.append(dict(zip(keys, fields)))
+    return sel
@@ -5,15 +5,344 @@ This module contains functions for configuring and writing logs for institutiona
 standardisation.
 """
 
+import atexit
 import datetime
+import glob
+import gzip
 import io
+import json
 import logging
 import logging.config
+import logging.handlers
 import os
+import queue
+import shutil
+import signal
 import socket
+import threading
+import time
+import weakref
+
+from .constants import _const as CONSTANTS
 
 logger = logging.getLogger(__name__)
 
+JSON_FIELDS = (
+    "asctime",
+    "levelname",
+    "name",
+    "module",
+    "funcName",
+    "lineno",
+    "process",
+    "message",
+)
+
+
+class JSONFormatter(logging.Formatter):
+    """A class for formatting records as JSON lines.
+
+    The field layout is resolved once at init: only the listed LogRecord
+    attributes are read, and asctime is only formatted if listed. Context
+    fields (log_id, hostname) are constant per formatter and merged into
+    every line.
+
+    Ex:
+        {"log_id":"favorable-wire","hostname":"hosaka","asctime":"...",
+         "levelname":"INFO",...,"message":"LOGS: /tmp/logs/..."}
+    """
+
+    def __init__(self, fields=JSON_FIELDS, datefmt=None, log_id=None, **context):
+        """Init JSONFormatter.
+
+        Args:
+            fields (list): LogRecord attributes to include, in order.
+            datefmt (str): strftime format for asctime, ISO 8601 if None.
+            log_id (str): Unique runtime ID.
+
+        **context:
+            Extra constant fields (e.g. job="xhpl").
+        """
+        super().__init__(datefmt=datefmt)
+        self._context = {"hostname": socket.gethostname()}
+        if log_id:
+            self._context["log_id"] = log_id
+        self._context.update(context)
+        self._fields = tuple(i for i in fields if i not in ("asctime", "message"))
+        self._asctime = "asctime" in fields
+        self._second = None
+        self._second_fmt = None
+        self._message = "message" in fields
+        self._encode = json.JSONEncoder(
+            ensure_ascii = False,
+            separators = (",", ":"),
+            default = str,
+        ).encode
+
+    def formatTime(self, record, datefmt=None):
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        if second != self._second:  # reformat date/time/zone once per second
+            t = time.localtime(second)
+            zone = time.strftime("%z", t)
+            self._second = second
+            self._second_fmt = (
+                time.strftime("%Y-%m-%dT%H:%M:%S", t),
+                "{0}:{1}".format(zone[:3], zone[3:]),
+            )
+        return "{0}.{1:03d}{2}".format(
+            self._second_fmt[0], int(record.msecs), self._second_fmt[1],
+        )
+
+    def format(self, record):
+        entry = dict(self._context)
+        if self._asctime:
+            entry["asctime"] = self.formatTime(record, self.datefmt)
+        for field in self._fields:
+            entry[field] = getattr(record, field, None)
+        if self._message:
+            entry["message"] = record.getMessage()
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+            entry["exc_text"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return self._encode(entry)
+
+
+class _Compressor:
+    """Background thread gzipping rotated log segments."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, path, done):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target = self._run,
+                    name = "LogCompressor",
+                    daemon = True,
+                )
+                self._thread.start()
+        self._queue.put((path, done))
+        return None
+
+    def _run(self):
+        while True:
+            path, done = self._queue.get()
+            try:
+                with open(path, "rb") as f_in, gzip.open(path + ".gz", "wb") as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+                os.remove(path)
+                done()
+            except OSError:
+                logger.error("Log Compression Error")
+                logger.debug("path: {0}".format(path))
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Wait for queued segments to be compressed."""
+        if self._thread is not None:
+            self._queue.join()
+        return None
+
+
+_compressor = _Compressor()
+atexit.register(_compressor.join)
+
+
+def wait_for_compression():
+    """Wait for rotated log segments to finish compressing.
+
+    Returns:
+        None
+    """
+    _compressor.join()
+    return None
+
+
+class RotatingCompressedFileHandler(logging.handlers.BaseRotatingHandler):
+    """A class for a log file rotated by size and age.
+
+    Rotated segments are renamed to "<file>.<timestamp>" and gzipped on a
+    background thread, so emitting never waits on compression. Only the
+    newest backup_count segments are kept; all of them live next to the
+    active file so the logdir holds the run history.
+
+    Attributes:
+        max_bytes (int): Size at which to roll over, 0 disables.
+        interval (float): Seconds after which to roll over, 0 disables.
+        backup_count (int): Segments kept, 0 keeps all.
+    """
+
+    def __init__(self, filename, max_bytes=None, interval=None, backup_count=None, **kwargs):
+        """Init RotatingCompressedFileHandler.
+
+        Args:
+            filename (str): Log file.
+            max_bytes (int): Size at which to roll over.
+            interval (float): Seconds after which to roll over.
+            backup_count (int): Segments kept.
+
+        **kwargs:
+            mode, encoding, delay: as for logging.FileHandler.
+        """
+        kwargs.setdefault("mode", "a")
+        super().__init__(filename, **kwargs)
+        self.max_bytes = CONSTANTS().LOG_MAX_BYTES if max_bytes is None else max_bytes
+        self.interval = CONSTANTS().LOG_INTERVAL if interval is None else interval
+        self.backup_count = (
+            CONSTANTS().LOG_BACKUP_COUNT if backup_count is None else backup_count
+        )
+        self._rollover_at = time.time() + self.interval
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() >= self._rollover_at:
+            return True
+        if self.max_bytes:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() >= self.max_bytes:
+                return True
+        return False
+
+    def _get_segments(self):
+        """Get rotated segments, oldest first."""
+        segments = glob.glob(glob.escape(self.baseFilename) + ".*")
+        return sorted(i for i in segments if not i.endswith(".tmp"))
+
+    def _prune(self):
+        if self.backup_count:
+            compressed = [i for i in self._get_segments() if i.endswith(".gz")]
+            for path in compressed[:-self.backup_count]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return None
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S.%f")
+        segment = "{0}.{1}".format(self.baseFilename, timestamp)
+        if os.path.exists(self.baseFilename):
+            os.rename(self.baseFilename, segment)
+            _compressor.submit(segment, self._prune)
+        self._rollover_at = time.time() + self.interval
+        if not self.delay:
+            self.stream = self._open()
+        return None
+
+
+_duplicate_filters = weakref.WeakSet()
+
+
+class DuplicateFilter(logging.Filter):
+    """A class for suppressing repeated log records.
+
+    Records are keyed by (logger name, level, message template), so
+    "Shell Command Execution Error" from check_returncode counts as one
+    key however its arguments differ. Within each window the first burst
+    records of a key pass, then only every sample-th record (0: none).
+    When a key's window ends with records suppressed, an "N similar
+    messages suppressed" summary record is emitted: before the key's next
+    record, when the window is swept, or by flush() (run at exit).
+    Records are never modified.
+
+    One instance can be shared by several handlers; the decision for a
+    record is made once per thread and reused by the other handlers.
+
+    Attributes:
+        window (float): Window length in seconds.
+        burst (int): Records per key passed per window.
+        sample (int): Pass every n-th suppressed record, 0 disables.
+    """
+
+    def __init__(self, window=None, burst=None, sample=0):
+        super().__init__()
+        self.window = float(CONSTANTS().LOG_DEDUP_WINDOW if window is None else window)
+        self.burst = int(CONSTANTS().LOG_DEDUP_BURST if burst is None else burst)
+        self.sample = int(sample)
+        self._keys = {}  # key: [window end, count, suppressed, name, level, msg]
+        self._lock = threading.Lock()
+        self._local = threading.local()  # last (record, result) of this thread
+        self._next_sweep = time.monotonic() + self.window
+        _duplicate_filters.add(self)
+
+    def filter(self, record):
+        last = getattr(self._local, "last", None)
+        if last is not None and last[0] is record:
+            return last[1]
+        if getattr(record, "_dedup_summary", False):
+            return True
+        now = time.monotonic()
+        key = (record.name, record.levelno, record.msg)
+        expired = []
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None or now >= state[0]:
+                if state is not None and state[2]:
+                    expired.append(state)
+                state = self._keys[key] = [now + self.window, 0, 0, record.name, record.levelno, key[2]]
+            state[1] += 1
+            if state[1] <= self.burst:
+                result = True
+            else:
+                state[2] += 1
+                result = bool(self.sample) and state[2] % self.sample == 0
+            if now >= self._next_sweep:
+                expired.extend(self._sweep(now))
+        self._local.last = (record, result)
+        self._emit_summaries(expired)
+        return result
+
+    def _sweep(self, now):
+        """Remove expired keys, get those with suppressed records."""
+        self._next_sweep = now + self.window
+        expired = [k for k, v in self._keys.items() if now >= v[0]]
+        return [self._keys.pop(k) for k in expired if self._keys[k][2]]
+
+    def _emit_summaries(self, states):
+        for window_end, count, suppressed, name, level, msg in states:
+            lgr = logging.getLogger(name)
+            summary = lgr.makeRecord(
+                name, level, "(dedup)", 0,
+                "%d similar messages suppressed: %s", (suppressed, msg), None,
+            )
+            summary._dedup_summary = True
+            lgr.handle(summary)
+        return None
+
+    def flush(self):
+        """Emit summaries for all keys with suppressed records.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            states = [v for v in self._keys.values() if v[2]]
+            self._keys.clear()
+        self._emit_summaries(states)
+        return None
+
+
+def _flush_duplicate_filters():
+    """Emit pending dedup summaries before logging shuts down."""
+    for dedup in list(_duplicate_filters):
+        dedup.flush()
+    return None
+
+
+atexit.register(_flush_duplicate_filters)  # runs before logging.shutdown
+
 
 def get_logdir(module_name, **kwargs):
     """Get directory in which to save logs.
@@ -90,6 +419,9 @@ def get_std_logger_conf():
                 'format': '',
                 'datefmt': '',
             },
+            'json': {
+                '()': 'engcommon.log.JSONFormatter',
+            },
         },
         'handlers': {
             'file': {
@@ -132,6 +464,17 @@ def get_std_logger(module_name, debug, **kwargs):
 
     **kwargs:
         logdir (str): Custom logdir to store log files.
+        formats (dict): Formatter per handler, keys: 'file', 'console',
+            'buffer' or 'debug', values: 'simple', 'complex' or 'json'.
+            With 'debug': 'json', lgr_nf also writes JSON lines to the
+            debug file. Ex: {"debug": "json"}
+        log_id (str): Unique runtime ID included in JSON lines.
+        dedup (dict): Suppress repeated records on the file, console,
+            buffer and debug handlers with DuplicateFilter, keys: 'window',
+            'burst', 'sample'. Ex: {"window": 60, "burst": 5}
+        rotate (dict): Rotate the cmd and debug files with
+            RotatingCompressedFileHandler, keys: 'max_bytes', 'interval',
+            'backup_count'. Ex: {"max_bytes": 1048576, "backup_count": 10}
 
     Returns:
         tuple(
@@ -151,6 +494,25 @@ def get_std_logger(module_name, debug, **kwargs):
     logger_dict['handlers']['buffer']['stream'] = buffer_cmd
     logger_dict['handlers']['debug']['filename'] = logfile_debug
     logger_dict['handlers']['noformat']['filename'] = logfile_debug
+    for handler, formatter in kwargs.setdefault("formats", {}).items():
+        logger_dict['handlers'][handler]['formatter'] = formatter
+    if logger_dict['handlers']['debug']['formatter'] == 'json':
+        # Shares the debug file, keep every line of it JSON
+        logger_dict['handlers']['noformat']['formatter'] = 'json'
+    if kwargs.setdefault("log_id", None):
+        logger_dict['formatters']['json']['log_id'] = kwargs["log_id"]
+    dedup = kwargs.setdefault("dedup", None)
+    if dedup is not None:
+        logger_dict['filters'] = {'dedup': dict(dedup, **{'()': 'engcommon.log.DuplicateFilter'})}
+        for handler in ['file', 'console', 'buffer', 'debug']:
+            logger_dict['handlers'][handler]['filters'] = ['dedup']
+    rotate = kwargs.setdefault("rotate", None)
+    if rotate is not None:
+        for handler in ['file', 'debug']:
+            logger_dict['handlers'][handler]['class'] = 'engcommon.log.RotatingCompressedFileHandler'
+            logger_dict['handlers'][handler].update(rotate)
+        # Shares the debug file, reopen it after the debug handler rotates
+        logger_dict['handlers']['noformat']['class'] = 'logging.handlers.WatchedFileHandler'
 
     logging.config.dictConfig(logger_dict)
     lgr = logging.getLogger()
@@ -206,10 +568,30 @@ def set_loglevels(loglevels):
     """
     for mod, lvl in loglevels.items():
         lgr = logging.getLogger(mod)
-        lgr.setLevel(eval(f"logging.{lvl}"))
+        lgr.setLevel(get_level(lvl))
     return None
 
 
+def get_level(lvl):
+    """Get numeric log level from level name.
+
+    Args:
+        lvl (str or int): Level name (e.g. "DEBUG") or number.
+
+    Returns:
+        level (int): Log level.
+
+    Raises:
+        ValueError: Unknown level name.
+    """
+    if isinstance(lvl, int):
+        return lvl
+    level = logging.getLevelName(str(lvl).strip().upper())
+    if not isinstance(level, int):
+        raise ValueError("Unknown log level: {0}".format(lvl))
+    return level
+
+
 def debug_enable(debug_api, loglevels):
     """Enable debug for listed API/modules.
 
@@ -226,3 +608,166 @@ def debug_enable(debug_api, loglevels):
         else:
             pass  # raise KeyError
     return loglevels
+
+
+class LogLevelController:
+    """A class for changing log levels of a running process.
+
+    Levels can be changed without restarting by:
+
+    - Signal (default SIGUSR1): toggle all handlers between DEBUG and their
+      original levels.
+    - Control file: polled for mtime changes, one "name: LEVEL" per line.
+      Names are handler names (e.g. "console", "file") or logger names.
+      "debug_api: mod1, mod2" enables DEBUG for modules via debug_enable().
+      Ex:
+          console: DEBUG
+          boto3: WARNING
+          debug_api: engcommon.hardware, engcommon.command
+
+    Attributes:
+        control_file (str): Polled control file.
+        debug (bool): Handlers toggled to DEBUG by signal.
+    """
+
+    def __init__(self, handlers, **kwargs):
+        """Init LogLevelController.
+
+        Args:
+            handlers (dict): keys are handler names, values are
+                logging.Handler.
+
+        **kwargs:
+            loglevels (dict): Module log levels for debug_enable().
+            control_file (str): Control file to poll, None disables.
+            signum (int): Toggle signal, None disables.
+            interval (float): Seconds between control file polls.
+        """
+        self._handlers = dict(handlers)
+        self._levels = {k: h.level for k, h in self._handlers.items()}
+        self._loglevels = dict(kwargs.setdefault("loglevels", {}))
+        self._control_file = kwargs.setdefault("control_file", None)
+        self._signum = kwargs.setdefault("signum", signal.SIGUSR1)
+        self._interval = float(kwargs.setdefault("interval", CONSTANTS().LOG_CONTROL_INTERVAL))
+        self._debug = False
+        self._mtime = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._prev_handler = None
+
+    @property
+    def control_file(self):
+        """Get control_file."""
+        return self._control_file
+
+    @property
+    def debug(self):
+        """Get debug."""
+        return self._debug
+
+    def toggle_debug(self, *args):
+        """Toggle handlers between DEBUG and their original levels.
+
+        Usable as a signal handler.
+
+        Returns:
+            None
+        """
+        self._debug = not self._debug
+        for name, handler in self._handlers.items():
+            handler.setLevel(logging.DEBUG if self._debug else self._levels[name])
+        return None
+
+    def apply(self, text):
+        """Apply control file text.
+
+        Args:
+            text (str): "name: LEVEL" lines.
+
+        Returns:
+            None
+        """
+        loglevels = {}
+        for line in text.splitlines():
+            line = line.split("#")[0].strip()
+            if not line:
+                continue
+            name, _, value = line.partition(":")
+            name = name.strip()
+            value = value.strip()
+            try:
+                if name == "debug_api":
+                    debug_api = [i.strip() for i in value.split(",") if i.strip()]
+                    for module in debug_api:
+                        self._loglevels.setdefault(module, "INFO")
+                    loglevels.update(debug_enable(debug_api, dict(self._loglevels)))
+                elif name in self._handlers:
+                    self._handlers[name].setLevel(get_level(value))
+                else:
+                    loglevels[name] = get_level(value)
+            except ValueError:
+                logger.error("Log Control Error")
+                logger.debug("line: {0}".format(line))
+        set_loglevels(loglevels)
+        return None
+
+    def check(self):
+        """Apply the control file if its mtime changed.
+
+        Returns:
+            changed (bool): Control file applied.
+        """
+        try:
+            mtime = os.stat(self._control_file).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        with open(self._control_file, "r") as f:
+            self.apply(f.read())
+        logger.info("Log levels updated: {0}".format(self._control_file))
+        return True
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval):
+            self.check()
+        return None
+
+    def start(self):
+        """Install the signal handler and start polling the control file.
+
+        The signal handler is only installed from the main thread.
+
+        Returns:
+            None
+        """
+        if self._signum is not None:
+            try:
+                self._prev_handler = signal.signal(self._signum, self.toggle_debug)
+            except ValueError:
+                logger.warning("Signal handler not installed, not main thread")
+        if self._control_file and self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target = self._run,
+                name = "LogLevelController",
+                daemon = True,
+            )
+            self._thread.start()
+        return None
+
+    def stop(self):
+        """Restore the signal handler and stop polling.
+
+        Returns:
+            None
+        """
+        if self._prev_handler is not None:
+            signal.signal(self._signum, self._prev_handler)
+            self._prev_handler = None
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        return None
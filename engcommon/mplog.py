@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+"""
+This module contains multi-process logging for launchers that fork worker
+processes or MPI ranks.
+
+Instead of every process opening its own set of log files with
+log.get_std_logger(), all processes send records over a bounded queue to a
+single writer process that owns the file and console handlers. The writer
+reorders records by timestamp within a short window, so the files hold one
+merged timeline.
+
+    Typical Usage:
+
+    aggregator = mplog.LogAggregator("runxhpl", debug=False, logdir=logdir)
+    aggregator.start()  # this process now logs through the writer
+    with multiprocessing.Pool(initializer=mplog.configure_worker,
+                              initargs=(aggregator.queue,)) as pool:
+        pool.map(run_rank, ranks)
+    aggregator.stop()
+"""
+
+import heapq
+import itertools
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+
+from . import log
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+_SENTINEL = None
+
+
+class BlockingQueueHandler(logging.handlers.QueueHandler):
+    """A class for a QueueHandler that blocks when the queue is full.
+
+    Blocking applies backpressure to producers instead of growing memory.
+    Records that still cannot be queued after timeout are dropped and
+    counted.
+
+    Attributes:
+        dropped (int): Records dropped on timeout.
+    """
+
+    def __init__(self, queue_, timeout=None):
+        super().__init__(queue_)
+        self._timeout = CONSTANTS().MPLOG_PUT_TIMEOUT if timeout is None else timeout
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put(record, timeout=self._timeout)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Report dropped records (to the writer if the queue has room,
+        else stderr) and close."""
+        if self.dropped:
+            record = logger.makeRecord(
+                logger.name, logging.WARNING, __file__, 0,
+                "Log Records Dropped: {0}".format(self.dropped), None, None,
+            )
+            self.dropped = 0
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except (queue.Full, ValueError, OSError):  # full or closed
+                logging.lastResort.handle(record)
+        super().close()
+
+
+def configure_worker(queue_, level=logging.DEBUG):
+    """Send this process's log records to the writer process.
+
+    Replaces the handlers of the root and "noformat" loggers with a
+    BlockingQueueHandler. Forked children inherit this configuration from
+    the parent after LogAggregator.start(); spawned processes (or pool
+    initializers) should call it explicitly.
+
+    Args:
+        queue_ (multiprocessing.Queue): LogAggregator.queue.
+        level (int): Root logger level.
+
+    Returns:
+        None
+    """
+    handler = BlockingQueueHandler(queue_)
+    for name in ["", "noformat"]:
+        lgr = logging.getLogger(name)
+        for h in list(lgr.handlers):
+            lgr.removeHandler(h)
+        lgr.addHandler(handler)
+        lgr.setLevel(level)
+    logging.getLogger("noformat").propagate = False
+    return None
+
+
+def _write_records(queue_, module_name, debug, window, kwargs):
+    """Writer process: own the handlers and emit records in time order.
+
+    Records are held in a heap for "window" seconds so records arriving
+    slightly out of order from different processes are merged by
+    LogRecord.created. Returns after the sentinel is received and all held
+    records are emitted.
+    """
+    log.get_std_logger(module_name, debug, **kwargs)
+    heap = []
+    seq = itertools.count()
+    latest = 0.0
+    running = True
+    while running or heap:
+        try:
+            record = queue_.get(timeout=window) if running else _SENTINEL
+        except queue.Empty:
+            cutoff = float("inf")  # idle, emit everything held
+        else:
+            if record is _SENTINEL:
+                running = False
+                cutoff = float("inf")
+            else:
+                heapq.heappush(heap, (record.created, next(seq), record))
+                latest = max(latest, record.created)
+                cutoff = latest - window
+        while heap and heap[0][0] <= cutoff:
+            record = heapq.heappop(heap)[2]
+            logging.getLogger(record.name).handle(record)
+    logging.shutdown()
+    return None
+
+
+class LogAggregator:
+    """A class for a writer process that owns the log handlers.
+
+    Attributes:
+        queue (multiprocessing.Queue): Bounded record queue for workers.
+        window (float): Seconds records are held for timestamp ordering.
+    """
+
+    def __init__(self, module_name, debug, **kwargs):
+        """Init LogAggregator.
+
+        Args:
+            module_name (str): Module name for log files.
+            debug (bool): Debug mode.
+
+        **kwargs:
+            maxsize (int): Queue size before producers block.
+            window (float): Seconds records are held for ordering.
+            Other kwargs are passed to log.get_std_logger() (logdir,
+            formats, log_id, rotate).
+        """
+        maxsize = int(kwargs.pop("maxsize", CONSTANTS().MPLOG_QUEUE_SIZE))
+        self._window = float(kwargs.pop("window", CONSTANTS().MPLOG_WINDOW))
+        kwargs.setdefault("logdir", log.get_logdir(module_name))
+        self._ctx = multiprocessing.get_context()
+        self._queue = self._ctx.Queue(maxsize)
+        self._process = self._ctx.Process(
+            target = _write_records,
+            args = (self._queue, module_name, debug, self._window, kwargs),
+            name = "LogAggregator",
+            daemon = True,
+        )
+
+    @property
+    def queue(self):
+        """Get queue."""
+        return self._queue
+
+    @property
+    def window(self):
+        """Get window."""
+        return self._window
+
+    def start(self, configure=True):
+        """Start the writer process.
+
+        Args:
+            configure (bool): Also send this process's records to the writer.
+
+        Returns:
+            None
+        """
+        self._process.start()
+        if configure:
+            configure_worker(self._queue)
+        return None
+
+    def stop(self, timeout=None):
+        """Flush queued records and stop the writer process.
+
+        This process stops sending records to the writer first, so
+        warnings here (writer timeout, records this process dropped) go
+        to its remaining handlers, or stderr.
+
+        Args:
+            timeout (float): Seconds to wait for the writer.
+
+        Returns:
+            None
+        """
+        if timeout is None:
+            timeout = CONSTANTS().MPLOG_PUT_TIMEOUT
+        handlers = []
+        for name in ["", "noformat"]:
+            lgr = logging.getLogger(name)
+            for h in list(lgr.handlers):
+                if isinstance(h, BlockingQueueHandler) and h.queue is self._queue:
+                    lgr.removeHandler(h)
+                    if h not in handlers:
+                        handlers.append(h)
+        try:
+            self._queue.put(_SENTINEL, timeout=timeout)
+        except queue.Full:
+            logger.warning("Log Writer Queue Full, terminating")
+            self._process.terminate()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            logger.warning("Log Writer Timeout, terminating")
+            self._process.terminate()
+            self._process.join()
+        for h in handlers:
+            if h.dropped:
+                logger.warning("Log Records Dropped: {0}".format(h.dropped))
+                h.dropped = 0
+            h.close()
+        if self._process.exitcode != 0:
+            self._queue.cancel_join_thread()  # no reader to flush to
+        self._queue.close()
+        self._queue.join_thread()
+        return None
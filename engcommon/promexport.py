@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+"""
+This module writes probe metrics and hardware facts as a Prometheus
+textfile for the node exporter textfile collector.
+
+Command metrics come from trace spans: invocation counts and latency
+buckets per command prefix (executable name), and non-zero return codes,
+including those ignored by IGNORE_RETURNCODE. Files are replaced
+atomically, so the collector never reads a partial file.
+
+    Typical Usage:
+
+    exporter = promexport.PromExporter("/var/lib/node_exporter/xhpl.prom")
+    exporter.start()  # periodic, or exporter.write() once at the end
+    ...
+    exporter.stop()
+"""
+
+import logging
+import os
+import threading
+
+from . import fileio
+from . import hardware
+from . import trace
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "engcommon"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        '{0}="{1}"'.format(k, _escape(v)) for k, v in sorted(labels.items())
+    ) + "}"
+
+
+def _get_prefix(cmd):
+    """Get command prefix (executable name) of a command string."""
+    words = cmd.split()
+    return os.path.basename(words[0]) if words else ""
+
+
+class CommandStats:
+    """A class for per-command-prefix statistics collected from trace spans.
+
+    Attributes:
+        histograms (dict): keys are prefixes, values are LatencyHistogram.
+        returncodes (dict): keys are (prefix, ret_code, ignored), values
+            are counts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._returncodes = {}
+
+    @property
+    def histograms(self):
+        """Get histograms."""
+        with self._lock:
+            return dict(self._histograms)
+
+    @property
+    def returncodes(self):
+        """Get returncodes."""
+        with self._lock:
+            return dict(self._returncodes)
+
+    def __call__(self, span):
+        """Record a finished trace span."""
+        if not span["name"].startswith("command.") or "cmd" not in span:
+            return None
+        prefix = _get_prefix(span["cmd"])
+        with self._lock:
+            hist = self._histograms.get(prefix)
+            if hist is None:
+                hist = self._histograms[prefix] = trace.LatencyHistogram()
+            hist.observe(span["duration"])
+            ret_code = span.get("ret_code")
+            if ret_code:
+                ignored = "error" not in span
+                key = (prefix, ret_code, ignored)
+                self._returncodes[key] = self._returncodes.get(key, 0) + 1
+        return None
+
+
+def get_hardware_facts():
+    """Get hardware facts for export.
+
+    Facts that cannot be read (e.g. no lscpu) are left out.
+
+    Returns:
+        facts (dict): cpu_cores, cpu_vendor, cpu_model, mem_total_bytes.
+    """
+    facts = {}
+    probes = [
+        ("cpu_cores", hardware.get_cpu_core_count),
+        ("cpu_vendor", hardware.get_cpu_vendor),
+        ("cpu_model", lambda: hardware.get_lscpu()["Model name"]),
+        ("mem_total_bytes", lambda: hardware.get_meminfo()["MemTotal"] * 1024),
+    ]
+    for name, probe in probes:
+        try:
+            facts[name] = probe()
+        except Exception:
+            logger.warning("Hardware Fact Unavailable: {0}".format(name))
+    return facts
+
+
+def render(stats, facts):
+    """Get Prometheus text exposition of stats and facts.
+
+    Args:
+        stats (CommandStats): Command statistics.
+        facts (dict): Hardware facts (see get_hardware_facts()).
+
+    Returns:
+        text (str): Prometheus text format.
+    """
+    lines = []
+    name = "{0}_command_duration_seconds".format(PREFIX)
+    lines.append("# HELP {0} Shell command latency by command prefix.".format(name))
+    lines.append("# TYPE {0} histogram".format(name))
+    for prefix, hist in sorted(stats.histograms.items()):
+        cumulative = 0
+        for bound, count in zip(list(hist.bounds) + ["+Inf"], hist.counts):
+            cumulative += count
+            lines.append("{0}_bucket{1} {2}".format(
+                name, _labels(cmd=prefix, le=bound), cumulative,
+            ))
+        lines.append("{0}_sum{1} {2}".format(name, _labels(cmd=prefix), hist.sum))
+        lines.append("{0}_count{1} {2}".format(name, _labels(cmd=prefix), hist.count))
+
+    name = "{0}_command_invocations_total".format(PREFIX)
+    lines.append("# HELP {0} Shell command invocations by command prefix.".format(name))
+    lines.append("# TYPE {0} counter".format(name))
+    for prefix, hist in sorted(stats.histograms.items()):
+        lines.append("{0}{1} {2}".format(name, _labels(cmd=prefix), hist.count))
+
+    name = "{0}_command_nonzero_returncode_total".format(PREFIX)
+    lines.append("# HELP {0} Non-zero return codes, ignored=true if in IGNORE_RETURNCODE.".format(name))
+    lines.append("# TYPE {0} counter".format(name))
+    for (prefix, ret_code, ignored), count in sorted(stats.returncodes.items()):
+        lines.append("{0}{1} {2}".format(name, _labels(
+            cmd=prefix, ret_code=ret_code, ignored=str(ignored).lower(),
+        ), count))
+
+    if "cpu_cores" in facts:
+        name = "{0}_hardware_cpu_cores".format(PREFIX)
+        lines.append("# TYPE {0} gauge".format(name))
+        lines.append("{0} {1}".format(name, facts["cpu_cores"]))
+    if "mem_total_bytes" in facts:
+        name = "{0}_hardware_mem_total_bytes".format(PREFIX)
+        lines.append("# TYPE {0} gauge".format(name))
+        lines.append("{0} {1}".format(name, facts["mem_total_bytes"]))
+    if "cpu_vendor" in facts or "cpu_model" in facts:
+        name = "{0}_hardware_cpu_info".format(PREFIX)
+        lines.append("# TYPE {0} gauge".format(name))
+        lines.append("{0}{1} 1".format(name, _labels(
+            vendor=facts.get("cpu_vendor", ""), model=facts.get("cpu_model", ""),
+        )))
+    text = "\n".join(lines) + "\n"
+    return text
+
+
+def write_textfile(path, text):
+    """Write text to path by atomic replace.
+
+    Args:
+        path (str): Destination file (e.g. ".../xhpl.prom").
+        text (str): File content.
+
+    Returns:
+        None
+
+    Raises:
+        OSError: Error writing file.
+    """
+    fileio.write_file_atomic(path, text)
+    return None
+
+
+class PromExporter:
+    """A class for exporting command metrics and hardware facts to a
+    Prometheus textfile.
+
+    Creating an exporter enables tracing (if not already enabled) and
+    starts collecting command statistics. stop() disables tracing again if
+    the exporter enabled it.
+
+    Attributes:
+        path (str): Textfile path.
+        interval (float): Seconds between periodic writes.
+        stats (CommandStats): Collected command statistics.
+    """
+
+    def __init__(self, path, **kwargs):
+        """Init PromExporter.
+
+        Args:
+            path (str): Textfile path.
+
+        **kwargs:
+            interval (float): Seconds between periodic writes.
+            hardware_facts (bool): Export hardware facts.
+        """
+        self._path = path
+        self._interval = float(kwargs.setdefault("interval", CONSTANTS().PROM_INTERVAL))
+        self._hardware_facts = kwargs.setdefault("hardware_facts", True)
+        self._facts = None
+        self._stats = CommandStats()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._owns_trace = not trace.is_enabled()
+        if self._owns_trace:
+            trace.enable()
+        trace.add_listener(self._stats)
+
+    @property
+    def path(self):
+        """Get path."""
+        return self._path
+
+    @property
+    def interval(self):
+        """Get interval."""
+        return self._interval
+
+    @property
+    def stats(self):
+        """Get stats."""
+        return self._stats
+
+    def _get_facts(self):
+        if self._facts is None:  # static, read once
+            self._facts = get_hardware_facts() if self._hardware_facts else {}
+        return self._facts
+
+    def write(self):
+        """Write the textfile once.
+
+        Returns:
+            None
+        """
+        write_textfile(self._path, render(self._stats, self._get_facts()))
+        return None
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval):
+            try:
+                self.write()
+            except OSError:
+                logger.warning("Textfile Write Error, retrying: {0}".format(self._path))
+            except Exception:
+                logger.exception("Textfile Write Error, retrying: {0}".format(self._path))
+        return None
+
+    def start(self):
+        """Write periodically on a background thread."""
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target = self._run,
+                name = "PromExporter",
+                daemon = True,
+            )
+            self._thread.start()
+        return None
+
+    def stop(self):
+        """Stop periodic writes, write a final textfile and stop collecting."""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+        self.write()
+        trace.remove_listener(self._stats)
+        if self._owns_trace:
+            trace.disable()
+            self._owns_trace = False
+        return None
@@ -5,6 +5,7 @@ This module contains functions for generating random words. This is useful for
 creating easily readable unique strings.
 """
 
+import functools
 import json
 import logging
 import numpy
@@ -13,6 +14,23 @@ import urllib.request
 
 logger = logging.getLogger(__name__)
 
+WORDS_URL = "https://raw.githubusercontent.com/palmdalian/json_wordlist/master/wordlist_nocaps_byPOS.json"
+
+
+@functools.lru_cache(maxsize=None)
+def get_words(words_url=WORDS_URL):
+    """Get word lists by part-of-speech, fetched once per process.
+
+    Args:
+        words_url (str): URL of JSON word lists.
+
+    Returns:
+        words (dict): keys are part-of-speech (POS), values are word lists.
+    """
+    f = urllib.request.urlopen(words_url)
+    words = json.loads(f.read())  # dict keys are part-of-speech (POS)
+    return words
+
 
 def get_random_phrase(**kwargs):
     """Get a random dash-separated n-words-length phrase.
@@ -27,19 +45,18 @@ def get_random_phrase(**kwargs):
         min_length (int): Minimum character length per word.
         max_length (int): Maximum character length per word.
         POS_order (list): Part-of-speech order.
+        words (dict): Word lists by POS. Default: get_words().
 
     Returns:
         phrase (str): Random phrase.
     """
     min_length = int(kwargs.setdefault('min_length', 2))
     max_length = int(kwargs.setdefault('max_length', 8))
-    POS_order = kwargs.setdefault(
+    POS_order = list(kwargs.setdefault(
         'POS_order',
         ['adverb', 'adjective', 'noun'],
-    )
-    words_url = "https://raw.githubusercontent.com/palmdalian/json_wordlist/master/wordlist_nocaps_byPOS.json"
-    f = urllib.request.urlopen(words_url)
-    words = json.loads(f.read())  # dict keys are part-of-speech (POS)
+    ))
+    words = kwargs.get("words") or get_words()
     good_word_list = []
     while len(POS_order) > 0:
         word = random.choice(words[POS_order[0]])
@@ -68,6 +85,7 @@ def get_random_phrase_probability(**kwargs):
         min_length (int): Minimum character length per word.
         max_length (int): Maximum character length per word.
         POS_order (list): Part-of-speech order.
+        words (dict): Word lists by POS. Default: get_words().
 
     Returns:
         prob (float) = Probability of phrase being selected.
@@ -78,9 +96,7 @@ def get_random_phrase_probability(**kwargs):
         'POS_order',
         ['adverb', 'adjective', 'noun'],
     )
-    words_url = "https://raw.githubusercontent.com/palmdalian/json_wordlist/master/wordlist_nocaps_byPOS.json"
-    f = urllib.request.urlopen(words_url)
-    words = json.loads(f.read())  # dict keys are part-of-speech (POS)
+    words = kwargs.get("words") or get_words()
     prob = 1.00
     # For each POS, divide prob by frequency of n-char-length word.
     for POS in POS_order:
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+
+"""
+This module contains record/replay execution backends for the command layer.
+
+Recorder runs commands and appends each invocation (argv, cwd, relevant
+env, stdin digest, return code, stdout, stderr and duration) to a JSON
+lines store, gzip compressed if the path ends in ".gz". Replayer serves
+invocations from an in-memory index of a store, so hardware functions and
+downstream tools can be tested and benchmarked offline against output
+captured on real machines, without sudo or the hardware.
+
+Repeated invocations of the same command are replayed in recorded order;
+the last one repeats once exhausted. A command with no recording raises
+FileNotFoundError, as a missing executable would.
+
+    Typical Usage:
+
+    with replay.Recorder("/tmp/node042.jsonl.gz"):  # on the real machine
+        hardware.get_dmidecode()
+
+    with replay.Replayer("/tmp/node042.jsonl.gz"):  # anywhere
+        hardware.get_dmidecode()
+"""
+
+import errno
+import gzip
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+
+from . import command
+from . import testvar
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+
+def _get_env(env):
+    """Get the env vars that are part of the index key."""
+    env = os.environ if env is None else env
+    return {k: env[k] for k in CONSTANTS().REPLAY_ENV if k in env}
+
+
+def _get_digest(stdin):
+    if not stdin:
+        return None
+    if isinstance(stdin, str):
+        stdin = stdin.encode()
+    return hashlib.sha1(stdin).hexdigest()
+
+
+def _get_key(argv, cwd, env, stdin, shell, merge_stderr):
+    """Get the index key of an invocation."""
+    if not isinstance(argv, str):
+        argv = tuple(argv)
+    return (argv, cwd, tuple(sorted(env.items())), stdin, shell, merge_stderr)
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class _Backend:
+
+    def __enter__(self):
+        self._previous = command.get_backend()
+        command.set_backend(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        command.set_backend(self._previous)
+        self.close()
+
+    def close(self):
+        return None
+
+
+class Recorder(_Backend):
+    """A class for a backend that runs commands and records them.
+
+    Attributes:
+        path (str): Store path, appended to.
+        live (bool): Commands run (True).
+    """
+
+    live = True
+
+    def __init__(self, path):
+        self._path = path
+        dir_ = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dir_, exist_ok=True)
+        self._f = _open(path, "a")
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        """Get path."""
+        return self._path
+
+    def run(self, argv, **kwargs):
+        """Run a command and record the invocation.
+
+        Args:
+            argv (list|str): Command (str if shell).
+
+        **kwargs:
+            cwd (str): Current working dir.
+            env (mapping): Environment, os.environ if None.
+            stdin (str): Input.
+            shell (bool): Run in shell mode.
+            merge_stderr (bool): Send STDERR to STDOUT.
+            encoding (str): Text encoding, undecodable bytes are kept as
+                surrogate escapes so they record and replay unchanged.
+            stdout_to (file|int): Also write STDOUT here line by line
+                while the command runs.
+            stderr_to (file|int): Also write STDERR here line by line
+                while the command runs.
+
+        Returns:
+            dict(
+                ret_code (int): Return code.
+                stdout (str): STDOUT.
+                stderr (str): STDERR.
+            )
+
+        Raises:
+            OSError: Error starting command.
+            KeyboardInterrupt: CTRL-C caught while running command.
+        """
+        my_cwd = kwargs.setdefault("cwd", None)
+        my_env = kwargs.setdefault("env", None)
+        my_stdin = kwargs.setdefault("stdin", None)
+        my_shell = kwargs.setdefault("shell", False)
+        my_merge = kwargs.setdefault("merge_stderr", False)
+        my_encoding = kwargs.setdefault("encoding", "utf-8")
+        my_stdout_to = kwargs.setdefault("stdout_to", None)
+        my_stderr_to = kwargs.setdefault("stderr_to", None)
+        start = time.perf_counter()
+        try:
+            p = subprocess.Popen(
+                argv,
+                shell = my_shell,
+                stdin = subprocess.PIPE,
+                stdout = subprocess.PIPE,
+                stderr = subprocess.STDOUT if my_merge else subprocess.PIPE,
+                cwd = my_cwd,
+                env = my_env,
+                encoding = my_encoding,
+                errors = "surrogateescape",
+            )
+        except OSError:
+            logger.error("Shell Command Start Error")
+            logger.debug(testvar.get_debug((argv, my_cwd)))
+            raise
+        try:
+            if my_stdout_to is None and my_stderr_to is None:
+                stdout, stderr = p.communicate(my_stdin)
+            else:
+                stdout, stderr = self._tee(p, my_stdin, my_stdout_to, my_stderr_to)
+        except KeyboardInterrupt:
+            logger.error("Keyboard Interrupt, sending SIGTERM")
+            logger.debug(testvar.get_debug(argv))
+            p.terminate()
+            raise
+        entry = {
+            "argv": argv if isinstance(argv, str) else list(argv),
+            "cwd": my_cwd,
+            "env": _get_env(my_env),
+            "stdin": _get_digest(my_stdin),
+            "shell": my_shell,
+            "merge_stderr": my_merge,
+            "ret_code": p.returncode,
+            "stdout": stdout or "",
+            "stderr": stderr or "",
+            "duration": time.perf_counter() - start,
+        }
+        with self._lock:
+            self._f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._f.flush()
+        return {
+            "ret_code": p.returncode,
+            "stdout": stdout,
+            "stderr": stderr,
+        }
+
+    @staticmethod
+    def _tee(p, stdin, stdout_to, stderr_to):
+        """Like p.communicate(stdin), also writing output lines to
+        stdout_to and stderr_to as they arrive."""
+        def pump(pipe, f, lines):
+            for line in iter(pipe.readline, ""):
+                lines.append(line)
+                command._write_output(f, line)
+            pipe.close()
+
+        out = []
+        err = []
+        threads = []
+        for pipe, f, lines in ((p.stdout, stdout_to, out), (p.stderr, stderr_to, err)):
+            if pipe is not None:
+                thread = threading.Thread(target=pump, args=(pipe, f, lines), daemon=True)
+                thread.start()
+                threads.append(thread)
+        try:
+            if stdin:
+                p.stdin.write(stdin)
+            p.stdin.close()
+        except BrokenPipeError:
+            pass  # command exited without reading all input
+        for thread in threads:
+            thread.join()
+        p.wait()
+        return "".join(out), None if p.stderr is None else "".join(err)
+
+    def close(self):
+        """Close the store."""
+        with self._lock:
+            self._f.close()
+        return None
+
+
+class Replayer(_Backend):
+    """A class for a backend that serves recorded invocations.
+
+    Attributes:
+        live (bool): Commands run (False).
+        latency (float): Recorded durations are slept times this factor,
+            0 replays instantly.
+    """
+
+    live = False
+
+    def __init__(self, *paths, **kwargs):
+        """Init Replayer.
+
+        Args:
+            paths (str): Stores to index, later recordings of the same
+                invocation are appended to earlier ones.
+
+        **kwargs:
+            latency (float): Replay recorded durations times this factor.
+        """
+        self.latency = float(kwargs.setdefault("latency", 0))
+        self._index = {}  # key: list of entries
+        self._cursors = {}  # key: next entry
+        self._lock = threading.Lock()
+        for path in paths:
+            with _open(path, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    key = _get_key(
+                        entry["argv"], entry["cwd"], entry["env"], entry["stdin"],
+                        entry["shell"], entry["merge_stderr"],
+                    )
+                    self._index.setdefault(key, []).append((
+                        entry["ret_code"], entry["stdout"], entry["stderr"],
+                        entry["duration"],
+                    ))
+
+    def __len__(self):
+        return sum(len(v) for v in self._index.values())
+
+    def run(self, argv, **kwargs):
+        """Get a recorded invocation.
+
+        Args:
+            argv (list|str): Command (str if shell).
+
+        **kwargs:
+            See Recorder.run().
+
+        Returns:
+            See Recorder.run().
+
+        Raises:
+            FileNotFoundError: No recording of the invocation.
+        """
+        key = _get_key(
+            argv,
+            kwargs.get("cwd"),
+            _get_env(kwargs.get("env")),
+            _get_digest(kwargs.get("stdin")),
+            kwargs.get("shell", False),
+            kwargs.get("merge_stderr", False),
+        )
+        entries = self._index.get(key)
+        if entries is None:
+            logger.error("Shell Command Start Error")
+            logger.debug("Replay Miss: {0}".format(key))
+            cmd = argv if isinstance(argv, str) else " ".join(argv)
+            raise FileNotFoundError(errno.ENOENT, "No recording of command", cmd)
+        with self._lock:
+            i = self._cursors.get(key, 0)
+            self._cursors[key] = min(i + 1, len(entries) - 1)
+        ret_code, stdout, stderr, duration = entries[i]
+        if self.latency:
+            time.sleep(duration * self.latency)
+        command._write_output(kwargs.get("stdout_to"), stdout)
+        command._write_output(kwargs.get("stderr_to"), stderr)
+        return {
+            "ret_code": ret_code,
+            "stdout": stdout,
+            "stderr": stderr,
+        }
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+"""
+This module contains unique run IDs (e.g. log_id) on top of randomword.
+
+Random phrases are only probably unique (see
+randomword.get_random_phrase_probability()). IDRegistry records every
+issued ID in a memory-mapped Bloom filter file, so checking a new phrase
+is O(1) and a phrase seen before is regenerated. A Bloom filter never
+misses an issued ID; a false positive only costs a regeneration. Each
+check-and-add holds a thread lock and the file lock (flock), so
+concurrent threads and processes on the same host never issue the same
+ID.
+
+For uniqueness without any registry, get_unique_phrase(suffix=True)
+appends a monotonic time, pid and host suffix.
+
+    Typical Usage:
+
+    log_id = runid.get_unique_phrase()  # "quietly-brave-otter"
+    log_id = runid.get_unique_phrase(suffix=True)  # "quietly-brave-otter-0l2x..."
+"""
+
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+
+from . import randomword
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"ECBLOOM1"
+_HEADER = struct.Struct("<8sQQQ")  # magic, bits, hashes, count
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+_suffix_lock = threading.Lock()
+_last_us = 0
+
+
+def _base36(number, width):
+    chars = []
+    for _ in range(width):
+        number, r = divmod(number, 36)
+        chars.append(_DIGITS[r])
+    return "".join(reversed(chars))
+
+
+def get_id_suffix():
+    """Get a suffix unique without coordination.
+
+    The suffix is microseconds since the epoch (strictly increasing within
+    a process), pid and a hash of the host name, in fixed-width base 36.
+
+    Returns:
+        suffix (str): 19 characters, sorts by time.
+    """
+    global _last_us
+    with _suffix_lock:
+        now = max(time.time_ns() // 1000, _last_us + 1)
+        _last_us = now
+    host = zlib.crc32(socket.gethostname().encode()) % 36 ** 4
+    return _base36(now, 10) + _base36(os.getpid(), 5) + _base36(host, 4)
+
+
+class IDRegistry:
+    """A class for a persistent, process-safe registry of issued IDs.
+
+    Backed by a memory-mapped Bloom filter sized for capacity IDs at
+    error_rate false positives. The size is fixed when the file is created.
+
+    Attributes:
+        path (str): Registry file.
+        bits (int): Filter size in bits.
+        hashes (int): Hashes per ID.
+        count (int): IDs added.
+    """
+
+    def __init__(self, path=None, **kwargs):
+        """Init IDRegistry, creating the file if needed.
+
+        Args:
+            path (str): Registry file.
+
+        **kwargs:
+            capacity (int): Expected number of IDs.
+            error_rate (float): False positive rate at capacity.
+
+        Raises:
+            OSError: Error opening file.
+            ValueError: File is not an ID registry.
+        """
+        capacity = int(kwargs.setdefault("capacity", CONSTANTS().RUNID_CAPACITY))
+        error_rate = float(kwargs.setdefault("error_rate", CONSTANTS().RUNID_ERROR_RATE))
+        self._path = os.path.expanduser(path or CONSTANTS().RUNID_REGISTRY_FILE)
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        self._capacity = capacity
+        self._lock = threading.Lock()  # flock is per open file, not per thread
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size == 0:
+                    bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+                    bits = (bits + 7) // 8 * 8
+                    hashes = max(1, int(round(bits / capacity * math.log(2))))
+                    os.ftruncate(self._fd, _HEADER.size + bits // 8)
+                    os.pwrite(self._fd, _HEADER.pack(_MAGIC, bits, hashes, 0), 0)
+                self._mm = mmap.mmap(self._fd, 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            magic, self._bits, self._hashes, _ = _HEADER.unpack_from(self._mm, 0)
+            if magic != _MAGIC or len(self._mm) != _HEADER.size + self._bits // 8:
+                raise ValueError("Not an ID registry: {0}".format(self._path))
+        except (OSError, ValueError):
+            logger.error("ID Registry Open Error")
+            logger.debug("path: {0}".format(self._path))
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def path(self):
+        """Get path."""
+        return self._path
+
+    @property
+    def bits(self):
+        """Get bits."""
+        return self._bits
+
+    @property
+    def hashes(self):
+        """Get hashes."""
+        return self._hashes
+
+    @property
+    def count(self):
+        """Get count."""
+        return _HEADER.unpack_from(self._mm, 0)[3]
+
+    def _get_positions(self, id_):
+        digest = hashlib.blake2b(id_.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self._bits for i in range(self._hashes)]
+
+    def _contains(self, positions):
+        mm = self._mm
+        offset = _HEADER.size
+        for bit in positions:
+            if not mm[offset + (bit >> 3)] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def __contains__(self, id_):
+        positions = self._get_positions(id_)
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_SH)
+            try:
+                return self._contains(positions)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def add(self, id_):
+        """Add an ID unless (probably) issued before.
+
+        Args:
+            id_ (str): ID.
+
+        Returns:
+            added (bool): False if the ID may have been issued before.
+        """
+        positions = self._get_positions(id_)
+        mm = self._mm
+        offset = _HEADER.size
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                if self._contains(positions):
+                    return False
+                for bit in positions:
+                    mm[offset + (bit >> 3)] |= 1 << (bit & 7)
+                count = _HEADER.unpack_from(mm, 0)[3] + 1
+                struct.pack_into("<Q", mm, _HEADER.size - 8, count)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        if count == self._capacity:
+            logger.warning("ID Registry Capacity Reached: {0}".format(self._path))
+        return True
+
+    def close(self):
+        """Close the registry."""
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        return None
+
+
+def get_unique_phrase(registry=None, **kwargs):
+    """Get a random phrase not issued before on this host.
+
+    Args:
+        registry (IDRegistry): Registry, IDRegistry() if None.
+
+    **kwargs:
+        suffix (bool): Append get_id_suffix(), unique without the registry.
+        attempts (int): Phrases tried before giving up.
+        Other kwargs are passed to randomword.get_random_phrase().
+
+    Returns:
+        phrase (str): Unique phrase.
+
+    Raises:
+        RuntimeError: No unused phrase in attempts.
+    """
+    suffix = kwargs.pop("suffix", False)
+    attempts = int(kwargs.pop("attempts", CONSTANTS().RUNID_ATTEMPTS))
+    if suffix:
+        return "{0}-{1}".format(randomword.get_random_phrase(**kwargs), get_id_suffix())
+    own = registry is None
+    if own:
+        registry = IDRegistry()
+    try:
+        for _ in range(attempts):
+            phrase = randomword.get_random_phrase(**kwargs)
+            if registry.add(phrase):
+                return phrase
+            logger.debug("Run ID collision: {0}".format(phrase))
+    finally:
+        if own:
+            registry.close()
+    raise RuntimeError("No unique phrase in {0} attempts".format(attempts))
@@ -4,7 +4,6 @@
 This module contains functions for testing variables at run-time.
 """
 
-import collections
 import logging
 import pprint
 
@@ -27,7 +26,7 @@ def get_debug(var, **kwargs):
         var_pprint (PrettyPrinter): pprint of var.
     """
     # my_sort_dicts = kwargs.setdefault("sort_dicts", True)  # Needs >= python-3.8
-    if isinstance(var, collections.Callable):
+    if callable(var):
         attrs = var.__module__ + "." + var.__name__
     else:
         try:
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+
+"""
+This module contains opt-in tracing of shell commands and hardware probes.
+
+enable() wraps command.get_shell_cmd/call_shell_cmd and the public
+hardware.get_* functions in timing spans. Each span records the command,
+duration, return code and bytes of output, is aggregated into in-process
+latency histograms and optionally written to a JSONL or Chrome trace-event
+file. disable() restores the original functions, so tracing costs nothing
+when it is off.
+
+    Typical Usage:
+
+    trace.enable(path="/tmp/logs/run.trace.json", trace_format="chrome")
+    hardware.get_cpu_vendor()
+    trace.disable()
+    hist = trace.get_histograms()["command.get_shell_cmd"]
+"""
+
+import bisect
+import contextlib
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+from . import command
+from . import error
+from . import hardware
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_local = threading.local()
+_span_ids = itertools.count(1)
+_originals = {}  # (module, name): function
+_histograms = {}  # span name: LatencyHistogram
+_writer = None
+_listeners = []
+
+
+class LatencyHistogram:
+    """A class for a cumulative-bucket latency histogram.
+
+    Attributes:
+        bounds (tuple): Bucket upper bounds in seconds (+Inf implied).
+        counts (list): Observations per bucket, last is +Inf.
+        count (int): Total observations.
+        sum (float): Total seconds.
+        max (float): Largest observation.
+    """
+
+    def __init__(self, bounds=None):
+        self._bounds = tuple(bounds or CONSTANTS().TRACE_BUCKETS)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    @property
+    def bounds(self):
+        """Get bounds."""
+        return self._bounds
+
+    @property
+    def counts(self):
+        """Get counts."""
+        return list(self._counts)
+
+    @property
+    def count(self):
+        """Get count."""
+        return self._count
+
+    @property
+    def sum(self):
+        """Get sum."""
+        return self._sum
+
+    @property
+    def max(self):
+        """Get max."""
+        return self._max
+
+    def observe(self, seconds):
+        """Add an observation.
+
+        Args:
+            seconds (float): Duration.
+
+        Returns:
+            None
+        """
+        self._counts[bisect.bisect_left(self._bounds, seconds)] += 1
+        self._count += 1
+        self._sum += seconds
+        self._max = max(self._max, seconds)
+        return None
+
+    def get_percentile(self, q):
+        """Get an upper-bound estimate of a percentile.
+
+        Args:
+            q (float): Percentile (0-100).
+
+        Returns:
+            seconds (float): Upper bound of the bucket holding q.
+        """
+        if self._count == 0:
+            return 0.0
+        target = self._count * q / 100.0
+        cumulative = 0
+        for bound, count in zip(self._bounds, self._counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self._max)
+        return self._max
+
+
+class _JSONLWriter:
+
+    def __init__(self, path):
+        self._f = open(path, "a")
+
+    def write(self, span):
+        self._f.write(json.dumps(span) + "\n")
+
+    def close(self):
+        self._f.close()
+
+
+class _ChromeWriter:
+    """Chrome trace-event JSON array of complete ("X") events."""
+
+    def __init__(self, path):
+        self._f = open(path, "w")
+        self._f.write("[\n")
+        self._first = True
+
+    def write(self, span):
+        event = {
+            "name": span["name"],
+            "cat": span["name"].split(".")[0],
+            "ph": "X",
+            "ts": span["start"] * 1e6,
+            "dur": span["duration"] * 1e6,
+            "pid": span["pid"],
+            "tid": span["tid"],
+            "args": {
+                k: span[k] for k in ("cmd", "ret_code", "bytes", "error") if k in span
+            },
+        }
+        self._f.write(("" if self._first else ",\n") + json.dumps(event))
+        self._first = False
+
+    def close(self):
+        self._f.write("\n]\n")
+        self._f.close()
+
+
+def _record(span):
+    with _lock:
+        hist = _histograms.get(span["name"])
+        if hist is None:
+            hist = _histograms[span["name"]] = LatencyHistogram()
+        hist.observe(span["duration"])
+        if _writer is not None:
+            _writer.write(span)
+    for listener in _listeners:
+        listener(span)
+    return None
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Time a block as a span.
+
+    Spans nest per thread; "parent" holds the enclosing span id.
+
+    Args:
+        name (str): Span name.
+
+    **kwargs:
+        Extra attributes recorded with the span (e.g. cmd).
+
+    Yields:
+        span (dict): Span record; ret_code/bytes may be set by the caller.
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    record = {
+        "name": name,
+        "id": next(_span_ids),
+        "parent": stack[-1] if stack else None,
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+    }
+    record.update(attrs)
+    stack.append(record["id"])
+    record["start"] = time.time()
+    start = time.perf_counter()
+    try:
+        yield record
+    except error.ShellCommandExecutionError as e:
+        record["ret_code"] = dict(e.args).get("ret_code")
+        record["error"] = type(e).__name__
+        raise
+    except Exception as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration"] = time.perf_counter() - start
+        stack.pop()
+        _record(record)
+
+
+def _get_cmd_str(cmd):
+    if isinstance(cmd, list):
+        cmd = " ".join(cmd)
+    return str(cmd)
+
+
+def _wrap(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attrs = {}
+        if name.startswith("command.") and args:
+            attrs["cmd"] = _get_cmd_str(args[0])
+        with span(name, **attrs) as record:
+            result = func(*args, **kwargs)
+            if isinstance(result, dict) and "ret_code" in result:
+                record["ret_code"] = result["ret_code"]
+                record["bytes"] = len(result["stdout"] or "")
+            elif isinstance(result, int):  # call_shell_cmd
+                record["ret_code"] = result
+        return result
+    return wrapper
+
+
+def _get_targets():
+    """Get (module, function name) pairs to trace."""
+    targets = [(command, "get_shell_cmd"), (command, "call_shell_cmd")]
+    for name in sorted(vars(hardware)):
+        func = getattr(hardware, name)
+        if (
+            name.startswith("get_")
+            and callable(func)
+            and getattr(func, "__module__", None) == hardware.__name__
+        ):
+            targets.append((hardware, name))
+    return targets
+
+
+def is_enabled():
+    """Get whether tracing is enabled."""
+    return bool(_originals)
+
+
+def enable(**kwargs):
+    """Enable tracing.
+
+    Args:
+        None
+
+    **kwargs:
+        path (str): Trace file. Spans are only aggregated if None.
+        trace_format (str): "jsonl" or "chrome".
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: Unknown trace_format.
+    """
+    global _writer
+    path = kwargs.setdefault("path", None)
+    trace_format = kwargs.setdefault("trace_format", "jsonl")
+    writers = {"jsonl": _JSONLWriter, "chrome": _ChromeWriter}
+    if trace_format not in writers:
+        raise ValueError("Unknown trace format: {0}".format(trace_format))
+    disable()
+    if path:
+        _writer = writers[trace_format](path)
+    for module, name in _get_targets():
+        func = getattr(module, name)
+        _originals[(module, name)] = func
+        setattr(module, name, _wrap("{0}.{1}".format(module.__name__.split(".")[-1], name), func))
+    logger.debug("Tracing enabled: {0}".format(path))
+    return None
+
+
+def disable():
+    """Disable tracing, restore original functions and close the trace file.
+
+    Histograms are kept until reset().
+
+    Returns:
+        None
+    """
+    global _writer
+    for (module, name), func in _originals.items():
+        setattr(module, name, func)
+    _originals.clear()
+    with _lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+    return None
+
+
+def add_listener(listener):
+    """Add a callable invoked with every finished span dict."""
+    _listeners.append(listener)
+    return None
+
+
+def remove_listener(listener):
+    """Remove a span listener, if added."""
+    if listener in _listeners:
+        _listeners.remove(listener)
+    return None
+
+
+def get_histograms():
+    """Get latency histograms.
+
+    Returns:
+        histograms (dict): keys are span names, values are LatencyHistogram.
+    """
+    with _lock:
+        return dict(_histograms)
+
+
+def reset():
+    """Clear latency histograms."""
+    with _lock:
+        _histograms.clear()
+    return None
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""
+This module contains functions for planning XHPL runs from hardware info.
+
+A plan is the HPL problem size N (a multiple of the block size NB), the
+P x Q process grid and the ranks per NUMA node, along with a predicted
+runtime. All candidate NB and grid shapes are evaluated at once with NumPy.
+
+    Typical Usage:
+
+    plan = xhpl.get_xhpl_plan()
+    print(plan["N"], plan["NB"], plan["P"], plan["Q"])
+"""
+
+import logging
+import numpy
+
+from . import hardware
+from . import testvar
+from .constants import _const as CONSTANTS
+
+logger = logging.getLogger(__name__)
+
+PLAN_DTYPE = numpy.dtype([
+    ("N", numpy.int64),
+    ("NB", numpy.int64),
+    ("P", numpy.int64),
+    ("Q", numpy.int64),
+    ("ranks", numpy.int64),
+    ("ranks_per_numa", numpy.int64),
+    ("runtime", numpy.float64),  # hours
+    ("valid", numpy.bool_),
+])
+
+
+def get_grids(ranks):
+    """Get all P x Q process grids with P <= Q for each rank count.
+
+    Args:
+        ranks (list): Rank counts.
+
+    Returns:
+        tuple(
+            ranks (numpy.ndarray): Rank count of each grid.
+            P (numpy.ndarray): Grid rows.
+            Q (numpy.ndarray): Grid columns.
+        )
+    """
+    ranks = numpy.asarray(ranks, dtype=numpy.int64)
+    p = numpy.arange(1, int(numpy.sqrt(ranks.max())) + 1, dtype=numpy.int64)
+    r_grid, p_grid = numpy.meshgrid(ranks, p, indexing="ij")
+    mask = (r_grid % p_grid == 0) & (p_grid * p_grid <= r_grid)
+    r_grid = r_grid[mask]
+    p_grid = p_grid[mask]
+    return (r_grid, p_grid, r_grid // p_grid)
+
+
+def get_runtime(n, gflops):
+    """Get predicted HPL runtime.
+
+    Args:
+        n (numpy.ndarray): Problem sizes.
+        gflops (float): Sustained GFLOPS.
+
+    Returns:
+        runtime (numpy.ndarray): Runtime in hours.
+    """
+    n = numpy.asarray(n, dtype=numpy.float64)
+    flops = 2.0 / 3.0 * n ** 3 + 2.0 * n ** 2
+    runtime = flops / (gflops * 1e9) / 3600.0
+    return runtime
+
+
+def get_xhpl_plans(mem, ranks, gflops, **kwargs):
+    """Get all candidate XHPL plans, best first.
+
+    N fills mem with the N x N double-precision matrix, rounded down to NB.
+    Plans are invalid if they exceed the timeout or their ranks do not
+    divide evenly across NUMA nodes. Valid plans are ordered by largest N,
+    then most square grid, then most ranks, then NB candidate order.
+
+    Args:
+        mem (int): Memory for the matrix in kB.
+        ranks (list): Candidate MPI rank counts.
+        gflops (float): Sustained GFLOPS (measured or estimated).
+
+    **kwargs:
+        nb (list): Candidate block sizes. Default: XHPL_NB.
+        numa_nodes (int): NUMA node count.
+        timeout (float): Max runtime in hours. Default: XHPL_TIMEOUT.
+
+    Returns:
+        plans (numpy.ndarray): Structured array of PLAN_DTYPE.
+    """
+    nb = numpy.asarray(kwargs.setdefault("nb", CONSTANTS().XHPL_NB), dtype=numpy.int64)
+    numa_nodes = int(kwargs.setdefault("numa_nodes", 1))
+    timeout = float(kwargs.setdefault("timeout", CONSTANTS().XHPL_TIMEOUT))
+
+    g_ranks, g_p, g_q = get_grids(ranks)
+    i_nb, i_grid = numpy.meshgrid(
+        numpy.arange(len(nb)), numpy.arange(len(g_ranks)), indexing="ij",
+    )
+    i_nb = i_nb.ravel()
+    i_grid = i_grid.ravel()
+
+    plans = numpy.empty(len(i_nb), dtype=PLAN_DTYPE)
+    n_max = numpy.sqrt(mem * 1024.0 / 8.0)
+    plans["NB"] = nb[i_nb]
+    plans["N"] = (n_max // plans["NB"]) * plans["NB"]
+    plans["P"] = g_p[i_grid]
+    plans["Q"] = g_q[i_grid]
+    plans["ranks"] = g_ranks[i_grid]
+    plans["ranks_per_numa"] = plans["ranks"] // numa_nodes
+    plans["runtime"] = get_runtime(plans["N"], gflops)
+    plans["valid"] = (
+        (plans["N"] > 0)
+        & (plans["runtime"] <= timeout)
+        & (plans["ranks"] % numa_nodes == 0)
+    )
+    order = numpy.lexsort((
+        i_nb,
+        -plans["ranks"],
+        plans["Q"] / plans["P"],
+        -plans["N"],
+        ~plans["valid"],
+    ))
+    return plans[order]
+
+
+def get_xhpl_plan(**kwargs):
+    """Get the best XHPL plan for this host.
+
+    Hardware values not passed in are read from the host: effective memory
+    (XHPL_MEM_PCT of cgroup-capped MemTotal), effective CPU count, NUMA
+    node count and peak GFLOPS scaled by XHPL_EFFICIENCY. Rank candidates
+    are one rank per CPU and one rank per NUMA node.
+
+    Args:
+        None
+
+    **kwargs:
+        mem (int): Memory for the matrix in kB.
+        cores (int): Usable physical cores.
+        numa_nodes (int): NUMA node count.
+        gflops (float): Sustained GFLOPS.
+        ranks (list): Candidate MPI rank counts.
+        nb (list): Candidate block sizes.
+        timeout (float): Max runtime in hours.
+
+    Returns:
+        plan (dict): Best plan, keys are PLAN_DTYPE field names.
+
+    Raises:
+        ValueError: No plan fits the constraints.
+    """
+    mem = kwargs.pop("mem", None)
+    cores = kwargs.pop("cores", None)
+    gflops = kwargs.pop("gflops", None)
+    ranks = kwargs.pop("ranks", None)
+    if mem is None:
+        mem = hardware.get_xhpl_mem()
+    if cores is None:
+        cores = hardware.get_effective_core_count()
+    if "numa_nodes" not in kwargs:
+        kwargs["numa_nodes"] = hardware.get_numa_node_count()
+    if gflops is None:
+        peak = hardware.get_peak_gflops(cores = cores)
+        gflops = peak * CONSTANTS().XHPL_EFFICIENCY
+    if ranks is None:
+        ranks = sorted({cores, kwargs["numa_nodes"]})
+    plans = get_xhpl_plans(mem, ranks, gflops, **kwargs)
+    if not plans["valid"][0]:
+        logger.error("No Valid XHPL Plan")
+        logger.debug(testvar.get_debug((mem, ranks, gflops, kwargs)))
+        raise ValueError("No XHPL plan fits memory/timeout constraints")
+    best = plans[0]
+    plan = {name: best[name].item() for name in PLAN_DTYPE.names}
+    return plan
@@ -28,5 +28,8 @@ setup(
         "numpy",
         "packaging",
     ],
+    extras_require = {
+        "threads": ["threadpoolctl"],
+    },
     zip_safe = False,
 )
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+
+from engcommon import hardware
+from engcommon.benchmark import get_dgemm_gflops
+from engcommon.benchmark import get_stream_bandwidth
+from engcommon.benchmark import qualify_node
+
+
+def test_get_dgemm_gflops():
+    stats = get_dgemm_gflops(size=128, reps=3)
+    assert stats["best"] >= stats["median"] >= stats["min"] > 0
+
+
+def test_get_stream_bandwidth():
+    bandwidth = get_stream_bandwidth(size=1 << 16, reps=3, threads=2)
+    assert list(bandwidth.keys()) == ["copy", "scale", "add", "triad"]
+    assert bandwidth["triad"]["best"] > 0
+
+
+def test_qualify_node(fake_host, monkeypatch):
+    monkeypatch.setattr(hardware, "get_effective_cpu_count", lambda: 2)  # 1 core, 2 threads
+    result = qualify_node(threads=2, dgemm_size=128, stream_size=1 << 16, reps=2, min_efficiency=0)
+    assert result["passed"]
+    assert result["peak_gflops"] == hardware.get_peak_gflops(cores=1)
@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 
 import logging
+import os
+import pytest
+from engcommon import trace
+from engcommon.clihelper import CLI
+from engcommon.clihelper import Hostlist
+from engcommon.clihelper import compress_hostlist
+from engcommon.clihelper import expand_hostlist
 
 logger = logging.getLogger(__name__)
 
@@ -32,3 +39,60 @@ def test_print_logdir(mycli, caplog):
 
 def test_get_stdout(mycli):
     assert isinstance(mycli.get_stdout(), str)
+
+
+def test_write_metrics(tmp_path, fake_host):
+    path = str(tmp_path / "engcommon.prom")
+    args = {
+        "log_id": "testily-testful-test",
+        "prefix": str(tmp_path / "logs"),
+        "debug": False,
+        "metrics": path,
+    }
+    cli = CLI("engcommon", args)
+    assert trace.is_enabled()
+    cli.write_metrics()
+    assert os.path.isfile(path)
+    assert not trace.is_enabled()
+
+
+def test_hostlist_expand():
+    hosts = list(expand_hostlist("node[001-003,010],login1,gpu[8-10]-ib"))
+    assert hosts == [
+        "gpu8-ib", "gpu9-ib", "gpu10-ib", "login1",
+        "node001", "node002", "node003", "node010",
+    ]
+    assert len(Hostlist("rack[1-2]n[01-04]")) == 8
+
+
+def test_hostlist_expand_order():
+    hosts = list(expand_hostlist("node[001-512]"))
+    assert hosts == ["node{0:03d}".format(i) for i in range(1, 513)]
+    assert hosts[408:413] == ["node409", "node410", "node411", "node412", "node413"]
+    assert list(Hostlist("n[08-11]")) == ["n08", "n09", "n10", "n11"]
+    assert list(Hostlist("n[08-11],n7,n")) == ["n7", "n08", "n09", "n10", "n11", "n"]
+
+
+def test_hostlist_compress():
+    assert compress_hostlist(["n9", "n10", "n11", "login"]) == "login,n[9-11]"
+    assert compress_hostlist(["node{0:03d}".format(i) for i in range(1, 101)]) == "node[001-100]"
+    assert Hostlist("node[001-099],node100") == Hostlist("node[001-100]")
+
+
+def test_hostlist_set_operations():
+    big = Hostlist("node[00001-40000]")
+    assert len(big) == 40000
+    rest = big - Hostlist("node[00100-00199],node[30000-39999]")
+    assert str(rest) == "node[00001-00099,00200-29999,40000]"
+    assert "node00150" not in rest
+    assert "node00250" in rest
+    assert str(rest | Hostlist("node[00100-00199]")) == "node[00001-29999,40000]"
+    assert str(big & Hostlist("node[39990-40010],login1")) == "node[39990-40000]"
+
+
+@pytest.mark.parametrize("expr", [
+    "node[1-", "node[3-1]", "node[a-b]", "node]1[", "node[]", "n[1-2]x[]",
+])
+def test_hostlist_invalid(expr):
+    with pytest.raises(ValueError):
+        Hostlist(expr)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import time
+import pytest
+from engcommon import command
+from engcommon import constants
+from engcommon import error
+from engcommon.constants import CommandRegistry
+
+
+@pytest.fixture
+def retry_sh(monkeypatch):
+    registry = CommandRegistry(constants.get_registry().commands, {}, {"sh": [3]})
+    monkeypatch.setattr(constants, "_registry", registry)
+    command.reset_latency()
+    yield
+    command.reset_latency()
+
+
+def test_retry(tmp_path, retry_sh):
+    marker = tmp_path / "marker"
+    cmd = "sh -c 'if [ -f {0} ]; then echo ok; else touch {0}; exit 3; fi'".format(marker)
+    policy = command.RetryPolicy(backoff=0.01)
+    result = command.get_shell_cmd(cmd, retry=policy)
+    assert result["stdout"] == "ok\n"
+
+
+def test_retry_not_retryable(retry_sh):
+    with pytest.raises(error.ShellCommandExecutionError):
+        command.get_shell_cmd("sh -c 'exit 4'", retry=command.RetryPolicy(backoff=0.01))
+
+
+def test_retry_exhausted(retry_sh):
+    policy = command.RetryPolicy(attempts=2, backoff=0.01)
+    with pytest.raises(error.ShellCommandExecutionError):
+        command.get_shell_cmd("sh -c 'exit 3'", retry=policy)
+
+
+def test_get_delay():
+    policy = command.RetryPolicy(backoff=1, max_backoff=5, jitter=False)
+    assert [policy.get_delay(i) for i in range(4)] == [1, 2, 4, 5]
+    policy = command.RetryPolicy(backoff=1, max_backoff=5)
+    assert 0 <= policy.get_delay(10) <= 5
+
+
+def test_hedge(tmp_path, retry_sh):
+    marker = tmp_path / "marker"
+    cmd = "sh -c 'if [ -f {0} ]; then echo fast; else touch {0}; sleep 10; echo slow; fi'".format(marker)
+    for _ in range(constants._const().HEDGE_MIN_SAMPLES):
+        command._record_latency(cmd, 0.05)
+    assert command.get_latency(cmd, 95) == 0.05
+    start = time.perf_counter()
+    result = command.get_shell_cmd(cmd, retry=command.RetryPolicy(hedge=True))
+    assert result["stdout"] == "fast\n"
+    assert time.perf_counter() - start < 5
+
+
+def test_get_latency(retry_sh):
+    assert command.get_latency("true", 95) is None
+    command.get_shell_cmd("true")
+    assert command.get_latency("true", 95) is None
+
+
+def test_latency_bounded(retry_sh, monkeypatch):
+    monkeypatch.setattr(constants._const, "LATENCY_COMMANDS", property(lambda self: 3))
+    for i in range(5):
+        command._record_latency("cmd{0}".format(i), 0.01)
+    command._record_latency("cmd2", 0.01)
+    command._record_latency("cmd5", 0.01)
+    assert list(command._latencies) == ["cmd4", "cmd2", "cmd5"]
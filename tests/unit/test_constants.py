@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import json
+import pytest
+from engcommon import command
+from engcommon import constants
+from engcommon import error
+from engcommon.constants import _const as CONSTANTS
+from engcommon.constants import CommandRegistry
+
+
+@pytest.fixture
+def registry():
+    return CommandRegistry(
+        {"lscpu": "lscpu -e"},
+        {"smartctl": 4, "ipmitool fru": [1, 2], "ipmi": 3},
+    )
+
+
+@pytest.mark.parametrize("cmd,ret_code,expected", [
+    ("smartctl -a /dev/sda", 4, True),
+    (["smartctl", "-a", "/dev/sda"], 4, True),
+    ("smartctl -a /dev/sda", 1, False),
+    ("ipmitool fru print", 2, True),
+    (["ipmitool", "fru", "print"], 1, True),
+    (["ipmitool", "sdr"], 1, False),
+    (["ipmitool", "sdr"], 3, True),
+    ("ipmi", 3, True),
+    ("ipm", 3, False),
+    ("dmidecode", 4, False),
+    ([], 4, False),
+])
+def test_is_ignored(registry, cmd, ret_code, expected):
+    assert registry.is_ignored(cmd, ret_code) is expected
+
+
+def test_registry_frozen(registry):
+    with pytest.raises(TypeError):
+        registry.extra = 1
+    with pytest.raises(TypeError):
+        registry.commands["lscpu"] = "lscpu"
+    assert registry.get_command("lscpu") == "lscpu -e"
+    assert registry.ignore_returncode["ipmitool fru"] == frozenset([1, 2])
+
+
+@pytest.mark.parametrize("cmd,ret_code,stderr,expected", [
+    ("ipmitool -H bmc1 sdr", 1, "Error: Unable to establish IPMI v2 / RMCP+ session\n", False),
+    ("ipmitool -H bmc1 sdr", 1, "Get Device ID command failed: Node busy\n", True),
+    (["ipmitool", "sdr"], 1, "Close Session command failed: Timeout\n", True),
+    ("ipmitool sdr", 1, None, False),
+    ("ipmitool sdr", 2, "Timeout\n", False),
+    ("smartctl -a /dev/sda", 2, None, True),
+])
+def test_is_retryable(cmd, ret_code, stderr, expected):
+    registry = CommandRegistry.from_files([])
+    assert registry.is_retryable(cmd, ret_code, stderr) is expected
+
+
+def test_from_files(tmp_path):
+    good = tmp_path / "commands.json"
+    good.write_text(json.dumps({
+        "commands": {"ipmitool": "ipmitool -I open"},
+        "ignore_returncode": {"ipmitool fru": [1]},
+    }))
+    bad = tmp_path / "commands.bad.json"
+    bad.write_text("{")
+    registry = CommandRegistry.from_files([str(good), str(bad), str(tmp_path / "missing.json")])
+    assert registry.get_command("ipmitool") == "ipmitool -I open"
+    assert registry.get_command("lscpu") == "lscpu"
+    assert registry.is_ignored("smartctl", 4)
+    assert registry.is_ignored("ipmitool fru print", 1)
+
+
+def test_get_registry(tmp_path, monkeypatch):
+    override = tmp_path / "commands.json"
+    override.write_text(json.dumps({"commands": {"lscpu": "lscpu -J"}}))
+    monkeypatch.setenv("ENGCOMMON_COMMANDS", str(override))
+    monkeypatch.setattr(constants, "_registry", None)
+    assert CONSTANTS().CMD_LSCPU == "lscpu -J"
+    assert constants.get_registry() is constants.get_registry()
+    assert CONSTANTS().COMMAND_REGISTRY is constants.get_registry()
+    assert CONSTANTS().IGNORE_RETURNCODE == {"smartctl": 4}
+    command.check_returncode(["smartctl", "-a"], 4)
+    with pytest.raises(error.ShellCommandExecutionError):
+        command.check_returncode(["smartctl", "-a"], 2)
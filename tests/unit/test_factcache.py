@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import json
+import os
+from engcommon import hardware
+from engcommon.factcache import FactCache
+
+
+def test_update_get(tmp_path):
+    cache = FactCache(str(tmp_path / "facts.json"), boot_id="boot-1")
+    assert cache.get("uuid") is None
+    cache.update({"uuid": "abc"})
+    cache.update({"serial_num": "S1"})
+    assert cache.get_all() == {"uuid": "abc", "serial_num": "S1"}
+    assert oct(os.stat(cache.path).st_mode & 0o777) == "0o644"
+    assert FactCache(cache.path, boot_id="boot-1").get("uuid") == "abc"
+
+
+def test_reboot_invalidates(tmp_path):
+    path = str(tmp_path / "facts.json")
+    FactCache(path, boot_id="boot-1").update({"uuid": "abc"})
+    cache = FactCache(path, boot_id="boot-2")
+    assert cache.get("uuid") is None
+    cache.update({"serial_num": "S1"})
+    assert cache.get_all() == {"serial_num": "S1"}
+
+
+def test_reload_on_change(tmp_path):
+    path = str(tmp_path / "facts.json")
+    reader = FactCache(path, boot_id="boot-1")
+    FactCache(path, boot_id="boot-1").update({"uuid": "abc"})
+    assert reader.get("uuid") == "abc"
+    FactCache(path, boot_id="boot-1").update({"uuid": "def"})
+    assert reader.get("uuid") == "def"
+    with open(path, "w") as f:
+        f.write("{")
+    assert reader.get("uuid") is None
+    reader.clear()
+    assert not os.path.exists(path)
+
+
+def test_collect_static_facts(tmp_path, fake_host):
+    cache = FactCache(str(tmp_path / "facts.json"), boot_id="boot-1")
+    facts = hardware.collect_static_facts(cache)
+    assert facts["cpu_vendor"] == "intel"
+    with open(cache.path) as f:
+        assert json.load(f)["facts"]["uuid"] == facts["uuid"]
+
+    hardware.set_root()  # real host: served from the cache, not dmidecode
+    hardware.set_command_hook()
+    hardware.set_fact_cache(cache)
+    try:
+        assert hardware.get_uuid() == facts["uuid"]
+        assert hardware.get_serial_num() == facts["serial_num"]
+        assert hardware.get_cpu_model() == facts["cpu_model"]
+        assert "System Information" in hardware.get_dmidecode()
+    finally:
+        hardware.set_fact_cache(FactCache())
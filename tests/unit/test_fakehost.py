@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import os
+from engcommon import hardware
+
+
+def test_cpuinfo_order(fake_host):
+    cpuinfo = hardware.get_cpuinfo()
+    assert len(cpuinfo) == 512
+    assert [int(i["processor"]) for i in cpuinfo] == list(range(512))
+    assert cpuinfo[256]["core id"] == "0"
+
+
+def test_cpuinfo_cache(fake_host):
+    info = hardware.get_cpuinfo_columnar()
+    assert hardware.get_cpuinfo_columnar(cached=True) is info
+    assert hardware.get_cpu_flags_with_prefix("avx512")
+    assert hardware.get_cpuinfo_columnar(cached=True) is info
+    fresh = hardware.get_cpuinfo_columnar()
+    assert fresh is not info
+    assert hardware.get_cpuinfo_columnar(cached=True) is fresh
+    hardware.set_command_hook(hardware._command_hook)
+    assert hardware._cpuinfo is None
+
+
+def test_core_count(fake_host):
+    assert hardware.get_cpu_core_count() == 256
+    assert hardware.get_cpu_core_count_cpuinfo() == 256
+    assert hardware.get_numa_node_count() == 8
+
+
+def test_meminfo(fake_host):
+    assert hardware.get_meminfo()["MemTotal"] == 64 * 32 * 1024 * 1024
+    assert hardware.get_effective_meminfo()["MemTotal"] == 64 * 32 * 1024 * 1024
+
+
+def test_dmidecode(fake_host):
+    assert len(hardware.get_dmidecode()["Memory Device"]) == 64
+    assert hardware.get_serial_num().startswith("HSK")
+    assert len(hardware.get_uuid()) == 36
+
+
+def test_telemetry_sampler(fake_host):
+    sampler = hardware.TelemetrySampler()
+    sampler.sample()
+    sampler.close()
+    assert sampler.get_cpu_freq().shape == (1, 512)
+    assert sampler.get_thermal()[0, 7] == 47.0
+
+
+def test_telemetry_sampler_hotplug(fake_host, caplog):
+    stat = os.path.join(fake_host, "proc", "stat")
+    sampler = hardware.TelemetrySampler()
+    sampler.sample()
+    with open(stat) as f:
+        lines = f.readlines()
+    with open(stat, "w") as f:  # cpu5 offline
+        f.writelines(i for i in lines if not i.startswith("cpu5 "))
+    sampler.sample()
+    assert "Telemetry CPU Hotplug" in caplog.text
+    with sampler:
+        pass
+    assert sampler._f_stat.closed
+    util = sampler.get_cpu_util()
+    assert util.shape[1] == 512
+    assert util[-1, 5] == 0
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import time
+import pytest
+from engcommon import fanout
+from engcommon.fanout import FakeTransport
+from engcommon.fanout import FanOut
+from engcommon.fanout import LocalTransport
+from engcommon.fanout import SSHTransport
+
+
+def test_fake_fanout():
+    hosts = ["node{0:03d}".format(i) for i in range(20)]
+    responses = {h: {"stdout": "5.14.0\n"} for h in hosts[:-2]}
+    responses[hosts[-2]] = lambda cmd: {"stdout": "4.18.0\n"}
+    transport = FakeTransport(responses, delays={hosts[0]: 5})
+    with FanOut(transport, max_workers=4, timeout=0.2) as fan:
+        start = time.perf_counter()
+        results = fan.run_all(iter(hosts), "uname -r")
+        assert time.perf_counter() - start < 2
+    assert len(results) == 20
+    assert results[hosts[0]].error == "TimeoutExpired"
+    assert results[hosts[0]].ret_code is None
+    assert results[hosts[-1]].ret_code == 255
+    groups = fanout.group_results(results.values())
+    assert [len(h) for h, _ in groups] == [17, 1, 1, 1]
+    assert groups[0][1]["stdout"] == "5.14.0\n"
+    assert groups[0][0][0] == "node001"
+
+
+def test_streamed():
+    hosts = ["slow", "fast"]
+    transport = FakeTransport({"slow": {}, "fast": {}}, delays={"slow": 0.3})
+    order = [r.host for r in FanOut(transport, max_workers=2).run(hosts, "true")]
+    assert order == ["fast", "slow"]
+
+
+def test_local_transport():
+    fan = FanOut(LocalTransport(), timeout=5)
+    results = fan.run_all(["a", "b"], "echo {host} | tr a-z A-Z; exit 3")
+    assert results["a"].stdout == "A\n"
+    assert results["b"].ret_code == 3
+
+
+def test_ssh_argv(tmp_path):
+    transport = SSHTransport(user="root", options=["ConnectTimeout=5"], control_dir=str(tmp_path))
+    argv = transport._get_argv("node001")
+    assert argv[0] == "ssh"
+    assert "ControlMaster=no" in argv
+    assert "ControlPath={0}/%C".format(tmp_path) in argv
+    assert argv[-3:] == ["-l", "root", "node001"]
+
+
+def test_ssh_master(monkeypatch):
+    calls = []
+
+    def run(argv, **kwargs):
+        calls.append((argv, kwargs))
+        return subprocess.CompletedProcess(argv, 0, "", "")
+
+    monkeypatch.setattr(fanout.subprocess, "run", run)
+    transport = SSHTransport()
+    control_dir = transport._control_dir
+    transport.run("node001", "true", 5)
+    transport.run("node001", "true", 5)
+    masters = [(argv, kwargs) for argv, kwargs in calls if "ControlMaster=yes" in argv]
+    assert len(masters) == 1
+    assert masters[0][0][-3:] == ["-f", "-N", "node001"]
+    assert masters[0][1]["stderr"] == subprocess.DEVNULL
+    assert len(calls) == 3
+    transport.close()
+    assert calls[-1][0][-3:] == ["-O", "exit", "node001"]
+    assert not os.path.exists(control_dir)
+
+
+def test_ssh_timeout_includes_master(monkeypatch):
+    clock = [100.0]
+    timeouts = []
+
+    def run(argv, **kwargs):
+        if "ControlMaster=yes" in argv:
+            clock[0] += kwargs["timeout"] - 2
+        else:
+            timeouts.append(kwargs["timeout"])
+        return subprocess.CompletedProcess(argv, 0, "", "")
+
+    monkeypatch.setattr(fanout.subprocess, "run", run)
+    monkeypatch.setattr(fanout.time, "monotonic", lambda: clock[0])
+    transport = SSHTransport()
+    try:
+        transport.run("node001", "true", 5)
+        assert timeouts == [2]
+        def slow_master(host, timeout):
+            clock[0] += timeout + 1
+
+        monkeypatch.setattr(transport, "_start_master", slow_master)
+        with pytest.raises(subprocess.TimeoutExpired):
+            transport.run("node002", "true", 5)
+    finally:
+        transport.close()
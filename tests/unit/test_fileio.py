@@ -2,7 +2,10 @@
 
 import inspect
 import os
+import pytest
+import tempfile
 from engcommon.fileio import write_file
+from engcommon.fileio import write_file_atomic
 
 
 def test_write_file():
@@ -13,3 +16,12 @@ def test_write_file():
     write_file(filename, "test\n", "w")
     with open(filename, "r") as f:
         assert f.read() == "test\n"
+
+
+def test_write_file_atomic_error(tmp_path, monkeypatch, caplog):
+    def mkstemp(**kwargs):
+        raise PermissionError(13, "Permission denied")
+    monkeypatch.setattr(tempfile, "mkstemp", mkstemp)
+    with pytest.raises(OSError):
+        write_file_atomic(str(tmp_path / "metrics.prom"), "test\n")
+    assert "Atomic File Write Error" in caplog.text
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import pytest
+import time
+from engcommon import hardware
+from engcommon.constants import _const as CONSTANTS
+from engcommon.hardware import CPUFeatures
+from engcommon.hardware import CPUInfo
+from engcommon.hardware import TelemetrySampler
+from engcommon.hardware import get_cgroup_cpu_quota
+from engcommon.hardware import get_cgroup_cpuset
+from engcommon.hardware import get_cgroup_mem_limit
+from engcommon.hardware import get_cgroup_mem_usage
+from engcommon.hardware import get_common_features
+from engcommon.hardware import parse_cpu_list
+
+
+def test_telemetry_sampler():
+    sampler = TelemetrySampler(interval=0.01, capacity=8)
+    with sampler:
+        time.sleep(0.2)
+    sampler.close()
+    assert sampler.num_samples == 8
+    util = sampler.get_cpu_util()
+    assert util.shape[0] == 7
+    assert ((util >= 0) & (util <= 1)).all()
+    assert (sampler.get_timestamps()[1:] > sampler.get_timestamps()[:-1]).all()
+    assert set(sampler.get_summary()["cpu_util"].keys()) == {"p50", "p99", "max", "mean"}
+
+
+def test_telemetry_sampler_rate():
+    sampler = TelemetrySampler(capacity=4)
+    for i in range(3):
+        sampler.sample()
+        time.sleep(0.01)
+    sampler.close()
+    rate = sampler.get_rate(sampler.get_mem_used())
+    assert rate.shape == (2,)
+
+
+def get_cpuinfo_stdout(num_cpus, hybrid=False):
+    stanzas = []
+    for i in range(num_cpus):
+        flags = "fpu sse avx avx2" if (hybrid and i % 2) else "fpu sse avx avx2 avx512f"
+        stanzas.append(
+            "processor\t: {0}\n"
+            "model name\t: Hosaka Ono-Sendai\n"
+            "cpu MHz\t\t: {1}.5\n"
+            "physical id\t: {2}\n"
+            "core id\t\t: {3}\n"
+            "flags\t\t: {4}\n".format(i, 2000 + i, i // 4, i % 4, flags)
+        )
+    return "\n".join(reversed(stanzas))
+
+
+def test_cpuinfo_columnar():
+    info = CPUInfo.from_stdout(get_cpuinfo_stdout(8))
+    assert len(info) == 8
+    assert info.get_value(3, "processor") == "3"
+    assert info.get_unique("model name") == ("Hosaka Ono-Sendai",)
+    assert info.get_array("cpu MHz")[7] == 2007.5
+    assert info.get_array("physical id", int).tolist() == [0, 0, 0, 0, 1, 1, 1, 1]
+    assert not info.is_heterogeneous
+
+
+def test_cpuinfo_heterogeneous():
+    info = CPUInfo.from_stdout(get_cpuinfo_stdout(8, hybrid=True))
+    assert info.is_heterogeneous
+    groups = info.get_groups("flags")
+    assert groups["fpu sse avx avx2"].tolist() == [1, 3, 5, 7]
+    assert "avx512f" not in info.get_flags(1)
+
+
+def test_cpuinfo_to_list():
+    cpuinfo = CPUInfo.from_stdout(get_cpuinfo_stdout(4)).to_list()
+    assert cpuinfo[2]["core id"] == "2"
+    assert cpuinfo[0]["flags"] is cpuinfo[3]["flags"]
+
+
+def test_cpu_features():
+    features = CPUFeatures(["sse2", "avx", "avx2", "fma", "not_a_real_flag"])
+    assert "avx2" in features
+    assert "avx512f" not in features
+    assert "not_a_real_flag" in features
+    assert features.get_simd_width() == 256
+    assert features.has_fma(256)
+    assert not features.has_fma(512)
+    assert CPUFeatures(["sse2"]) <= features
+    assert set(features - CPUFeatures(["avx", "fma"])) == {"sse2", "avx2", "not_a_real_flag"}
+    assert features.extra == {"not_a_real_flag"}
+    assert CPUFeatures.from_array(features.to_array()) == features - CPUFeatures(["not_a_real_flag"])
+    assert CPUFeatures.from_array(features.to_array(), features.extra) == features
+
+
+def test_cpu_features_array_layout():
+    # Bit positions are fixed by the versioned table, not by first use
+    CPUFeatures(["zz_unknown_a", "zz_unknown_b"])
+    array = CPUFeatures(["fpu", "avx2"]).to_array()
+    assert len(array) == (len(hardware._CPU_FLAGS) + 63) // 64
+    assert int(array[0]) == (1 << 0) | (1 << hardware._CPU_FLAGS.index("avx2"))
+
+
+def test_get_common_features():
+    hosts = [
+        CPUFeatures(["sse2", "avx", "avx2", "avx512f"]),
+        CPUFeatures(["sse2", "avx", "avx2"]),
+        CPUFeatures(["sse2", "avx", "avx2", "avx512f", "avx512bw"]),
+    ]
+    common = get_common_features(hosts)
+    assert set(common) == {"sse2", "avx", "avx2"}
+    assert common.get_simd_width() == 256
+
+
+@pytest.fixture
+def cgroup_v2(tmp_path, monkeypatch):
+    root = tmp_path / "cgroup"
+    job = root / "kubepods" / "job"
+    job.mkdir(parents=True)
+    (root / "cgroup.controllers").write_text("cpuset cpu memory\n")
+    (root / "kubepods" / "cpu.max").write_text("800000 100000\n")
+    (root / "kubepods" / "memory.max").write_text("8589934592\n")
+    (job / "cpu.max").write_text("250000 100000\n")
+    (job / "memory.max").write_text("max\n")
+    (job / "memory.current").write_text("1073741824\n")
+    (job / "cpuset.cpus.effective").write_text("0-5,8\n")
+    proc_cgroup = tmp_path / "cgroup.proc"
+    proc_cgroup.write_text("0::/kubepods/job\n")
+    monkeypatch.setattr(CONSTANTS, "DIR_CGROUP", property(lambda self: str(root)))
+    monkeypatch.setattr(CONSTANTS, "FILE_PROC_CGROUP", property(lambda self: str(proc_cgroup)))
+    return root
+
+
+def test_parse_cpu_list():
+    assert parse_cpu_list("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+
+
+def test_cgroup_v2_limits(cgroup_v2):
+    assert get_cgroup_cpu_quota() == 2.5
+    assert get_cgroup_cpuset() == [0, 1, 2, 3, 4, 5, 8]
+    assert get_cgroup_mem_limit() == 8589934592
+    assert get_cgroup_mem_usage() == 1073741824
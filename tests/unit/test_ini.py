@@ -1,29 +1,149 @@
 #!/usr/bin/env python3
 
+import io
+import json
+import os
+import time
 import pytest
+from engcommon import ini as ini_
+from engcommon.constants import _const as CONSTANTS
+from engcommon.ini import INIConfig
+from engcommon.ini import INISnapshot
 
-pytestmark = pytest.mark.skip(reason="INI server is offline")
+offline = pytest.mark.skip(reason="INI server is offline")
 
+INI = {
+    "apihost": "api.local",
+    "buildhost": "build.local",
+    "dockerhost": "registry.local:5000",
+    "jenkinshost": "jenkins.local:8080",
+    "xhplconsole_url": "http://api.local/xhplconsole",
+    "kubeconfig": "/etc/kube/config",
+}
 
+
+@offline
 def test_apihost(myini):
     assert isinstance(myini.apihost, str)
 
 
+@offline
 def test_buildhost(myini):
     assert isinstance(myini.buildhost, str)
 
 
+@offline
 def test_dockerhost(myini):
     assert isinstance(myini.dockerhost, str)
 
 
+@offline
 def test_jenkinshost(myini):
     assert isinstance(myini.jenkinshost, str)
 
 
+@offline
 def test_xhplconsole_url(myini):
     assert isinstance(myini.xhplconsole_url, str)
 
 
+@offline
 def test_kubeconfig(myini):
     assert isinstance(myini.kubeconfig, str)
+
+
+def _write(path, **changes):
+    path.write_text(json.dumps(dict(INI, **changes)))
+    st = os.stat(str(path))
+    os.utime(str(path), ns=(st.st_atime_ns, st.st_mtime_ns + 1000000))  # coarse mtime
+
+
+def test_snapshot():
+    snapshot = INISnapshot(dict(INI, extra="ignored"))
+    assert snapshot.dockerhost == "registry.local:5000"
+    with pytest.raises(TypeError):
+        snapshot.dockerhost = "other:5000"
+    with pytest.raises(AttributeError):
+        snapshot.__dict__
+    other = INISnapshot(dict(INI, apihost="api2.local"))
+    assert other.diff(snapshot) == ["apihost"]
+    with pytest.raises(ValueError):
+        INISnapshot({k: v for k, v in INI.items() if k != "apihost"})
+
+
+@pytest.mark.parametrize("changes", [
+    {"apihost": ""},
+    {"dockerhost": "bad host:5000"},
+    {"xhplconsole_url": "api.local/xhplconsole"},
+    {"kubeconfig": 1},
+])
+def test_snapshot_invalid(changes):
+    with pytest.raises(ValueError):
+        INISnapshot(dict(INI, **changes))
+
+
+def test_reload(tmp_path):
+    path = tmp_path / "builder.json"
+    _write(path)
+    ini = INIConfig("file://{0}".format(path))
+    seen = []
+    ini.add_callback(lambda old, new: seen.append((old.dockerhost, new.dockerhost)))
+    assert ini.check() == []
+    _write(path, dockerhost="registry2.local:5000")
+    assert ini.check() == ["dockerhost"]
+    assert ini.dockerhost == "registry2.local:5000"
+    assert seen == [("registry.local:5000", "registry2.local:5000")]
+    _write(path, dockerhost="bad host")
+    with pytest.raises(ValueError):
+        ini.check()
+    assert ini.dockerhost == "registry2.local:5000"
+
+
+def test_watch(tmp_path):
+    path = tmp_path / "builder.json"
+    _write(path)
+    ini = INIConfig(str(path))
+    ini.start(interval=0.02)
+    try:
+        _write(path, apihost="api2.local")
+        deadline = time.time() + 5
+        while ini.apihost != "api2.local" and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        ini.stop()
+    assert ini.snapshot.apihost == "api2.local"
+
+
+def test_url_timeout(monkeypatch):
+    calls = []
+
+    def urlopen(url, timeout=None):
+        calls.append((url, timeout))
+        return io.BytesIO(json.dumps(INI).encode())
+
+    monkeypatch.setattr(ini_.urllib.request, "urlopen", urlopen)
+    ini = INIConfig("http://hosaka.local/ini/builder.json")
+    assert ini.apihost == "api.local"
+    assert calls == [("http://hosaka.local/ini/builder.json", CONSTANTS().INI_TIMEOUT)]
+
+
+def test_watch_unexpected_error(tmp_path, monkeypatch):
+    path = tmp_path / "builder.json"
+    _write(path)
+    ini = INIConfig(str(path))
+    calls = []
+
+    def check():
+        calls.append(1)
+        raise RuntimeError("callback bug")
+
+    monkeypatch.setattr(ini, "check", check)
+    ini.start(interval=0.01)
+    try:
+        deadline = time.time() + 5
+        while len(calls) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert ini._thread.is_alive()
+    finally:
+        ini.stop()
+    assert len(calls) >= 3
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import json
+from engcommon import inventory
+from engcommon.inventory import InventoryStore
+
+
+def _get_fleet(reference):
+    records = []
+    for i in range(200):
+        record = dict(reference, host="node{0:04d}".format(i))
+        if i == 42:
+            record["bios_version"] = "1.3.9"
+        if i == 7:
+            record["dimm_count"] -= 1
+            record["dimm_total_gb"] -= 32
+            record["mem_total_kb"] -= 32 * 1024 * 1024
+        if i == 99:
+            record["flags"] = [f for f in record["flags"] if f != "avx512f"] + ["newflag"]
+        record.pop("fingerprint")
+        records.append(record)
+    return records
+
+
+def test_collect_inventory(tmp_path, fake_host):
+    path = str(tmp_path / "inventory" / "node0000.json")
+    record = inventory.write_inventory(path, host="node0000")
+    assert record["sockets"] == 8
+    assert record["threads"] == 512
+    assert record["bios_version"] == "1.4.2"
+    assert record["dimm_count"] == 64
+    assert "avx512f" in record["flags"]
+    with open(path) as f:
+        assert json.load(f) == record
+    assert inventory.get_fingerprint(dict(record, host="other")) == record["fingerprint"]
+    assert inventory.get_fingerprint(dict(record, cores=1)) != record["fingerprint"]
+
+
+def test_store_queries(fake_host):
+    reference = inventory.collect_inventory(host="ref")
+    store = InventoryStore(_get_fleet(reference))
+    assert len(store) == 200
+    assert len(store.get_unique("flags")) == 2
+    assert store.get_outliers("bios_version") == {"node0042": "1.3.9"}
+    assert store.get_outliers("dimm_count") == {"node0007": 63}
+    groups = store.group_by("fingerprint")
+    assert [len(v) for v in groups.values()] == [197, 1, 1, 1]
+    assert store.group_by("cpu_model") == {reference["cpu_model"]: store.hosts}
+
+    drift = store.get_drift("node0000")
+    assert sorted(drift) == ["node0007", "node0042", "node0099"]
+    assert drift["node0042"] == {"bios_version": ("1.4.2", "1.3.9")}
+    assert drift["node0099"] == {"flags": (["avx512f"], ["newflag"])}
+    assert set(drift["node0007"]) == {"mem_total_kb", "dimm_count", "dimm_total_gb"}
+
+    record = store.get_record("node0099")
+    assert "newflag" in record["flags"]
+    assert record["fingerprint"] == inventory.get_fingerprint(record)
+
+
+def test_from_files(tmp_path):
+    good = tmp_path / "a.json"
+    good.write_text(json.dumps({"host": "a", "cores": 4, "flags": ["sse"]}))
+    bad = tmp_path / "b.json"
+    bad.write_text("{")
+    store = InventoryStore.from_files([str(good), str(bad)])
+    assert store.hosts == ["a"]
+    assert store.get_array("cores").tolist() == [4]
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+import pytest
+from engcommon import error
+from engcommon.ipmi import IPMISession
+from engcommon.ipmi import parse_sdr
+
+
+def test_get_sdr(fake_ipmitool):
+    with IPMISession(ipmitool=fake_ipmitool) as bmc:
+        assert bmc.get_sdr()["CPU1 Temp"]["value"] == "45 degrees C"
+
+
+def test_get_sensor(fake_ipmitool):
+    with IPMISession(ipmitool=fake_ipmitool) as bmc:
+        assert bmc.get_sensor()["FAN1"]["units"] == "RPM"
+
+
+def test_get_fru(fake_ipmitool):
+    with IPMISession(ipmitool=fake_ipmitool) as bmc:
+        assert bmc.get_fru()["PSU1 (ID 1)"]["Product Serial"] == "PSU0001"
+
+
+def test_get_sel(fake_ipmitool):
+    with IPMISession(ipmitool=fake_ipmitool) as bmc:
+        assert bmc.get_sel()[1]["direction"] == "Deasserted"
+
+
+def test_cache(fake_ipmitool):
+    with IPMISession(ipmitool=fake_ipmitool) as bmc:
+        assert bmc.get_sdr() is bmc.get_sdr()
+        assert bmc.get_sdr() is not bmc.get_sdr(refresh=True)
+
+
+def test_reconnect(fake_ipmitool, monkeypatch):
+    monkeypatch.setenv("FAKE_IPMITOOL_EXIT_AFTER", "1")
+    with IPMISession(ipmitool=fake_ipmitool, timeout=5) as bmc:
+        assert "FAN1" in bmc.get_sdr()
+        assert "FAN1" in bmc.get_sensor()
+
+
+def test_password_env(fake_ipmitool):
+    with IPMISession(host="bmc01", user="admin", password="secret", ipmitool=fake_ipmitool) as bmc:
+        assert "secret" not in bmc.cmd
+        assert bmc.cmd[-2:] == ["-E", "shell"]
+        assert "FAN1" in bmc.get_sdr()
+
+
+def test_error_not_cached(fake_ipmitool):
+    with IPMISession(ipmitool=fake_ipmitool) as bmc:
+        with pytest.raises(error.ShellCommandExecutionError):
+            bmc._get_cached("sdr lst", parse_sdr, False)
+        assert "sdr lst" not in bmc._cache
@@ -1,7 +1,22 @@
 #!/usr/bin/env python3
 
+import gzip
+import io
+import json
+import logging
+import os
+import signal
+import threading
+from engcommon import log
+from engcommon.log import DuplicateFilter
+from engcommon.log import JSONFormatter
+from engcommon.log import LogLevelController
+from engcommon.log import RotatingCompressedFileHandler
 from engcommon.log import get_formatted_logs
+from engcommon.log import get_std_logger
 from engcommon.log import get_std_logger_conf
+from engcommon.log import set_loglevels
+from engcommon.log import wait_for_compression
 
 
 def test_get_std_logger_conf():
@@ -22,3 +37,180 @@ def test_get_formatted_logs(firstlines):
         '### exhalation ###\n'
         'It has long been said that air (which others call argon) is the source of life.\n'
     )
+
+
+def test_json_formatter():
+    formatter = JSONFormatter(log_id="testily-testful-test", fields=("levelname", "lineno", "message"))
+    record = logging.LogRecord("engcommon", logging.INFO, __file__, 42, "LOGS: %s", ("/tmp",), None)
+    entry = json.loads(formatter.format(record))
+    assert entry["log_id"] == "testily-testful-test"
+    assert entry["levelname"] == "INFO"
+    assert entry["lineno"] == 42
+    assert entry["message"] == "LOGS: /tmp"
+    assert "module" not in entry
+
+
+def test_get_std_logger_json(tmp_path):
+    lgr, lgr_nf = get_std_logger("engcommon", False, logdir=str(tmp_path), formats={"debug": "json"}, log_id="a-b-c")
+    lgr.debug("json line")
+    debug_file = lgr.handlers[3].baseFilename
+    for handler in lgr.handlers:
+        handler.flush()
+    with open(debug_file) as f:
+        entry = json.loads(f.readline())
+    assert entry["message"] == "json line"
+    assert entry["log_id"] == "a-b-c"
+    assert not isinstance(lgr.handlers[1].formatter, JSONFormatter)
+
+
+def test_get_std_logger_json_noformat(tmp_path):
+    lgr, lgr_nf = get_std_logger("engcommon", False, logdir=str(tmp_path), formats={"debug": "json"})
+    lgr.info("json line")
+    lgr_nf.info("raw command output")
+    lgr.debug("another json line")
+    debug_file = lgr.handlers[3].baseFilename
+    for handler in lgr.handlers + lgr_nf.handlers:
+        handler.flush()
+    with open(debug_file) as f:
+        entries = [json.loads(line) for line in f]
+    assert [i["message"] for i in entries] == ["json line", "raw command output", "another json line"]
+
+
+def test_rotating_compressed_file_handler(tmp_path):
+    logfile = str(tmp_path / "run.debug.log")
+    handler = RotatingCompressedFileHandler(logfile, max_bytes=100, interval=0, backup_count=3)
+    lgr = logging.getLogger("test_rotating")
+    lgr.propagate = False
+    lgr.addHandler(handler)
+    for i in range(40):
+        lgr.warning("record %d is about forty characters", i)
+    wait_for_compression()
+    lgr.removeHandler(handler)
+    handler.close()
+    segments = sorted(os.listdir(str(tmp_path)))
+    assert segments[0] == "run.debug.log"
+    assert len(segments) == 4
+    with gzip.open(str(tmp_path / segments[-1]), "rt") as f:
+        assert f.read().splitlines() == [
+            "record {0} is about forty characters".format(i) for i in (36, 37, 38)
+        ]
+    with open(logfile) as f:
+        assert f.read().splitlines() == ["record 39 is about forty characters"]
+
+
+def test_get_std_logger_rotate(tmp_path):
+    lgr, lgr_nf = get_std_logger("engcommon", True, logdir=str(tmp_path), rotate={"max_bytes": 200})
+    for i in range(20):
+        lgr.debug("rotate %d", i)
+        lgr_nf.debug("noformat %d", i)
+    wait_for_compression()
+    assert isinstance(lgr.handlers[3], RotatingCompressedFileHandler)
+    assert any(i.endswith(".gz") for i in os.listdir(str(tmp_path)))
+    with open(lgr.handlers[3].baseFilename) as f:
+        assert "noformat 19" in f.read()
+
+
+def test_set_loglevels():
+    set_loglevels({"test_set_loglevels": "warning"})
+    assert logging.getLogger("test_set_loglevels").level == logging.WARNING
+
+
+def test_loglevel_controller(tmp_path):
+    handler = logging.StreamHandler()
+    handler.setLevel(logging.INFO)
+    control_file = str(tmp_path / "loglevel.ctl")
+    controller = LogLevelController(
+        {"console": handler},
+        loglevels={"test_ctl.a": "INFO"},
+        control_file=control_file,
+    )
+    controller.start()
+    os.kill(os.getpid(), signal.SIGUSR1)
+    assert handler.level == logging.DEBUG
+    controller.toggle_debug()
+    assert handler.level == logging.INFO
+    with open(control_file, "w") as f:
+        f.write("console: WARNING\ntest_ctl.b: ERROR\ndebug_api: test_ctl.a\n")
+    assert controller.check()
+    assert not controller.check()
+    controller.stop()
+    assert handler.level == logging.WARNING
+    assert logging.getLogger("test_ctl.a").level == logging.DEBUG
+    assert logging.getLogger("test_ctl.b").level == logging.ERROR
+
+
+def test_duplicate_filter():
+    stream = io.StringIO()
+    dedup = DuplicateFilter(window=60, burst=2)
+    handlers = [logging.StreamHandler(stream), logging.StreamHandler(io.StringIO())]
+    lgr = logging.getLogger("test_dedup")
+    lgr.propagate = False
+    for handler in handlers:
+        handler.addFilter(dedup)
+        lgr.addHandler(handler)
+    for i in range(100):
+        lgr.warning("Shell Command Execution Error %d", i)
+    lgr.warning("something else")
+    dedup.flush()
+    lines = stream.getvalue().splitlines()
+    assert lines == [
+        "Shell Command Execution Error 0",
+        "Shell Command Execution Error 1",
+        "something else",
+        "98 similar messages suppressed: Shell Command Execution Error %d",
+    ]
+    assert handlers[1].stream.getvalue() == stream.getvalue()
+
+
+def test_duplicate_filter_window():
+    dedup = DuplicateFilter(window=0, burst=1)
+    record = logging.LogRecord("test_dedup", logging.INFO, __file__, 1, "polling", (), None)
+    assert dedup.filter(record)
+    record = logging.LogRecord("test_dedup", logging.INFO, __file__, 1, "polling", (), None)
+    assert dedup.filter(record)
+
+
+def test_duplicate_filter_summary_record():
+    stream = io.StringIO()
+    dedup = DuplicateFilter(window=60, burst=1)
+    handler = logging.StreamHandler(stream)
+    handler.addFilter(dedup)
+    lgr = logging.getLogger("test_dedup_summary")
+    lgr.propagate = False
+    lgr.addHandler(handler)
+    lgr.warning("polling %d", 1)
+    lgr.warning("polling %d", 2)
+    dedup._keys[("test_dedup_summary", logging.WARNING, "polling %d")][0] = 0  # window ended
+    record = lgr.makeRecord("test_dedup_summary", logging.WARNING, __file__, 1, "polling %d", (3,), None)
+    lgr.handle(record)
+    assert record.msg == "polling %d"  # not modified
+    assert stream.getvalue().splitlines() == [
+        "polling 1",
+        "1 similar messages suppressed: polling %d",
+        "polling 3",
+    ]
+
+
+def test_duplicate_filter_threads():
+    streams = [io.StringIO(), io.StringIO()]
+    dedup = DuplicateFilter(window=60, burst=50)
+    lgr = logging.getLogger("test_dedup_threads")
+    lgr.propagate = False
+    for stream in streams:
+        handler = logging.StreamHandler(stream)
+        handler.addFilter(dedup)
+        lgr.addHandler(handler)
+
+    def work():
+        for _ in range(100):
+            lgr.warning("busy")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert streams[0].getvalue() == streams[1].getvalue()
+    assert streams[0].getvalue().splitlines() == ["busy"] * 50
+    log._flush_duplicate_filters()  # as at exit
+    assert streams[0].getvalue().splitlines()[-1] == "750 similar messages suppressed: busy"
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import glob
+import logging
+import multiprocessing
+from engcommon.mplog import BlockingQueueHandler
+from engcommon.mplog import LogAggregator
+
+logger = logging.getLogger(__name__)
+
+
+def log_worker(rank):
+    for i in range(50):
+        logger.info("rank %d record %d", rank, i)
+
+
+def test_log_aggregator(tmp_path):
+    aggregator = LogAggregator("engcommon", False, logdir=str(tmp_path), window=0.05)
+    aggregator.start()
+    logging.getLogger("noformat").info("noformat line")
+    workers = [multiprocessing.Process(target=log_worker, args=(rank,)) for rank in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+    aggregator.stop()
+    cmd_logs = glob.glob(str(tmp_path / "engcommon.cmd.*.log"))
+    assert len(cmd_logs) == 1
+    with open(cmd_logs[0]) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 200
+    assert len([i for i in lines if "rank 3 record" in i]) == 50
+    with open(glob.glob(str(tmp_path / "engcommon.debug.*.log"))[0]) as f:
+        assert "noformat line" in f.read()
+
+
+class DeadWriter:
+    exitcode = 1
+
+    def join(self, timeout=None):
+        return None
+
+    def is_alive(self):
+        return False
+
+    def terminate(self):
+        return None
+
+
+def test_stop_full_queue(tmp_path, caplog):
+    aggregator = LogAggregator("engcommon", False, logdir=str(tmp_path), maxsize=1)
+    aggregator._process = DeadWriter()
+    aggregator.queue.put("stuck")
+    handler = BlockingQueueHandler(aggregator.queue, timeout=0.01)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    logger.warning("no room")
+    assert handler.dropped == 1
+    aggregator.stop(timeout=0.1)
+    assert handler not in root.handlers
+    assert "Log Writer Queue Full" in caplog.text
+    assert "Log Records Dropped: 1" in caplog.text
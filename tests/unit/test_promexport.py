@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import pytest
+from engcommon import command
+from engcommon import constants
+from engcommon import error
+from engcommon import trace
+from engcommon.constants import CommandRegistry
+from engcommon.promexport import PromExporter
+
+
+@pytest.fixture
+def exporter(tmp_path, fake_host):
+    exp = PromExporter(str(tmp_path / "textfile" / "engcommon.prom"))
+    yield exp
+    trace.remove_listener(exp.stats)
+    trace.disable()
+
+
+def test_write(exporter, monkeypatch):
+    registry = CommandRegistry(constants.get_registry().commands, {"sh": 4})
+    monkeypatch.setattr(constants, "_registry", registry)
+    command.get_shell_cmd("echo hello")
+    command.get_shell_cmd("echo hello")
+    command.get_shell_cmd("sh -c 'exit 4'")
+    with pytest.raises(error.ShellCommandExecutionError):
+        command.get_shell_cmd("false")
+    exporter.write()
+    with open(exporter.path) as f:
+        text = f.read()
+    assert 'engcommon_command_invocations_total{cmd="echo"} 2' in text
+    assert 'engcommon_command_duration_seconds_bucket{cmd="echo",le="+Inf"} 2' in text
+    assert 'engcommon_command_nonzero_returncode_total{cmd="sh",ignored="true",ret_code="4"} 1' in text
+    assert 'engcommon_command_nonzero_returncode_total{cmd="false",ignored="false",ret_code="1"} 1' in text
+    assert "engcommon_hardware_cpu_cores 256" in text
+    assert 'vendor="intel"' in text
+
+
+def test_start_stop(exporter):
+    assert trace.is_enabled()
+    exporter.start()
+    exporter.stop()
+    with open(exporter.path) as f:
+        assert "# TYPE engcommon_command_duration_seconds histogram" in f.read()
+    assert not trace.is_enabled()
+
+
+def test_stop_keeps_caller_trace(tmp_path):
+    trace.enable()
+    try:
+        exp = PromExporter(str(tmp_path / "engcommon.prom"), hardware_facts=False)
+        exp.stop()
+        assert trace.is_enabled()
+    finally:
+        trace.disable()
+
+
+def test_call_shell_cmd_returncode(exporter, monkeypatch):
+    registry = CommandRegistry(constants.get_registry().commands, {"sh": 4})
+    monkeypatch.setattr(constants, "_registry", registry)
+    monkeypatch.setattr(command.time, "sleep", lambda seconds: None)
+    assert command.call_shell_cmd("sh -c 'exit 4'") == 4
+    exporter.write()
+    with open(exporter.path) as f:
+        assert 'engcommon_command_nonzero_returncode_total{cmd="sh",ignored="true",ret_code="4"} 1' in f.read()
+
+
+def test_run_logs_write_error(exporter, monkeypatch, caplog):
+    def write():
+        exporter._stop_event.set()
+        raise OSError("read-only")
+    monkeypatch.setattr(exporter, "write", write)
+    monkeypatch.setattr(exporter, "_interval", 0)
+    exporter._run()
+    assert "Textfile Write Error" in caplog.text
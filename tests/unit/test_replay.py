@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import io
+import subprocess
+import time
+import pytest
+from engcommon import command
+from engcommon import error
+from engcommon.replay import Recorder
+from engcommon.replay import Replayer
+
+
+@pytest.fixture(params=["cmds.jsonl", "cmds.jsonl.gz"])
+def store(tmp_path, request):
+    return str(tmp_path / request.param)
+
+
+def test_record_replay(store, tmp_path):
+    marker = tmp_path / "marker"
+    marker.write_text("recorded\n")
+    with Recorder(store):
+        first = command.get_shell_cmd("cat {0}".format(marker))
+        command.get_shell_cmd("echo a b | tr a-z A-Z")
+        with pytest.raises(error.ShellCommandExecutionError):
+            command.get_shell_cmd("false")
+    marker.write_text("changed\n")
+    with Replayer(store) as replayer:
+        assert len(replayer) == 4
+        assert command.get_shell_cmd("cat {0}".format(marker)) == first
+        assert command.get_shell_cmd("echo a b | tr a-z A-Z")["stdout"] == "A B\n"
+        with pytest.raises(error.ShellCommandExecutionError):
+            command.get_shell_cmd("false")
+        with pytest.raises(FileNotFoundError):
+            command.get_shell_cmd("echo never recorded")
+    assert command.get_backend() is None
+    assert command.get_shell_cmd("cat {0}".format(marker))["stdout"] == "changed\n"
+
+
+def test_replay_order_and_latency(store, tmp_path):
+    counter = tmp_path / "counter"
+    cmd = "sh -c 'echo x >> {0}; wc -l < {0}; sleep 0.2'".format(counter)
+    with Recorder(store):
+        for _ in range(2):
+            command.get_shell_cmd(cmd)
+    with Replayer(store, latency=1):
+        start = time.perf_counter()
+        outputs = [command.get_shell_cmd(cmd)["stdout"].strip() for _ in range(3)]
+        assert time.perf_counter() - start >= 0.6
+    assert outputs == ["1", "2", "2"]
+
+
+def test_call_shell_cmd(store, tmp_path):
+    out = tmp_path / "out.txt"
+    with Recorder(store):
+        with open(str(out), "w") as f:
+            command.call_shell_cmd("echo hello", stdout=f)
+    assert out.read_text() == "hello\n"
+    out.write_text("")
+    with Replayer(store):
+        start = time.perf_counter()
+        with open(str(out), "w") as f:
+            command.call_shell_cmd("echo hello", stdout=f)
+        assert time.perf_counter() - start < 1
+    assert out.read_text() == "hello\n"
+
+
+def test_call_shell_cmd_stderr(store, monkeypatch):
+    with Recorder(store):
+        command.call_shell_cmd("sh -c 'echo oops >&2'", stderr=subprocess.PIPE)
+    stderr = io.StringIO()
+    monkeypatch.setattr(command.sys, "stderr", stderr)
+    with Replayer(store):
+        command.call_shell_cmd("sh -c 'echo oops >&2'", stderr=None)
+    assert stderr.getvalue() == "oops\n"
+
+
+def test_call_shell_cmd_binary_output(store, tmp_path):
+    out = tmp_path / "out.bin"
+    with Recorder(store):
+        with open(str(out), "w") as f:
+            command.call_shell_cmd("printf 'ok\\377\\n'", stdout=f)
+    assert out.read_bytes() == b"ok\xff\n"
+    out.write_bytes(b"")
+    with Replayer(store):
+        with open(str(out), "w") as f:
+            command.call_shell_cmd("printf 'ok\\377\\n'", stdout=f)
+    assert out.read_bytes() == b"ok\xff\n"
+
+
+def test_call_shell_cmd_streams(store, tmp_path):
+    out = tmp_path / "out.txt"
+    seen = tmp_path / "seen.txt"
+    cmd = "sh -c 'echo first; sleep 0.2; cat {0} > {1}; echo second'".format(out, seen)
+    with Recorder(store):
+        with open(str(out), "w") as f:
+            command.call_shell_cmd(cmd, stdout=f)
+    assert seen.read_text() == "first\n"
+    assert out.read_text() == "first\nsecond\n"
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import concurrent.futures
+import multiprocessing
+import pytest
+from engcommon import runid
+from engcommon.runid import IDRegistry
+
+WORDS = {
+    "adverb": ["quietly", "boldly"],
+    "adjective": ["brave", "green"],
+    "noun": ["otter", "falcon"],
+}
+
+
+def test_registry(tmp_path):
+    path = str(tmp_path / "runids.bloom")
+    with IDRegistry(path, capacity=1000, error_rate=1e-4) as registry:
+        assert registry.add("quietly-brave-otter")
+        assert not registry.add("quietly-brave-otter")
+        assert "quietly-brave-otter" in registry
+        assert "boldly-green-falcon" not in registry
+        bits = registry.bits
+    with IDRegistry(path) as registry:
+        assert registry.bits == bits
+        assert registry.count == 1
+        assert "quietly-brave-otter" in registry
+
+
+def test_registry_invalid(tmp_path):
+    path = tmp_path / "runids.bloom"
+    path.write_bytes(b"not a registry" * 10)
+    with pytest.raises(ValueError):
+        IDRegistry(str(path))
+
+
+def test_get_unique_phrase(tmp_path):
+    with IDRegistry(str(tmp_path / "runids.bloom"), capacity=100) as registry:
+        phrases = {runid.get_unique_phrase(registry, words=WORDS) for _ in range(8)}
+        assert len(phrases) == 8  # every combination issued once
+        with pytest.raises(RuntimeError):
+            runid.get_unique_phrase(registry, words=WORDS, attempts=20)
+
+
+def _add_all(path, ids):
+    with IDRegistry(path) as registry:
+        return [registry.add(i) for i in ids]
+
+
+def test_registry_processes(tmp_path):
+    path = str(tmp_path / "runids.bloom")
+    IDRegistry(path, capacity=10000).close()
+    ids = ["id{0}".format(i) for i in range(500)]
+    with multiprocessing.Pool(4) as pool:
+        results = pool.starmap(_add_all, [(path, ids)] * 4)
+    assert sum(sum(r) for r in results) == 500  # each ID added exactly once
+
+
+def test_registry_threads(tmp_path):
+    ids = ["id{0}".format(i % 50) for i in range(400)]
+    with IDRegistry(str(tmp_path / "ids.bloom"), capacity=1000) as registry:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=16) as pool:
+            added = list(pool.map(registry.add, ids))
+        assert sum(added) == 50
+        assert registry.count == 50
+
+
+def test_suffix():
+    suffixes = [runid.get_id_suffix() for _ in range(100)]
+    assert suffixes == sorted(set(suffixes))
+    assert len(suffixes[0]) == 19
+    phrase = runid.get_unique_phrase(words=WORDS, suffix=True)
+    assert phrase.count("-") == 3
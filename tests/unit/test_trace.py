@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import json
+import pytest
+from engcommon import command
+from engcommon import error
+from engcommon import hardware
+from engcommon import trace
+
+
+@pytest.fixture
+def tracing():
+    trace.reset()
+    yield trace
+    trace.disable()
+    trace.reset()
+
+
+def test_disabled_is_unwrapped():
+    get_shell_cmd = command.get_shell_cmd
+    trace.enable()
+    assert command.get_shell_cmd is not get_shell_cmd
+    trace.disable()
+    assert command.get_shell_cmd is get_shell_cmd
+
+
+def test_jsonl(tracing, tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    trace.enable(path=path)
+    command.get_shell_cmd("echo hello")
+    with pytest.raises(error.ShellCommandExecutionError):
+        command.get_shell_cmd("false")
+    trace.disable()
+    with open(path) as f:
+        spans = [json.loads(line) for line in f]
+    assert spans[0]["cmd"] == "echo hello"
+    assert spans[0]["bytes"] == 6
+    assert spans[1]["ret_code"] == 1
+    assert trace.get_histograms()["command.get_shell_cmd"].count == 2
+
+
+def test_chrome_nested(tracing, tmp_path, fake_host):
+    path = str(tmp_path / "trace.json")
+    trace.enable(path=path, trace_format="chrome")
+    hardware.get_cpu_vendor()
+    trace.disable()
+    with open(path) as f:
+        events = json.load(f)
+    names = [i["name"] for i in events]
+    assert names == ["hardware.get_cpuinfo_columnar", "hardware.get_cpuinfo", "hardware.get_cpu_vendor"]
+    assert events[-1]["dur"] >= events[0]["dur"]
+
+
+def test_histogram():
+    hist = trace.LatencyHistogram(bounds=[0.01, 0.1, 1])
+    for seconds in [0.005, 0.05, 0.05, 0.5]:
+        hist.observe(seconds)
+    assert hist.counts == [1, 2, 1, 0]
+    assert hist.get_percentile(50) == 0.1
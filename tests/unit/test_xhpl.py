@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import pytest
+from engcommon import hardware
+from engcommon.xhpl import get_grids
+from engcommon.xhpl import get_xhpl_plan
+from engcommon.xhpl import get_xhpl_plans
+
+
+def test_get_grids():
+    ranks, p, q = get_grids([12])
+    assert list(zip(p.tolist(), q.tolist())) == [(1, 12), (2, 6), (3, 4)]
+    assert (ranks == 12).all()
+
+
+def test_get_xhpl_plans():
+    plans = get_xhpl_plans(64 * 1024 * 1024, [64, 2], 2000.0, nb=[192, 256], numa_nodes=2)
+    best = plans[0]
+    assert best["valid"]
+    assert (best["P"], best["Q"]) == (8, 8)
+    assert best["ranks_per_numa"] == 32
+    assert best["N"] % best["NB"] == 0
+    assert best["N"] ** 2 * 8 <= 64 * 1024 ** 3
+
+
+def test_get_xhpl_plan_timeout():
+    with pytest.raises(ValueError):
+        get_xhpl_plan(mem=64 * 1024 * 1024, cores=64, numa_nodes=2, gflops=1.0, timeout=1)
+
+
+def test_get_xhpl_plan_physical_cores(fake_host, monkeypatch):
+    monkeypatch.setattr(hardware, "get_effective_cpu_count", lambda: 512)
+    assert hardware.get_effective_core_count() == 256  # 2 threads per core
+    peaks = []
+    get_peak_gflops = hardware.get_peak_gflops
+
+    def peak(**kwargs):
+        peaks.append(kwargs["cores"])
+        return get_peak_gflops(**kwargs)
+
+    monkeypatch.setattr(hardware, "get_peak_gflops", peak)
+    plan = get_xhpl_plan(mem=64 * 1024 * 1024)
+    assert peaks == [256]
+    assert plan["ranks"] <= 256